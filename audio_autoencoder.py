@@ -0,0 +1,327 @@
+"""
+CPU inference for the audio autoencoder of Autoencoder_Results/audio/audio_encd(v1).ipynb.
+
+The notebook's encoder hides 128 message bits in a window of 22050 samples
+and its decoder reads them back. This module loads exported encoder and
+decoder weights once per process and applies them to WAV files of any length:
+every channel is cut into windows, windows are run through the models in
+batches, and the stego windows are stitched back, cross-fading their changes
+where windows overlap.
+
+A payload is a 32-bit byte count followed by the data bits, 128 bits per
+window, windows ordered time first, then channel. Only the frames covering the
+payload are modified, the rest of the file is copied through. Extraction is
+lossy (the decoder has a bit error rate), so there is no frame or CRC.
+
+TensorFlow is only needed here and is imported on first use:
+
+    python audio_autoencoder.py hide encoder.h5 decoder.h5 cover.wav stego.wav --message "hi"
+    python audio_autoencoder.py reveal encoder.h5 decoder.h5 stego.wav --batch-size 64 --threads 4
+"""
+import argparse
+import sys
+import time
+import wave
+import numpy as np
+from operations import decode_frames, encode_frames
+from audio_lsb import copy_frames
+from instrument import span
+
+AUDIO_LENGTH = 22050
+MESSAGE_BITS = 128
+LENGTH_PREFIX_BITS = 32
+EMBEDDING_STRENGTH = 0.05
+DEFAULT_BATCH_SIZE = 16
+
+# (encoder path, decoder path, audio length, message bits) -> (encoder, decoder)
+_models = {}
+
+
+def import_tensorflow(threads=None):
+    try:
+        import tensorflow as tf
+    except ImportError:
+        raise ValueError("The audio autoencoder needs TensorFlow: pip install tensorflow-cpu")
+    if threads:
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(threads)
+        except RuntimeError:
+            # The runtime is already initialised, its thread pools are fixed
+            pass
+    return tf
+
+
+def build_encoder(tf, audio_length=AUDIO_LENGTH, message_length=MESSAGE_BITS):
+    """The notebook's encoder; Rescaling replaces its Lambda so no Python code is deserialised."""
+    layers = tf.keras.layers
+    audio_input = layers.Input(shape=(audio_length, 1), name='audio_input')
+    message_input = layers.Input(shape=(message_length,), name='message_input')
+
+    x = layers.Conv1D(32, 9, padding='same', activation='relu')(audio_input)
+    x = layers.Conv1D(64, 9, padding='same', activation='relu')(x)
+    x = layers.Conv1D(64, 9, padding='same', activation='relu')(x)
+
+    message_dense = layers.Dense(512, activation='relu')(message_input)
+    message_dense = layers.Dense(1024, activation='relu')(message_dense)
+    message_expanded = layers.RepeatVector(audio_length)(message_dense)
+    message_features = layers.Conv1D(32, 1, padding='same', activation='tanh')(message_expanded)
+    message_signal = layers.Rescaling(EMBEDDING_STRENGTH)(message_features)
+
+    combined = layers.Concatenate()([x, message_signal])
+    x = layers.Conv1D(64, 5, padding='same', activation='relu')(combined)
+    x = layers.Conv1D(32, 5, padding='same', activation='relu')(x)
+    x = layers.Conv1D(16, 3, padding='same', activation='relu')(x)
+    stego_audio = layers.Conv1D(1, 1, padding='same', activation='tanh')(x)
+    stego_audio = layers.Add()([audio_input, stego_audio])
+    return tf.keras.Model(inputs=[audio_input, message_input], outputs=stego_audio, name='encoder')
+
+
+def build_decoder(tf, audio_length=AUDIO_LENGTH, message_length=MESSAGE_BITS):
+    """The notebook's decoder."""
+    layers = tf.keras.layers
+    stego_input = layers.Input(shape=(audio_length, 1), name='stego_input')
+
+    branches = []
+    for kernel in (3, 9, 15):
+        branch = layers.Conv1D(64, kernel, padding='same', activation='relu')(stego_input)
+        branches.append(layers.MaxPooling1D(2)(branch))
+    x = layers.Concatenate()(branches)
+
+    x = layers.Conv1D(128, 3, padding='same', activation='relu')(x)
+    x = layers.MaxPooling1D(2)(x)
+    x = layers.Conv1D(256, 3, padding='same', activation='relu')(x)
+    x = layers.GlobalAveragePooling1D()(x)
+
+    x = layers.Dense(1024, activation='relu')(x)
+    x = layers.Dropout(0.3)(x)
+    x = layers.Dense(512, activation='relu')(x)
+    x = layers.Dropout(0.3)(x)
+    x = layers.Dense(256, activation='relu')(x)
+    extracted_message = layers.Dense(message_length, activation='sigmoid')(x)
+    return tf.keras.Model(inputs=stego_input, outputs=extracted_message, name='decoder')
+
+
+def load_models(encoder_path, decoder_path, audio_length=AUDIO_LENGTH, message_length=MESSAGE_BITS, threads=None):
+    """(encoder, decoder) with the exported weights, built once per process.
+
+    The files may be weight files or the full .h5 models the notebook saves.
+    """
+    key = (encoder_path, decoder_path, audio_length, message_length)
+    if key not in _models:
+        tf = import_tensorflow(threads)
+        try:
+            encoder = build_encoder(tf, audio_length, message_length)
+            encoder.load_weights(encoder_path)
+            decoder = build_decoder(tf, audio_length, message_length)
+            decoder.load_weights(decoder_path)
+        except Exception as e:
+            raise ValueError(f"Error loading autoencoder weights: {e}")
+        _models[key] = (encoder, decoder)
+    return _models[key]
+
+
+def payload_bits(data):
+    """32-bit byte count followed by the bits of data, as a 0/1 uint8 array."""
+    prefix = np.array([len(data)], dtype='>u4').view(np.uint8)
+    return np.unpackbits(np.concatenate((prefix, np.frombuffer(data, dtype=np.uint8))))
+
+
+class AudioAutoencoder:
+    """Batched encoder/decoder inference over windows of a WAV file.
+
+    overlap is the number of samples shared by consecutive windows; the
+    encoder's changes are cross-faded over it. Each call to embed or extract
+    leaves its window count and throughput in self.stats.
+    """
+    def __init__(self, encoder_path, decoder_path, batch_size=DEFAULT_BATCH_SIZE, threads=None, overlap=0,
+                 audio_length=AUDIO_LENGTH, message_length=MESSAGE_BITS):
+        if not 0 <= overlap < audio_length // 2:
+            raise ValueError("Window overlap must be less than half a window.")
+        self.encoder, self.decoder = load_models(encoder_path, decoder_path, audio_length, message_length, threads)
+        self.batch_size = batch_size
+        self.overlap = overlap
+        self.audio_length = audio_length
+        self.message_length = message_length
+        self.hop = audio_length - overlap
+        self.stats = {}
+
+    # -------------------------------
+    # Windows
+    # -------------------------------
+    def frames_for(self, n_windows):
+        """Frames spanned by the first n_windows windows of one channel."""
+        return (n_windows - 1) * self.hop + self.audio_length if n_windows else 0
+
+    def windows_in(self, n_frames):
+        """Windows needed to cover n_frames frames of one channel; the last one is zero padded."""
+        if n_frames <= 0:
+            return 0
+        return max(1, -(-(n_frames - self.overlap) // self.hop))
+
+    def _window(self, signal, index):
+        start = index * self.hop
+        window = np.zeros(self.audio_length, dtype=np.float32)
+        piece = signal[start:start + self.audio_length]
+        window[:len(piece)] = piece
+        return window
+
+    def _fades(self, n_windows):
+        """Weights of each window's changes; overlapping windows cross-fade linearly."""
+        weights = np.ones((n_windows, self.audio_length), dtype=np.float32)
+        if self.overlap and n_windows > 1:
+            ramp = (np.arange(self.overlap, dtype=np.float32) + 0.5) / self.overlap
+            weights[1:, :self.overlap] = ramp
+            weights[:-1, -self.overlap:] = 1 - ramp
+        return weights
+
+    def _batches(self, n):
+        for start in range(0, n, self.batch_size):
+            yield start, min(n, start + self.batch_size)
+
+    def _record(self, windows, seconds):
+        self.stats = {
+            "windows": windows,
+            "seconds": seconds,
+            "windows_per_second": windows / seconds if seconds else None,
+        }
+
+    # -------------------------------
+    # Arrays
+    # -------------------------------
+    def embed_windows(self, signal, messages):
+        """Encodes len(messages) windows of a 1-D float signal in [-1, 1]; returns the stego signal.
+
+        messages is a (windows, message bits) 0/1 array. The signal must
+        span at least the windows written.
+        """
+        n_windows = len(messages)
+        stego = np.array(signal, dtype=np.float32)
+        fades = self._fades(n_windows)
+        started = time.perf_counter()
+        for start, stop in self._batches(n_windows):
+            audio = np.stack([self._window(signal, i) for i in range(start, stop)])[:, :, np.newaxis]
+            with span('AudioAutoencoder.encode'):
+                encoded = np.asarray(self.encoder([audio, messages[start:stop].astype(np.float32)], training=False))
+            changes = (encoded[:, :, 0] - audio[:, :, 0]) * fades[start:stop]
+            for i, change in zip(range(start, stop), changes):
+                position = i * self.hop
+                target = stego[position:position + self.audio_length]
+                target += change[:len(target)]
+        self._record(n_windows, time.perf_counter() - started)
+        return np.clip(stego, -1, 1)
+
+    def extract_windows(self, signal, n_windows):
+        """Decoder bit probabilities of the first n_windows windows, a (windows, message bits) array."""
+        probabilities = np.zeros((n_windows, self.message_length), dtype=np.float32)
+        started = time.perf_counter()
+        for start, stop in self._batches(n_windows):
+            audio = np.stack([self._window(signal, i) for i in range(start, stop)])[:, :, np.newaxis]
+            with span('AudioAutoencoder.decode'):
+                probabilities[start:stop] = np.asarray(self.decoder(audio, training=False))
+        self._record(n_windows, time.perf_counter() - started)
+        return probabilities
+
+    # -------------------------------
+    # WAV files
+    # -------------------------------
+    def _read(self, audio, n_frames):
+        """First n_frames frames of an open wave file as (frames, channels) floats and the full-scale value."""
+        params = audio.getparams()
+        audio.setpos(0)
+        samples = decode_frames(audio.readframes(n_frames), params.sampwidth, params.nchannels)
+        scale = float(1 << (8 * params.sampwidth - 1))
+        return samples.astype(np.float32) / scale, scale
+
+    def capacity_bytes(self, params):
+        """Payload bytes a file with these wave params can carry."""
+        windows = self.windows_in(params.nframes) * params.nchannels
+        return max(0, (windows * self.message_length - LENGTH_PREFIX_BITS) // 8)
+
+    def embed_bytes(self, audio_path, output_path, data):
+        bits = payload_bits(data)
+        with wave.open(audio_path, 'rb') as audio:
+            params = audio.getparams()
+            if len(data) > self.capacity_bytes(params):
+                raise ValueError("Message too long to encode in this audio file.")
+            channels = params.nchannels
+            n_windows = -(-len(bits) // (self.message_length * channels))
+            messages = np.zeros((n_windows * channels, self.message_length), dtype=np.uint8)
+            messages.reshape(-1)[:len(bits)] = bits
+
+            # Only the frames under the payload windows are decoded and rewritten
+            n_frames = min(params.nframes, self.frames_for(n_windows))
+            signal, scale = self._read(audio, n_frames)
+            stego = np.empty_like(signal)
+            seconds = 0
+            for channel in range(channels):
+                stego[:, channel] = self.embed_windows(signal[:, channel], messages[channel::channels])
+                seconds += self.stats["seconds"]
+            self._record(n_windows * channels, seconds)
+
+            samples = np.clip(np.round(stego * scale), -scale, scale - 1)
+            with wave.open(output_path, 'wb') as encoded_audio:
+                encoded_audio.setparams(params)
+                encoded_audio.writeframesraw(encode_frames(samples, params.sampwidth))
+                copy_frames(audio, encoded_audio)
+
+    def embed_text(self, audio_path, output_path, message):
+        self.embed_bytes(audio_path, output_path, message.encode('utf-8'))
+
+    def _decode_bits(self, audio, n_windows):
+        signal, _ = self._read(audio, min(audio.getnframes(), self.frames_for(n_windows)))
+        channels = signal.shape[1]
+        probabilities = np.zeros((n_windows * channels, self.message_length), dtype=np.float32)
+        seconds = 0
+        for channel in range(channels):
+            probabilities[channel::channels] = self.extract_windows(signal[:, channel], n_windows)
+            seconds += self.stats["seconds"]
+        self._record(n_windows * channels, seconds)
+        return (probabilities.reshape(-1) > 0.5).astype(np.uint8)
+
+    def extract_bytes(self, audio_path):
+        """Best-effort payload; bit errors of the decoder show up as wrong bytes."""
+        with wave.open(audio_path, 'rb') as audio:
+            params = audio.getparams()
+            # The length prefix is in the first window of the first channel
+            length = int.from_bytes(np.packbits(self._decode_bits(audio, 1)[:LENGTH_PREFIX_BITS]).tobytes(), 'big')
+            if length > self.capacity_bytes(params):
+                raise ValueError("No hidden data found in this audio file.")
+            n_bits = LENGTH_PREFIX_BITS + 8 * length
+            n_windows = -(-n_bits // (self.message_length * params.nchannels))
+            bits = self._decode_bits(audio, n_windows)[LENGTH_PREFIX_BITS:n_bits]
+        return np.packbits(bits).tobytes()
+
+    def extract_text(self, audio_path):
+        return self.extract_bytes(audio_path).decode('utf-8', errors='replace')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hide or reveal a message with the audio autoencoder on CPU.")
+    parser.add_argument('command', choices=['hide', 'reveal'])
+    parser.add_argument('encoder', help="exported encoder weights (.h5 or .weights.h5)")
+    parser.add_argument('decoder', help="exported decoder weights")
+    parser.add_argument('audio', help="cover WAV for hide, stego WAV for reveal")
+    parser.add_argument('output', nargs='?', help="stego WAV to write (hide)")
+    parser.add_argument('--message', help="text to hide")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="windows per inference call")
+    parser.add_argument('--threads', type=int, default=None, help="TensorFlow CPU threads (default: all)")
+    parser.add_argument('--overlap', type=int, default=0, help="samples shared by consecutive windows")
+    args = parser.parse_args(argv)
+    if args.command == 'hide' and (args.output is None or args.message is None):
+        parser.error("hide needs an output path and --message")
+
+    model = AudioAutoencoder(args.encoder, args.decoder, args.batch_size, args.threads, args.overlap)
+    if args.command == 'hide':
+        model.embed_text(args.audio, args.output, args.message)
+        print(f"Message encoded and saved as {args.output}")
+    else:
+        print(model.extract_text(args.audio))
+    stats = model.stats
+    print(f'{stats["windows"]} windows in {stats["seconds"]:.2f}s, {stats["windows_per_second"] or 0:.1f} windows/s',
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
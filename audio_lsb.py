@@ -0,0 +1,271 @@
+"""
+Streaming WAV LSB codec shared by HideAudio and UnhideAudio.
+
+Frames are read in fixed-size blocks and viewed with np.frombuffer, so memory
+stays bounded by BLOCK_FRAMES no matter how long the file is. The layout is the
+same as the original byte loop: one bit in the low bit of every raw frame byte,
+starting at the first frame.
+
+The sample mode instead writes only into the least significant byte of each
+sample (optionally several low bits of it), so 16-bit and wider audio never
+has its high bytes touched.
+
+The scattered mode keeps the byte layout but sends payload bit i to a
+password-keyed position (see scatter.py), so its cost follows the payload
+rather than the file: embedding still copies the file, but only touches the
+payload positions, and extraction reads only the frames holding them.
+"""
+import wave
+import numpy as np
+from lsb import embed_lsb_parallel
+from parallel import map_regions, resolve_workers
+from scatter import KeyedPermutation
+from instrument import span
+
+# Frames read or copied per block
+BLOCK_FRAMES = 1 << 16
+
+
+def embed_lsb_wav(audio_path, output_path, bits, workers=1):
+    """Writes a 0/1 bit array into the low bit of the first len(bits) frame bytes.
+
+    Only the blocks carrying the payload are modified; the rest of the data is
+    copied through block by block. With several workers, each read covers one
+    block per thread and the blocks are embedded in parallel.
+    """
+    workers = resolve_workers(workers)
+    with wave.open(audio_path, 'rb') as audio:
+        params = audio.getparams()
+        if len(bits) > capacity_bits_lsb_wav(params):
+            raise ValueError("Message too long to encode in this audio file.")
+        region = BLOCK_FRAMES * params.sampwidth * params.nchannels
+
+        with wave.open(output_path, 'wb') as encoded_audio:
+            encoded_audio.setparams(params)
+            position = 0
+            while position < len(bits):
+                with span('audio_lsb.embed_lsb_wav.load'):
+                    block = bytearray(audio.readframes(BLOCK_FRAMES * workers))
+                if not block:
+                    raise ValueError("Message too long to encode in this audio file.")
+                chunk = bits[position:position + len(block)]
+                with span('audio_lsb.embed_lsb_wav.embed'):
+                    embed_lsb_parallel(np.frombuffer(block, dtype=np.uint8), chunk, workers, region)
+                with span('audio_lsb.embed_lsb_wav.write'):
+                    encoded_audio.writeframesraw(block)
+                position += len(chunk)
+            with span('audio_lsb.embed_lsb_wav.copy'):
+                copy_frames(audio, encoded_audio)
+
+
+def embed_lsb_wav_scattered(audio_path, output_path, bits, password):
+    """Writes a 0/1 bit array into the low bit of frame bytes at password-keyed positions."""
+    with wave.open(audio_path, 'rb') as audio:
+        params = audio.getparams()
+        total = capacity_bits_lsb_wav(params)
+        if len(bits) > total:
+            raise ValueError("Message too long to encode in this audio file.")
+        with span('audio_lsb.embed_lsb_wav_scattered.positions'):
+            positions = KeyedPermutation(password, total).positions(0, len(bits))
+            order = np.argsort(positions)
+            positions = positions[order]
+            bits = bits[order]
+
+        with wave.open(output_path, 'wb') as encoded_audio:
+            encoded_audio.setparams(params)
+            offset = 0
+            while True:
+                block = audio.readframes(BLOCK_FRAMES)
+                if not block:
+                    break
+                # Positions are sorted, so each block's share is one slice
+                lo, hi = np.searchsorted(positions, (offset, offset + len(block)))
+                if hi > lo:
+                    with span('audio_lsb.embed_lsb_wav_scattered.embed'):
+                        block = bytearray(block)
+                        data = np.frombuffer(block, dtype=np.uint8)
+                        targets = positions[lo:hi] - offset
+                        data[targets] = (data[targets] & 0xFE) | bits[lo:hi]
+                encoded_audio.writeframesraw(block)
+                offset += len(block)
+
+
+def copy_frames(audio, encoded_audio):
+    """Copies the remaining frames of audio to encoded_audio in BLOCK_FRAMES blocks."""
+    while True:
+        block = audio.readframes(BLOCK_FRAMES)
+        if not block:
+            break
+        encoded_audio.writeframesraw(block)
+
+
+def iter_frame_blocks(audio):
+    """Yields the raw frame bytes of an open wave file as uint8 arrays of BLOCK_FRAMES frames."""
+    while True:
+        block = audio.readframes(BLOCK_FRAMES)
+        if not block:
+            return
+        yield np.frombuffer(block, dtype=np.uint8)
+
+
+def lsb_until_zero_run(blocks):
+    """Collects the LSBs of uint8 blocks up to and including the first run of eight zero bits.
+
+    The run may start at any bit, not only on a byte boundary, which is where
+    the original decoder stopped too.
+    """
+    collected = []
+    carry = np.zeros(0, dtype=np.uint8)
+    for block in blocks:
+        lsb = block & 1
+
+        # Sliding sums of eight bits, including the last seven of the previous block
+        window = np.concatenate((carry, lsb))
+        ones = np.concatenate(([0], np.cumsum(window, dtype=np.int64)))
+        runs = np.flatnonzero(ones[8:] == ones[:-8])
+        if runs.size:
+            stop = int(runs[0]) + 8 - len(carry)
+            collected.append(lsb[:stop])
+            break
+        collected.append(lsb)
+        carry = window[-7:]
+    if not collected:
+        return np.zeros(0, dtype=np.uint8)
+    return np.concatenate(collected)
+
+
+def bits_to_text_lsb(bits):
+    """Vectorized UnhideAudio.bits_to_text: 8-bit characters with null bytes dropped."""
+    n_full = len(bits) // 8 * 8
+    packed = np.packbits(bits[:n_full])
+    text = packed[packed != 0].tobytes().decode('latin-1')
+    if n_full < len(bits):
+        text += chr(int(''.join(str(bit) for bit in bits[n_full:]), 2))
+    return text
+
+
+def capacity_bits_lsb_wav(params):
+    """Bits the byte mode can hold: one per raw frame byte."""
+    return params.nframes * params.sampwidth * params.nchannels
+
+
+def capacity_bits_sample_lsb_wav(params, depth=1):
+    """Bits the sample mode can hold: depth bits per sample of every channel."""
+    return params.nframes * params.nchannels * depth
+
+
+def _check_depth(depth):
+    if not 1 <= depth <= 4:
+        raise ValueError("LSB depth must be between 1 and 4 bits per sample.")
+
+
+def _sample_view(block, sampwidth):
+    """Strided view over the least significant byte of every little-endian sample."""
+    return np.frombuffer(block, dtype=np.uint8)[::sampwidth]
+
+
+def embed_sample_lsb_wav(audio_path, output_path, bits, depth=1, workers=1):
+    """Writes bits into the low depth bits of each sample's least significant byte.
+
+    Samples are used in file order across all channels, depth bits each, most
+    significant first. Works for 8, 16, 24 and 32-bit PCM. Several workers
+    embed one block each per read, as in embed_lsb_wav.
+    """
+    _check_depth(depth)
+    workers = resolve_workers(workers)
+    with wave.open(audio_path, 'rb') as audio:
+        params = audio.getparams()
+        if len(bits) > capacity_bits_sample_lsb_wav(params, depth):
+            raise ValueError("Message too long to encode in this audio file.")
+
+        # Group the bits into one depth-bit value per sample
+        padded = np.zeros(-(-len(bits) // depth) * depth, dtype=np.uint8)
+        padded[:len(bits)] = bits
+        values = padded.reshape(-1, depth) @ (1 << np.arange(depth - 1, -1, -1))
+        values = values.astype(np.uint8)
+        keep = np.uint8(0xFF ^ ((1 << depth) - 1))
+        region = BLOCK_FRAMES * params.nchannels
+
+        with wave.open(output_path, 'wb') as encoded_audio:
+            encoded_audio.setparams(params)
+            position = 0
+            while position < len(values):
+                with span('audio_lsb.embed_sample_lsb_wav.load'):
+                    block = bytearray(audio.readframes(BLOCK_FRAMES * workers))
+                if not block:
+                    raise ValueError("Message too long to encode in this audio file.")
+                with span('audio_lsb.embed_sample_lsb_wav.embed'):
+                    samples = _sample_view(block, params.sampwidth)
+                    chunk = values[position:position + len(samples)]
+
+                    def embed(start):
+                        targets = samples[start:min(start + region, len(chunk))]
+                        np.bitwise_and(targets, keep, out=targets)
+                        np.bitwise_or(targets, chunk[start:start + region], out=targets)
+
+                    map_regions(embed, range(0, len(chunk), region), workers)
+                with span('audio_lsb.embed_sample_lsb_wav.write'):
+                    encoded_audio.writeframesraw(block)
+                position += len(chunk)
+            with span('audio_lsb.embed_sample_lsb_wav.copy'):
+                copy_frames(audio, encoded_audio)
+
+
+def wav_lsb_bit_source(audio):
+    """(read_bits, total_bits) over the frame byte LSBs of an open wave file.
+
+    Each call seeks to and reads only the frames covering the requested bits.
+    """
+    frame_size = audio.getsampwidth() * audio.getnchannels()
+
+    def read_bits(start, stop):
+        first_frame = start // frame_size
+        audio.setpos(first_frame)
+        data = np.frombuffer(audio.readframes(-(-stop // frame_size) - first_frame), dtype=np.uint8)
+        offset = start - first_frame * frame_size
+        return data[offset:offset + stop - start] & 1
+
+    return read_bits, capacity_bits_lsb_wav(audio.getparams())
+
+
+def wav_sample_bit_source(audio, depth=1):
+    """(read_bits, total_bits) over the sample-mode bits of an open wave file."""
+    _check_depth(depth)
+    channels = audio.getnchannels()
+    sampwidth = audio.getsampwidth()
+    shifts = np.arange(depth - 1, -1, -1, dtype=np.uint8)
+
+    def read_bits(start, stop):
+        first_sample = start // depth
+        last_sample = -(-stop // depth)
+        first_frame = first_sample // channels
+        audio.setpos(first_frame)
+        block = audio.readframes(-(-last_sample // channels) - first_frame)
+        skip = first_sample - first_frame * channels
+        samples = _sample_view(block, sampwidth)[skip:skip + last_sample - first_sample]
+        bits = ((samples[:, np.newaxis] >> shifts) & 1).reshape(-1)
+        offset = start - first_sample * depth
+        return bits[offset:offset + stop - start]
+
+    return read_bits, capacity_bits_sample_lsb_wav(audio.getparams(), depth)
+
+
+def wav_lsb_scattered_bit_source(audio, password):
+    """(read_bits, total_bits) over frame byte LSBs at password-keyed positions.
+
+    Each call reads only the frames holding the requested bits, one seek per frame.
+    """
+    frame_size = audio.getsampwidth() * audio.getnchannels()
+    total = capacity_bits_lsb_wav(audio.getparams())
+    permutation = KeyedPermutation(password, total)
+
+    def read_bits(start, stop):
+        positions = permutation.positions(start, max(start, min(stop, total)))
+        frames, inverse = np.unique(positions // frame_size, return_inverse=True)
+        data = np.empty((len(frames), frame_size), dtype=np.uint8)
+        for row, frame in enumerate(frames):
+            audio.setpos(int(frame))
+            data[row] = np.frombuffer(audio.readframes(1), dtype=np.uint8)
+        return data[inverse.reshape(-1), positions % frame_size] & 1
+
+    return read_bits, total
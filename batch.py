@@ -0,0 +1,119 @@
+"""
+Batch command line tool for hiding and revealing messages in many files.
+
+Usage:
+    python -m batch manifest.csv --report report.jsonl --workers 8
+
+The manifest is a CSV file with a header row, or a JSONL file with one object
+per line, using the fields:
+    cover      path of the image or WAV file to read
+    message    text to hide (hide only)
+    output     path of the stego file to write (hide only)
+    method     a codec_registry codec: lsb-image, pvd-image, lsb-audio or
+               sample-lsb-audio (default: lsb-audio for .wav files, pvd-image otherwise)
+    operation  hide or reveal (default: hide)
+    password   optional key that scatters the payload (lsb-image and lsb-audio only)
+
+Rows run concurrently in worker processes, so a manifest should not reveal a
+file that another of its rows writes. Results are appended to the JSONL report
+in manifest order as they become available. With STEGO_PROFILE=1, the timing
+spans of every row are merged and written as one last {"spans": ...} record.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from codec_registry import default_codec, hide_file, reveal_file
+import instrument
+
+
+def read_manifest(path):
+    """Yields one dict per manifest row from a CSV or JSONL file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith(('.jsonl', '.json')):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def process_row(task):
+    """Runs one manifest row; never raises so one bad file can't stop the batch."""
+    index, row = task
+    cover = row.get('cover', '')
+    operation = row.get('operation') or 'hide'
+    method = row.get('method') or default_codec(cover)
+    result = {"index": index, "operation": operation, "method": method, "cover": cover}
+    if instrument.enabled():
+        # Spans of this row only, sent back to the parent with the result
+        instrument.reset()
+    start = time.perf_counter()
+    try:
+        result["bytes"] = os.path.getsize(cover)
+        options = {"password": row['password']} if row.get('password') else {}
+        if operation == 'hide':
+            hide_file(method, cover, row['output'], row['message'], **options)
+            result["output"] = row['output']
+        elif operation == 'reveal':
+            result["message"] = reveal_file(method, cover, **options)
+        else:
+            raise ValueError(f"Unknown operation: {operation}")
+        result["status"] = "success"
+    except KeyError as e:
+        result["status"] = "error"
+        result["error"] = f"Missing field: {e}"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    result["seconds"] = round(time.perf_counter() - start, 6)
+    if instrument.enabled():
+        result["spans"] = instrument.snapshot()["spans"]
+    return result
+
+
+def run(manifest, report, workers=None, chunksize=1):
+    """Processes every manifest row and writes results to report; returns summary stats."""
+    tasks = list(enumerate(read_manifest(manifest)))
+    stats = {"files": 0, "errors": 0, "bytes": 0}
+    start = time.perf_counter()
+    with open(report, 'w', encoding='utf-8') as out, ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(process_row, tasks, chunksize=chunksize):
+            # Per-row spans are merged here rather than repeated in every row
+            if "spans" in result:
+                instrument.merge(result.pop("spans"))
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+            stats["files"] += 1
+            stats["bytes"] += result.get("bytes", 0)
+            if result["status"] != "success":
+                stats["errors"] += 1
+        if instrument.enabled():
+            out.write(json.dumps({"spans": instrument.snapshot()}) + '\n')
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["files_per_second"] = round(stats["files"] / elapsed, 2) if elapsed else 0.0
+    stats["mb_per_second"] = round(stats["bytes"] / elapsed / 1e6, 2) if elapsed else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hide or reveal messages in a batch of files.")
+    parser.add_argument('manifest', help="CSV or JSONL manifest of files to process")
+    parser.add_argument('--report', default='report.jsonl', help="JSONL file receiving one result per row")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunksize', type=int, default=1, help="rows sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    stats = run(args.manifest, args.report, args.workers, args.chunksize)
+    print(f"Processed {stats['files']} files ({stats['errors']} errors) in {stats['seconds']} s: "
+          f"{stats['files_per_second']} files/s, {stats['mb_per_second']} MB/s")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
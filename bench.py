@@ -0,0 +1,355 @@
+"""
+Benchmark runner for the embed, extract and capacity paths.
+
+Usage:
+    python -m bench --output bench.json
+    python -m bench --images 0.1,1,10,100 --audio 1,60,3600 --repeat 5 --output bench.json
+    python -m bench --output new.json --baseline bench.json --max-regression 1.25
+    python -m bench --images '' --audio '' --import-tree ../old-checkout --output old_imports.json
+
+Covers are synthetic and seeded, so runs are reproducible: images are a smooth
+gradient with mild noise (sizes in megapixels), WAVs a sine with noise in
+every combination of mono/stereo and 8/16-bit (durations in seconds). Every
+(cover, operation) case runs in a fresh worker process, so peak RSS is that of
+the case alone. Reveal cases read the stego file written by the matching hide
+case.
+
+The JSON report holds the run metadata and one result per case: latency
+min/mean/p50/p90/p99 over the repeats, throughput in cover megabytes per
+second at the median, and the worker's baseline and peak RSS. With --baseline
+the p50 latencies are compared to an earlier report and the exit code is 1 if
+any case got slower than --max-regression times.
+
+Cold-start cases (media "import") time importing the app modules, and an audio
+hide/reveal round trip, in fresh interpreters, and list which of OpenCV, PIL
+and matplotlib got loaded. --import-tree points them at another checkout to
+compare start-up before and after a change.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+SEED = 1234
+MESSAGE_BYTES = 1024
+
+IMAGE_OPERATIONS = ['hide-lsb', 'hide-pvd', 'capacity-pvd', 'reveal-lsb', 'reveal-pvd']
+AUDIO_OPERATIONS = ['hide-lsb', 'hide-sample-lsb', 'capacity-lsb', 'reveal-lsb', 'reveal-sample-lsb']
+
+HEAVY_MODULES = ('cv2', 'PIL', 'matplotlib')
+IMPORT_CASES = {
+    'hide': 'import hide',
+    'unhide': 'import unhide',
+    'batch': 'import batch',
+    'codec_registry': 'import codec_registry',
+    'audio-roundtrip': ('import contextlib, io\n'
+                        'from hide import HideAudio\n'
+                        'from unhide import UnhideAudio\n'
+                        'with contextlib.redirect_stdout(io.StringIO()):\n'
+                        '    HideAudio(COVER, STEGO).embed_text_lsb("x")\n'
+                        'UnhideAudio(STEGO).extract_text_lsb()'),
+}
+
+
+# -------------------------------
+# Synthetic covers
+# -------------------------------
+def make_image(path, megapixels, seed=SEED):
+    """Writes a seeded RGB PNG of about megapixels * 1e6 pixels with a 4:3 aspect."""
+    import cv2
+    width = max(2, int(round((megapixels * 1e6 * 4 / 3) ** 0.5)))
+    height = max(1, int(round(megapixels * 1e6 / width)))
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(0, 200, width, dtype=np.float32)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    # Row by row keeps memory at one output image even at 100 MP
+    for row in range(height):
+        noise = rng.normal(0, 4, (width, 3)).astype(np.float32)
+        image[row] = np.clip(ramp[:, np.newaxis] + row * 50 / height + noise, 0, 255)
+    cv2.imwrite(path, image)
+    return height * width * 3
+
+
+def make_wav(path, seconds, channels, sampwidth, rate=44100, seed=SEED):
+    """Writes a seeded sine plus noise WAV, generated and written one second at a time."""
+    rng = np.random.default_rng(seed)
+    peak = 127 if sampwidth == 1 else 32767
+    with wave.open(path, 'wb') as audio:
+        audio.setnchannels(channels)
+        audio.setsampwidth(sampwidth)
+        audio.setframerate(rate)
+        n_frames = int(seconds * rate)
+        for start in range(0, n_frames, rate):
+            t = np.arange(start, min(start + rate, n_frames)) / rate
+            signal = 0.5 * np.sin(2 * np.pi * 440 * t)[:, np.newaxis] + rng.normal(0, 0.05, (len(t), channels))
+            samples = np.clip(signal, -1, 1) * peak
+            if sampwidth == 1:
+                data = (samples + 128).astype(np.uint8)
+            else:
+                data = samples.astype('<i2')
+            audio.writeframes(data.tobytes())
+        return n_frames * channels * sampwidth
+
+
+def message_text(n_bytes, seed=SEED):
+    rng = np.random.default_rng(seed)
+    return ''.join(chr(c) for c in rng.integers(32, 127, n_bytes))
+
+
+# -------------------------------
+# Cases
+# -------------------------------
+def run_operation(media, operation, cover, stego, message, workers=1):
+    from hide import HideImage, HideAudio
+    from unhide import UnhideImage, UnhideAudio
+    import operations
+    if media == 'image':
+        if operation == 'hide-lsb':
+            HideImage(cover, stego).embed_text_lsb(message, workers=workers)
+        elif operation == 'hide-pvd':
+            HideImage(cover, stego).embed_text_pvd(message, workers=workers)
+        elif operation == 'capacity-pvd':
+            # Measure the computation, not the content-hash cache
+            operations._capacity_cache.clear()
+            HideImage(cover, stego).calculate_max_letters_pvd()
+        elif operation == 'reveal-lsb':
+            UnhideImage(stego).extract_text_lsb(workers)
+        elif operation == 'reveal-pvd':
+            UnhideImage(stego).extract_text_pvd(workers=workers)
+        return
+    # HideAudio reports each save on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        if operation == 'hide-lsb':
+            HideAudio(cover, stego).embed_text_lsb(message, workers=workers)
+        elif operation == 'hide-sample-lsb':
+            HideAudio(cover, stego).embed_text_sample_lsb(message, workers=workers)
+        elif operation == 'capacity-lsb':
+            operations._capacity_cache.clear()
+            HideAudio(cover, stego).calculate_max_letters_lsb()
+        elif operation == 'reveal-lsb':
+            UnhideAudio(stego).extract_text_lsb()
+        elif operation == 'reveal-sample-lsb':
+            UnhideAudio(stego).extract_text_sample_lsb()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1e6 if sys.platform == 'darwin' else 1e3), 2)
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q))
+
+
+def run_case(case):
+    """Runs one case repeat times in this (fresh) worker and returns its result."""
+    # Baseline after the imports, so peak - baseline is the case's own memory
+    import hide, unhide, operations  # noqa: F401
+    baseline = peak_rss_mb()
+    timings = []
+    error = None
+    for _ in range(case["repeat"]):
+        start = time.perf_counter()
+        try:
+            run_operation(case["media"], case["operation"], case["cover"], case["stego"], case["message"],
+                          case["workers"])
+        except Exception as e:
+            error = str(e)
+            break
+        timings.append(time.perf_counter() - start)
+    result = {key: case[key] for key in ("media", "operation", "size", "cover_bytes", "repeat")}
+    result["name"] = case_name(case)
+    result["baseline_rss_mb"] = baseline
+    result["peak_rss_mb"] = peak_rss_mb()
+    if error is not None:
+        result["error"] = error
+        return result
+    median = percentile(timings, 50)
+    result["latency"] = {
+        "min": min(timings),
+        "mean": float(np.mean(timings)),
+        "p50": median,
+        "p90": percentile(timings, 90),
+        "p99": percentile(timings, 99),
+    }
+    result["mb_per_second"] = round(case["cover_bytes"] / median / 1e6, 3) if median else None
+    return result
+
+
+def run_import_case(name, tree, work_dir, repeat):
+    """Times IMPORT_CASES[name] in repeat fresh interpreters with tree first on sys.path."""
+    cover = os.path.join(work_dir, 'import_cover.wav')
+    if not os.path.exists(cover):
+        make_wav(cover, 1, 1, 2)
+    code = '\n'.join([
+        'import json, sys, time',
+        f'sys.path.insert(0, {tree!r})',
+        f'COVER, STEGO = {cover!r}, {os.path.join(work_dir, "import_stego.wav")!r}',
+        'start = time.perf_counter()',
+        IMPORT_CASES[name],
+        'seconds = time.perf_counter() - start',
+        f'print(json.dumps({{"seconds": seconds, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))',
+    ])
+    timings = []
+    loaded = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=tree)
+        if out.returncode != 0:
+            return {"media": 'import', "operation": name, "size": '-', "cover_bytes": 0, "repeat": repeat,
+                    "name": f'import/{name}', "error": out.stderr.strip().splitlines()[-1]}
+        measured = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(measured["seconds"])
+        loaded = measured["loaded"]
+    return {
+        "media": 'import', "operation": name, "size": '-', "cover_bytes": 0, "repeat": repeat,
+        "name": f'import/{name}', "loaded": loaded,
+        "latency": {
+            "min": min(timings),
+            "mean": float(np.mean(timings)),
+            "p50": percentile(timings, 50),
+            "p90": percentile(timings, 90),
+            "p99": percentile(timings, 99),
+        },
+    }
+
+
+def case_name(case):
+    return f'{case["media"]}/{case["size"]}/{case["operation"]}'
+
+
+def build_cases(work_dir, image_sizes, audio_seconds, repeat, workers=1):
+    """Generates the covers and yields the cases, hide cases before their reveal cases."""
+    message = message_text(MESSAGE_BYTES)
+    for megapixels in image_sizes:
+        cover = os.path.join(work_dir, f'image_{megapixels}mp.png')
+        cover_bytes = make_image(cover, megapixels)
+        for operation in IMAGE_OPERATIONS:
+            method = operation.split('-', 1)[1]
+            yield {
+                "media": 'image', "operation": operation, "size": f'{megapixels}mp',
+                "cover": cover, "stego": os.path.join(work_dir, f'image_{megapixels}mp_{method}.png'),
+                "cover_bytes": cover_bytes, "message": message, "repeat": repeat, "workers": workers,
+            }
+    for seconds in audio_seconds:
+        for channels in (1, 2):
+            for sampwidth in (1, 2):
+                size = f'{seconds}s_{"stereo" if channels == 2 else "mono"}_{8 * sampwidth}bit'
+                cover = os.path.join(work_dir, f'audio_{size}.wav')
+                cover_bytes = make_wav(cover, seconds, channels, sampwidth)
+                for operation in AUDIO_OPERATIONS:
+                    method = operation.split('-', 1)[1]
+                    yield {
+                        "media": 'audio', "operation": operation, "size": size,
+                        "cover": cover, "stego": os.path.join(work_dir, f'audio_{size}_{method}.wav'),
+                        "cover_bytes": cover_bytes, "message": message, "repeat": repeat, "workers": workers,
+                    }
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "images_mp": args.images,
+        "audio_seconds": args.audio,
+        "import_tree": os.path.abspath(args.import_tree),
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "message_bytes": MESSAGE_BYTES,
+    }
+
+
+def compare(results, baseline_path, max_regression):
+    """Prints p50 ratios against a baseline report; returns the names of regressed cases."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"] if "latency" in r}
+    regressed = []
+    for result in results:
+        old = baseline.get(result["name"])
+        if old is None or "latency" not in result:
+            continue
+        ratio = result["latency"]["p50"] / old["latency"]["p50"]
+        flag = ' REGRESSION' if ratio > max_regression else ''
+        print(f'{result["name"]}: {ratio:.2f}x p50{flag}')
+        if flag:
+            regressed.append(result["name"])
+    return regressed
+
+
+def parse_sizes(text):
+    return [float(size) if '.' in size else int(size) for size in text.split(',') if size]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the steganography embed, extract and capacity paths.")
+    parser.add_argument('--images', type=parse_sizes, default=[0.1, 1, 10],
+                        help="image sizes in megapixels (default: 0.1,1,10)")
+    parser.add_argument('--audio', type=parse_sizes, default=[1, 60],
+                        help="WAV durations in seconds (default: 1,60)")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per case")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="threads for the hide/reveal engines, 0 for one per core (default: 1)")
+    parser.add_argument('--output', default='bench.json', help="JSON report to write")
+    parser.add_argument('--baseline', help="earlier JSON report to compare against")
+    parser.add_argument('--max-regression', type=float, default=1.25,
+                        help="p50 slowdown against the baseline counted as a regression")
+    parser.add_argument('--work-dir', help="folder for the generated covers (default: a temporary folder)")
+    parser.add_argument('--import-tree', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="source tree used by the cold-start cases (default: this one)")
+    args = parser.parse_args(argv)
+
+    with contextlib.ExitStack() as stack:
+        work_dir = args.work_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(work_dir, exist_ok=True)
+        results = []
+        for name in IMPORT_CASES:
+            result = run_import_case(name, os.path.abspath(args.import_tree), work_dir, args.repeat)
+            results.append(result)
+            if "error" in result:
+                print(f'{result["name"]}: error: {result["error"]}')
+            else:
+                print(f'{result["name"]}: p50 {result["latency"]["p50"] * 1e3:.1f} ms, '
+                      f'loads {", ".join(result["loaded"]) or "none of " + "/".join(HEAVY_MODULES)}')
+        for case in build_cases(work_dir, args.images, args.audio, args.repeat, args.workers):
+            # One process per case so peak RSS is not inherited from earlier cases
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(run_case, case).result()
+            results.append(result)
+            if "error" in result:
+                print(f'{result["name"]}: error: {result["error"]}')
+            else:
+                print(f'{result["name"]}: p50 {result["latency"]["p50"] * 1e3:.2f} ms, '
+                      f'{result["mb_per_second"]} MB/s, peak {result["peak_rss_mb"]} MB')
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"meta": metadata(args), "results": results}, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.baseline and compare(results, args.baseline, args.max_regression):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+SQLite catalog of the files shared through flask_app.py.
+
+Rows are written when an upload completes, so listing never touches the
+upload folder. Pages are ordered newest first and continued with an opaque
+cursor holding the (mtime, filename) of the last row, which the index on
+those columns answers without scanning earlier pages.
+
+    python -m catalog rebuild UPLOAD_FOLDER CATALOG_PATH
+"""
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import sqlite3
+import sys
+from contextlib import closing
+
+HASH_BLOCK_SIZE = 1024 * 1024
+MAX_PAGE_SIZE = 1000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    original_filename TEXT,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT,
+    media_type TEXT,
+    codec TEXT
+);
+CREATE INDEX IF NOT EXISTS files_by_mtime ON files (mtime, filename);
+CREATE INDEX IF NOT EXISTS files_by_media ON files (media_type, mtime, filename);
+CREATE INDEX IF NOT EXISTS files_by_sha256 ON files (sha256);
+'''
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def media_type(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def encode_cursor(row):
+    raw = json.dumps([row["mtime"], row["filename"]]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        mtime, filename = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(mtime), str(filename)
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+
+class Catalog:
+    def __init__(self, path):
+        self.path = path
+        self.created = not os.path.exists(path)
+        with closing(self._connect()) as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        # One short-lived connection per call keeps the catalog safe to use from any thread
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def add(self, folder, filename, original_filename=None, codec=None, sha256=None, mtime=None):
+        """Records a file of folder, hashing it unless sha256 is given; returns the row.
+
+        mtime defaults to the file's; pass the publish time for hard-linked files.
+        """
+        path = os.path.join(folder, filename)
+        stat = os.stat(path)
+        row = {
+            "filename": filename,
+            "original_filename": original_filename or filename,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime if mtime is None else mtime,
+            "sha256": sha256 or file_sha256(path),
+            "media_type": media_type(filename),
+            "codec": codec,
+        }
+        with closing(self._connect()) as db, db:
+            db.execute('INSERT OR REPLACE INTO files VALUES (:filename, :original_filename, :size, '
+                       ':mtime, :sha256, :media_type, :codec)', row)
+        return row
+
+    def touch(self, filename, mtime):
+        """Moves a file's catalogue time to mtime, e.g. when it is shared again; returns the row."""
+        with closing(self._connect()) as db, db:
+            db.execute('UPDATE files SET mtime = ? WHERE filename = ?', (mtime, filename))
+        return self.get(filename)
+
+    def remove(self, filename):
+        with closing(self._connect()) as db, db:
+            db.execute('DELETE FROM files WHERE filename = ?', (filename,))
+
+    def get(self, filename):
+        with closing(self._connect()) as db:
+            row = db.execute('SELECT * FROM files WHERE filename = ?', (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def older_than(self, timestamp):
+        with closing(self._connect()) as db:
+            return [row[0] for row in db.execute('SELECT filename FROM files WHERE mtime < ?', (timestamp,))]
+
+    def find(self, sha256, extension=None):
+        """Oldest file with the given content hash, optionally with the same extension, or None."""
+        with closing(self._connect()) as db:
+            rows = db.execute('SELECT * FROM files WHERE sha256 = ? ORDER BY mtime, filename', (sha256,))
+            for row in rows:
+                if extension is None or os.path.splitext(row["filename"])[1].lower() == extension.lower():
+                    return dict(row)
+        return None
+
+    def page(self, limit=100, cursor=None, media=None, codec=None, min_size=None, max_size=None,
+             since=None, sha256=None):
+        """Returns (rows, next_cursor) for one page, newest first.
+
+        media matches a MIME type ('audio/x-wav') or its major type ('audio');
+        since is a POSIX timestamp. next_cursor is None on the last page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        where = []
+        args = []
+        if cursor:
+            mtime, filename = decode_cursor(cursor)
+            where.append('(mtime < ? OR (mtime = ? AND filename < ?))')
+            args += [mtime, mtime, filename]
+        if media:
+            if '/' in media:
+                where.append('media_type = ?')
+                args.append(media)
+            else:
+                where.append('media_type LIKE ?')
+                args.append(media + '/%')
+        for clause, value in (('codec = ?', codec), ('size >= ?', min_size), ('size <= ?', max_size),
+                              ('mtime >= ?', since), ('sha256 = ?', sha256)):
+            if value is not None:
+                where.append(clause)
+                args.append(value)
+
+        query = 'SELECT * FROM files'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY mtime DESC, filename DESC LIMIT ?'
+        with closing(self._connect()) as db:
+            rows = [dict(row) for row in db.execute(query, args + [limit + 1])]
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def rebuild(self, folder):
+        """Re-indexes every file of folder and drops rows whose file is gone; returns the count."""
+        names = set()
+        for entry in os.scandir(folder):
+            if entry.is_file():
+                names.add(entry.name)
+                known = self.get(entry.name)
+                if known and known["size"] == entry.stat().st_size:
+                    continue
+                self.add(folder, entry.name, known and known["original_filename"], known and known["codec"])
+        with closing(self._connect()) as db, db:
+            stale = [row[0] for row in db.execute('SELECT filename FROM files') if row[0] not in names]
+            db.executemany('DELETE FROM files WHERE filename = ?', [(name,) for name in stale])
+        return len(names)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] != 'rebuild':
+        print("Usage: " + __doc__.strip().splitlines()[-1].strip())
+        return 2
+    count = Catalog(argv[2]).rebuild(argv[1])
+    print(f"Indexed {count} files")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""
+Registry of steganography codecs working on in-memory NumPy arrays.
+
+Every codec exposes the same bytes-in/bytes-out API:
+    codec.embed(cover_array, payload_bytes) -> stego_array
+    codec.extract(stego_array) -> payload_bytes
+    codec.capacity(cover_array) -> number of payload bytes that fit
+
+Images are arrays in PIL channel order as returned by load_image. Audio is the
+raw frame data of a WAV file as a (samples, sample_width) uint8 array as
+returned by load_wav. Decoding and encoding the container happens once in
+those helpers, so callers can run several codec calls on the same array
+without touching the disk. Payloads are wrapped in a framing.py frame, in the
+same stego layouts HideImage and HideAudio write; unframed data from older
+files is still read by extract, except in the sample mode, which has always
+been framed.
+
+The batch tool, metrics and the Flask job routes work on files instead:
+hide_file and reveal_file run a codec's HideImage/HideAudio and
+UnhideImage/UnhideAudio method, so every front end resolves methods here.
+
+    codec = get_codec('pvd-image')
+    pixels = load_image('cover.png')
+    png_bytes = image_to_png(codec.embed(pixels, b'secret'))
+"""
+import io
+import struct
+import tempfile
+import wave
+import zlib
+import numpy as np
+from lsb import embed_lsb, extract_lsb, lsb_bit_source
+from pvd import capacity_bits_pvd, embed_pvd_range, extract_pvd, pvd_range_bit_source, BAND_ROWS
+from audio_lsb import lsb_until_zero_run, BLOCK_FRAMES
+from framing import frame_bits, max_payload, read_frame
+
+CODECS = {}
+
+
+def register_codec(codec):
+    """Adds a codec instance to the registry under codec.name and returns it."""
+    CODECS[codec.name] = codec
+    return codec
+
+
+def get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown codec: {name}. Available: {', '.join(available_codecs())}")
+
+
+def available_codecs(media=None):
+    """Names of the registered codecs, optionally only those for 'image' or 'audio'."""
+    return sorted(name for name, codec in CODECS.items() if media is None or codec.media == media)
+
+
+def default_codec(path):
+    # Same choice as the Streamlit app: PVD for images, LSB for audio
+    return 'lsb-audio' if path.lower().endswith('.wav') else 'pvd-image'
+
+
+# -------------------------------
+# Files
+# -------------------------------
+def _check_options(codec, options):
+    if options.get('password') and not codec.scatter:
+        raise ValueError(f"Passwords are not supported by {codec.name}")
+
+
+def hide_file(name, cover_path, output_path, message, **options):
+    """Hides text in a cover file with codec name, writing the stego file to output_path."""
+    # hide imports this module, so it is only loaded here
+    from hide import HideImage, HideAudio
+    codec = get_codec(name)
+    _check_options(codec, options)
+    cls = HideAudio if codec.media == 'audio' else HideImage
+    getattr(cls(cover_path, output_path), codec.hide_method)(message, **codec.file_options, **options)
+
+
+def reveal_file(name, stego_path, **options):
+    """Text hidden in a stego file with codec name."""
+    from unhide import UnhideImage, UnhideAudio
+    codec = get_codec(name)
+    _check_options(codec, options)
+    cls = UnhideAudio if codec.media == 'audio' else UnhideImage
+    return getattr(cls(stego_path), codec.reveal_method)(**codec.file_options, **options)
+
+
+# -------------------------------
+# Containers
+# -------------------------------
+def load_image(source):
+    """Decodes an image path, file object or bytes into a uint8 array."""
+    # PIL is only loaded once an image is used
+    from PIL import Image
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+    if image.mode not in ('L', 'RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return np.array(image)
+
+
+def load_image_memmap(source, band_rows=BAND_ROWS):
+    """Decodes an image into a uint8 memmap backed by a temporary file.
+
+    The array is filled band by band, so besides the decoder's own buffer no
+    full-size copy is held in memory. A .npy path is mapped copy-on-write
+    instead, without decoding anything.
+    """
+    if isinstance(source, str) and source.endswith('.npy'):
+        return np.load(source, mmap_mode='c')
+    from PIL import Image
+    image = Image.open(source)
+    if image.mode not in ('L', 'RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    width, height = image.size
+    shape = (height, width) if image.mode == 'L' else (height, width, len(image.mode))
+    pixels = np.memmap(tempfile.TemporaryFile(), dtype=np.uint8, mode='w+', shape=shape)
+    for row in range(0, height, band_rows):
+        pixels[row:row + band_rows] = np.asarray(image.crop((0, row, width, min(height, row + band_rows))))
+    image.close()
+    return pixels
+
+
+# PNG colour type of each channel count
+PNG_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+
+def _png_chunk(f, kind, data):
+    f.write(struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data)))
+
+
+def save_png_bands(pixels, path, band_rows=BAND_ROWS):
+    """Writes a uint8 image array or memmap to a PNG file, band by band.
+
+    Image.fromarray copies the whole image before PIL encodes it; here only
+    one band of rows is read from pixels and compressed at a time, so a
+    memmap from load_image_memmap is written without a full-size copy.
+    Scanlines are stored unfiltered.
+    """
+    height, width = pixels.shape[:2]
+    channels = 1 if pixels.ndim == 2 else pixels.shape[2]
+    compressor = zlib.compressobj(6)
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        _png_chunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, PNG_COLOR_TYPES[channels], 0, 0, 0))
+        for row in range(0, height, band_rows):
+            band = np.asarray(pixels[row:row + band_rows], dtype=np.uint8).reshape(-1, width * channels)
+            # Filter type 0 in front of every scanline
+            lines = np.concatenate((np.zeros((len(band), 1), dtype=np.uint8), band), axis=1)
+            data = compressor.compress(lines.tobytes())
+            if data:
+                _png_chunk(f, b'IDAT', data)
+        _png_chunk(f, b'IDAT', compressor.flush())
+        _png_chunk(f, b'IEND', b'')
+
+
+def image_to_png(pixels):
+    """Encodes a uint8 image array as PNG bytes."""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def load_wav(source):
+    """Decodes a WAV path, file object or bytes into (samples, params).
+
+    samples is a (n_samples, sample_width) uint8 array over the raw frame
+    bytes, one row per sample of every channel.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with wave.open(source, 'rb') as audio:
+        params = audio.getparams()
+        frames = bytearray(audio.readframes(params.nframes))
+    return np.frombuffer(frames, dtype=np.uint8).reshape(-1, params.sampwidth), params
+
+
+def wav_to_bytes(samples, params):
+    """Encodes samples returned by load_wav back into WAV file bytes."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as encoded_audio:
+        encoded_audio.setparams(params)
+        encoded_audio.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+# -------------------------------
+# Codecs
+# -------------------------------
+class LsbImageCodec:
+    """HideImage.embed_bytes_lsb layout: a frame, one bit per BGR value."""
+    name = 'lsb-image'
+    media = 'image'
+    hide_method = 'embed_text_lsb'
+    reveal_method = 'extract_text_lsb'
+    scatter = True
+    file_options = {}
+
+    def _to_bgr(self, pixels):
+        # HideImage reads covers with cv2: three channels, blue first
+        if pixels.ndim == 2:
+            return np.repeat(pixels[:, :, np.newaxis], 3, axis=2)
+        return np.ascontiguousarray(pixels[:, :, 2::-1])
+
+    def capacity(self, pixels):
+        return max_payload(pixels.shape[0] * pixels.shape[1] * 3)
+
+    def embed(self, pixels, payload, compression='auto'):
+        stego = self._to_bgr(pixels)
+        embed_lsb(stego.reshape(-1), frame_bits(payload, self.name, compression))
+        return np.ascontiguousarray(stego[:, :, ::-1])
+
+    def extract(self, pixels):
+        flat = self._to_bgr(pixels).reshape(-1)
+        payload = read_frame(*lsb_bit_source(flat), codec=self.name)
+        if payload is None:
+            # Unframed, null-terminated data
+            return extract_lsb(flat)
+        return payload
+
+
+class PvdImageCodec:
+    """HideImage.embed_bytes_pvd layout: a frame in range-preserving PVD pairs."""
+    name = 'pvd-image'
+    media = 'image'
+    hide_method = 'embed_text_pvd'
+    reveal_method = 'extract_text_pvd'
+    scatter = False
+    file_options = {}
+
+    def capacity(self, pixels):
+        return max_payload(capacity_bits_pvd(pixels))
+
+    def embed(self, pixels, payload, compression='auto'):
+        stego = np.clip(pixels.astype(np.int32), 0, 255)
+        embed_pvd_range(stego, frame_bits(payload, self.name, compression))
+        return stego.astype(np.uint8)
+
+    def extract(self, pixels):
+        pixels = pixels.astype(np.int32)
+        payload = read_frame(*pvd_range_bit_source(pixels), codec=self.name)
+        if payload is not None:
+            return payload
+        # Unframed data behind the original 32-bit length prefix
+        bits = extract_pvd(pixels)
+        if bits is None:
+            return b''
+        return np.packbits(bits[:len(bits) // 8 * 8]).tobytes()
+
+
+class LsbAudioCodec:
+    """HideAudio.embed_bytes_lsb layout: a frame, one bit per frame byte."""
+    name = 'lsb-audio'
+    media = 'audio'
+    hide_method = 'embed_text_lsb'
+    reveal_method = 'extract_text_lsb'
+    scatter = True
+    file_options = {}
+
+    def capacity(self, samples):
+        return max_payload(samples.size)
+
+    def embed(self, samples, payload, compression='auto'):
+        stego = samples.copy()
+        embed_lsb(stego.reshape(-1), frame_bits(payload, self.name, compression))
+        return stego
+
+    def extract(self, samples):
+        flat = samples.reshape(-1)
+        payload = read_frame(*lsb_bit_source(flat), codec=self.name)
+        if payload is not None:
+            return payload
+        # Unframed data ends at the first run of eight zero bits
+        block = BLOCK_FRAMES * samples.shape[1]
+        bits = lsb_until_zero_run(flat[i:i + block] for i in range(0, flat.size, block))
+        # Null bytes are dropped like UnhideAudio does; a partial last byte is ignored
+        packed = np.packbits(bits[:len(bits) // 8 * 8])
+        return packed[packed != 0].tobytes()
+
+
+class SampleLsbAudioCodec:
+    """HideAudio.embed_bytes_sample_lsb layout: depth bits in each sample's low byte."""
+    media = 'audio'
+    hide_method = 'embed_text_sample_lsb'
+    reveal_method = 'extract_text_sample_lsb'
+    scatter = False
+
+    def __init__(self, depth=1, name='sample-lsb-audio'):
+        self.depth = depth
+        self.name = name
+        self.file_options = {'depth': depth}
+        self.shifts = np.arange(depth - 1, -1, -1, dtype=np.uint8)
+
+    def capacity(self, samples):
+        return max_payload(len(samples) * self.depth)
+
+    def embed(self, samples, payload, compression='auto'):
+        bits = frame_bits(payload, 'sample-lsb-audio', compression)
+        if len(bits) > len(samples) * self.depth:
+            raise ValueError("Message too long to encode in this audio file.")
+        padded = np.zeros(-(-len(bits) // self.depth) * self.depth, dtype=np.uint8)
+        padded[:len(bits)] = bits
+        values = (padded.reshape(-1, self.depth) @ (1 << self.shifts.astype(np.int64))).astype(np.uint8)
+
+        stego = samples.copy()
+        targets = stego[:len(values), 0]
+        keep = np.uint8(0xFF ^ ((1 << self.depth) - 1))
+        stego[:len(values), 0] = (targets & keep) | values
+        return stego
+
+    def _bits(self, samples, start, stop):
+        first = start // self.depth
+        low = samples[first:-(-stop // self.depth), 0]
+        bits = ((low[:, np.newaxis] >> self.shifts) & 1).reshape(-1)
+        offset = start - first * self.depth
+        return bits[offset:offset + stop - start]
+
+    def extract(self, samples):
+        total_bits = len(samples) * self.depth
+        payload = read_frame(lambda start, stop: self._bits(samples, start, stop), total_bits,
+                             codec='sample-lsb-audio')
+        if payload is None:
+            raise ValueError("No hidden data found in this audio file.")
+        return payload
+
+
+register_codec(LsbImageCodec())
+register_codec(PvdImageCodec())
+register_codec(LsbAudioCodec())
+register_codec(SampleLsbAudioCodec())
@@ -1,10 +1,29 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template_string
+from flask import Flask, Request, request, jsonify, send_from_directory, render_template_string
 import os
+import json
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
 import time
 from datetime import datetime
+from codec_registry import available_codecs, default_codec, get_codec
+from jobs import JobManager, QueueFullError
+from catalog import Catalog
+from store import BlobStore, expire_partial_uploads, file_digest
+import instrument
+
+
+class DiskRequest(Request):
+    """Streams uploaded files to temporary files next to the jobs instead of memory."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.NamedTemporaryFile('wb+', dir=JOB_FOLDER, suffix='.part')
+
 
 app = Flask(__name__)
+app.request_class = DiskRequest
 
 # Configuration
 UPLOAD_FOLDER = '/home/Ammarsaad123/flask_uploader/uploads'
@@ -13,12 +32,46 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Steganography jobs run in a pool of worker processes
+JOB_FOLDER = os.path.join(os.path.dirname(UPLOAD_FOLDER), 'jobs')
+JOB_WORKERS = int(os.environ.get('STEGO_JOB_WORKERS', 0)) or None
+JOB_MAX_PENDING = 64
+jobs = JobManager(JOB_FOLDER, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING)
+
+
+# Chunked uploads
+PARTIAL_FOLDER = os.path.join(os.path.dirname(UPLOAD_FOLDER), 'partial')
+os.makedirs(PARTIAL_FOLDER, exist_ok=True)
+MAX_CHUNKED_UPLOAD_SIZE = 1024 * 1024 * 1024  # 1GB per file, chunks are capped by MAX_CONTENT_LENGTH
+CHUNK_BLOCK_SIZE = 1024 * 1024
+# Uploads idle this long are abandoned; swept at start-up and by `python -m store gc --partial`
+PARTIAL_MAX_AGE = 24 * 60 * 60
+expire_partial_uploads(PARTIAL_FOLDER, PARTIAL_MAX_AGE)
+# One lock per upload id, so chunks of different uploads stream in parallel
+upload_locks = {}
+upload_locks_guard = threading.Lock()
+
+# Content-addressed store; published uploads are hard links into it
+STORE_FOLDER = os.path.join(os.path.dirname(UPLOAD_FOLDER), 'store')
+store = BlobStore(STORE_FOLDER)
+
+# File catalog behind /list, indexed once from the folder when first created
+CATALOG_PATH = os.path.join(os.path.dirname(UPLOAD_FOLDER), 'catalog.sqlite3')
+catalog = Catalog(CATALOG_PATH)
+if catalog.created:
+    catalog.rebuild(UPLOAD_FOLDER)
+LIST_PAGE_SIZE = 100
+
+# Uploaded files get unique names, so downloads may be cached for a year
+UPLOAD_CACHE_SECONDS = 365 * 24 * 3600
+
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'wav', 'mp3'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+
 # Home page with basic info
 @app.route('/')
 def home():
@@ -39,14 +92,24 @@ def home():
             <h2>API Endpoints:</h2>
             <ul>
                 <li><code>POST /upload</code> - Upload a file</li>
-                <li><code>GET /uploads/&lt;filename&gt;</code> - Retrieve uploaded file</li>
-                <li><code>GET /list</code> - List all uploaded files</li>
+                <li><code>POST /upload/chunked</code> - Start a resumable upload (filename, size)</li>
+                <li><code>PATCH /upload/chunked/&lt;id&gt;</code> - Append a chunk at Upload-Offset</li>
+                <li><code>GET /upload/chunked/&lt;id&gt;</code> - Current offset of an upload</li>
+                <li><code>POST /upload/chunked/&lt;id&gt;/complete</code> - Finish an upload</li>
+                <li><code>GET /uploads/&lt;filename&gt;</code> - Retrieve uploaded file (supports Range)</li>
+                <li><code>GET /uploads/sha256/&lt;digest&gt;</code> - Find an already uploaded file by content hash</li>
+                <li><code>GET /list</code> - List uploaded files (limit, cursor, type, codec, min_size, max_size, since)</li>
                 <li><code>GET /test</code> - Test endpoint</li>
+                <li><code>POST /jobs/hide</code> - Hide a message (file, message, method)</li>
+                <li><code>POST /jobs/reveal</code> - Reveal a message (file, method)</li>
+                <li><code>GET /jobs/&lt;id&gt;</code> - Job status, timing and result</li>
+                <li><code>GET /jobs</code> - Queue depth</li>
+                <li><code>GET /metrics</code> - Prometheus timing histograms (?format=json for JSON)</li>
             </ul>
             <h3>Allowed file types:</h3>
             <p>Images: PNG, JPG, JPEG, GIF</p>
             <p>Audio: WAV, MP3</p>
-            <p><strong>Max file size:</strong> 16MB</p>
+            <p><strong>Max file size:</strong> 16MB per request, 1GB with chunked uploads</p>
         </div>
     </body>
     </html>
@@ -84,28 +147,18 @@ def upload():
                 "error": "Invalid file type",
                 "allowed": list(ALLOWED_EXTENSIONS)
             }), 400
+
+        codec = request.form.get('codec') or None
+        if codec is not None and codec not in available_codecs():
+            return jsonify({"error": "Unknown codec", "allowed": available_codecs()}), 400
         
-        # Generate unique filename
+        # Hash the content into a staging file, then commit and publish it under the
+        # store lock so gc never sees the blob before it is linked
         original_filename = secure_filename(file.filename)
-        timestamp = str(int(time.time() * 1000))  # milliseconds for uniqueness
-        name, ext = os.path.splitext(original_filename)
-        filename = f"{name}_{timestamp}{ext}"
-        
-        # Save file
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Generate public URL
-        public_url = f"https://ammarsaad123.pythonanywhere.com/uploads/{filename}"
-        
-        return jsonify({
-            "status": "success",
-            "url": public_url,
-            "filename": filename,
-            "original_filename": original_filename,
-            "size": os.path.getsize(filepath),
-            "timestamp": datetime.now().isoformat()
-        }), 200
+        tmp_path, digest = store.stage(file.stream)
+        with store.lock():
+            store.commit(tmp_path, digest)
+            return publish(digest, original_filename, codec)
         
     except Exception as e:
         return jsonify({
@@ -113,13 +166,344 @@ def upload():
             "details": str(e)
         }), 500
 
+
+def unique_filename(original_filename):
+    timestamp = str(int(time.time() * 1000))  # milliseconds for uniqueness
+    name, ext = os.path.splitext(original_filename)
+    return f"{name}_{timestamp}{ext}"
+
+
+def publish(digest, original_filename, codec=None):
+    # Identical content already shared under the same extension keeps its URL
+    ext = os.path.splitext(original_filename)[1]
+    entry = catalog.find(digest, ext)
+    if entry is not None and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], entry["filename"])):
+        # Shared again now, so --expire-days counts from this upload
+        entry = catalog.touch(entry["filename"], time.time())
+        return upload_response(entry, deduplicated=True)
+
+    # Generate unique filename, a hard link to the stored content
+    filename = unique_filename(original_filename)
+    store.link(digest, os.path.join(app.config['UPLOAD_FOLDER'], filename))
+    fsync_dir(app.config['UPLOAD_FOLDER'])
+
+    # Record the file so /list never has to scan the folder
+    entry = catalog.add(app.config['UPLOAD_FOLDER'], filename, original_filename, codec,
+                        sha256=digest, mtime=time.time())
+    return upload_response(entry)
+
+
+def upload_response(entry, deduplicated=False):
+    filename = entry["filename"]
+
+    # Generate public URL
+    public_url = f"https://ammarsaad123.pythonanywhere.com/uploads/{filename}"
+
+    return jsonify({
+        "status": "success",
+        "url": public_url,
+        "filename": filename,
+        "original_filename": entry["original_filename"],
+        "size": entry["size"],
+        "sha256": entry["sha256"],
+        "media_type": entry["media_type"],
+        "codec": entry["codec"],
+        "deduplicated": deduplicated,
+        "timestamp": datetime.now().isoformat()
+    }), 200
+
+
+@app.route('/uploads/sha256/<digest>')
+def find_upload(digest):
+    # Lets clients skip uploading content that is already shared
+    entry = catalog.find(digest.lower(), request.args.get('ext'))
+    if entry is None or not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], entry["filename"])):
+        return jsonify({"error": "File not found"}), 404
+    return upload_response(entry, deduplicated=True)
+
+
+# Chunked, resumable uploads
+# Each request carries at most MAX_CONTENT_LENGTH bytes, the file as a whole up
+# to MAX_CHUNKED_UPLOAD_SIZE. Partial files live in PARTIAL_FOLDER until complete.
+def partial_paths(upload_id):
+    upload_id = secure_filename(upload_id)
+    return (os.path.join(PARTIAL_FOLDER, upload_id + '.part'),
+            os.path.join(PARTIAL_FOLDER, upload_id + '.json'))
+
+
+@contextmanager
+def upload_lock(upload_id):
+    """Serialises requests on one chunked upload; entries are dropped once unused."""
+    key = secure_filename(upload_id)
+    with upload_locks_guard:
+        entry = upload_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with upload_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del upload_locks[key]
+
+
+def load_partial(upload_id):
+    data_path, meta_path = partial_paths(upload_id)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    meta["offset"] = os.path.getsize(data_path)
+    return meta
+
+
+def parse_offset(value):
+    """Non-negative integer from a header or form value, or None if it is not one."""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number >= 0 else None
+
+
+def partial_status(upload_id, meta):
+    return {
+        "upload_id": upload_id,
+        "upload_url": f"/upload/chunked/{upload_id}",
+        "filename": meta["filename"],
+        "size": meta.get("size"),
+        "offset": meta["offset"],
+    }
+
+
+@app.route('/upload/chunked', methods=['POST'])
+def start_chunked_upload():
+    fields = request.get_json(silent=True) or request.args
+    original_filename = secure_filename(fields.get('filename', ''))
+    if not original_filename:
+        return jsonify({"error": "No filename provided"}), 400
+    if not allowed_file(original_filename):
+        return jsonify({
+            "error": "Invalid file type",
+            "allowed": list(ALLOWED_EXTENSIONS)
+        }), 400
+    size = fields.get('size')
+    if size is not None:
+        size = parse_offset(size)
+        if size is None:
+            return jsonify({"error": "Invalid size", "expected": "non-negative integer"}), 400
+        if size > MAX_CHUNKED_UPLOAD_SIZE:
+            return jsonify({"error": "File too large", "max_size": MAX_CHUNKED_UPLOAD_SIZE}), 413
+    codec = fields.get('codec') or None
+    if codec is not None and codec not in available_codecs():
+        return jsonify({"error": "Unknown codec", "allowed": available_codecs()}), 400
+
+    upload_id = uuid.uuid4().hex
+    data_path, meta_path = partial_paths(upload_id)
+    open(data_path, 'wb').close()
+    meta = {"filename": original_filename, "size": size, "codec": codec, "created": datetime.now().isoformat()}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    meta["offset"] = 0
+    return jsonify(partial_status(upload_id, meta)), 201
+
+
+@app.route('/upload/chunked/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    # Clients resume from the returned offset
+    meta = load_partial(upload_id)
+    if meta is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(partial_status(upload_id, meta))
+
+
+@app.route('/upload/chunked/<upload_id>', methods=['PATCH', 'PUT'])
+def append_chunk(upload_id):
+    offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+    if offset is None:
+        return jsonify({"error": "No offset provided", "expected": "Upload-Offset header or offset parameter"}), 400
+    offset = parse_offset(offset)
+    if offset is None:
+        return jsonify({"error": "Invalid offset", "expected": "non-negative integer"}), 400
+    data_path, _ = partial_paths(upload_id)
+    with upload_lock(upload_id):
+        meta = load_partial(upload_id)
+        if meta is None:
+            return jsonify({"error": "Upload not found"}), 404
+        if offset != meta["offset"]:
+            # A lost or repeated chunk; the client resends from our offset
+            return jsonify(dict(partial_status(upload_id, meta), error="Offset mismatch")), 409
+        limit = meta["size"] if meta["size"] is not None else MAX_CHUNKED_UPLOAD_SIZE
+
+        written = meta["offset"]
+        with open(data_path, 'r+b') as f:
+            f.seek(written)
+            while True:
+                block = request.stream.read(CHUNK_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > limit:
+                    f.truncate(meta["offset"])
+                    return jsonify({"error": "File too large", "max_size": limit}), 413
+                f.write(block)
+        meta["offset"] = written
+    return jsonify(partial_status(upload_id, meta))
+
+
+@app.route('/upload/chunked/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    # Under the upload's lock, so an append or complete in progress finishes first
+    with upload_lock(upload_id):
+        for path in partial_paths(upload_id):
+            if os.path.exists(path):
+                os.remove(path)
+    return jsonify({"status": "success", "upload_id": upload_id})
+
+
+@app.route('/upload/chunked/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    data_path, meta_path = partial_paths(upload_id)
+    with upload_lock(upload_id):
+        meta = load_partial(upload_id)
+        if meta is None:
+            return jsonify({"error": "Upload not found"}), 404
+        if meta["size"] is not None and meta["offset"] != meta["size"]:
+            return jsonify(dict(partial_status(upload_id, meta), error="Upload incomplete")), 409
+
+        # Make the data durable before it moves into the store; only this
+        # upload's lock is held, the store lock is taken for the commit alone
+        with open(data_path, 'rb+') as f:
+            os.fsync(f.fileno())
+        digest = file_digest(data_path)
+        with store.lock():
+            store.commit(data_path, digest)
+            os.remove(meta_path)
+            return publish(digest, meta["filename"], meta.get("codec"))
+
+
+def fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+# Steganography jobs
+def save_upload(file, path):
+    # Hard-link the spooled part into place; copy when linking is not possible
+    try:
+        file.stream.flush()
+        os.link(file.stream.name, path)
+    except (AttributeError, OSError):
+        file.save(path)
+
+
+def job_output_name(method):
+    return 'output.wav' if get_codec(method).media == 'audio' else 'output.png'
+
+
+def start_job(operation):
+    if jobs.pending() >= JOB_MAX_PENDING:
+        return jsonify({"error": "Job queue is full", "queue": jobs.stats()}), 503
+
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({"error": "No file provided", "expected": "file field in form data"}), 400
+    filename = secure_filename(file.filename)
+    if not allowed_file(filename):
+        return jsonify({"error": "Invalid file type", "allowed": list(ALLOWED_EXTENSIONS)}), 400
+
+    method = request.form.get('method') or default_codec(filename)
+    if method not in available_codecs():
+        return jsonify({"error": "Unknown method", "allowed": available_codecs()}), 400
+    row = {"operation": operation, "method": method}
+    if operation == 'hide':
+        if 'message' not in request.form:
+            return jsonify({"error": "No message provided"}), 400
+        row["message"] = request.form['message']
+
+    job_id, job_dir = jobs.new_job_dir()
+    try:
+        row["cover"] = os.path.join(job_dir, 'cover' + os.path.splitext(filename)[1].lower())
+        save_upload(file, row["cover"])
+        if operation == 'hide':
+            row["output"] = os.path.join(job_dir, job_output_name(method))
+        job = jobs.submit(job_id, row)
+    except Exception as e:
+        # The job never started, nothing else will remove its folder
+        shutil.rmtree(job_dir, ignore_errors=True)
+        if isinstance(e, QueueFullError):
+            return jsonify({"error": str(e), "queue": jobs.stats()}), 503
+        return jsonify({"error": "Job could not be started", "details": str(e)}), 500
+    job["status_url"] = f"/jobs/{job_id}"
+    job["queue"] = jobs.stats()
+    return jsonify(job), 202
+
+
+@app.route('/jobs/hide', methods=['POST'])
+def hide_job():
+    return start_job('hide')
+
+
+@app.route('/jobs/reveal', methods=['POST'])
+def reveal_job():
+    return start_job('reveal')
+
+
+@app.route('/jobs')
+def job_queue():
+    return jsonify({"status": "success", "queue": jobs.stats()})
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["operation"] == 'hide' and job["status"] == 'success':
+        job["result_url"] = f"/jobs/{job_id}/result"
+    return jsonify(job)
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None or job["operation"] != 'hide' or job["status"] != 'success':
+        return jsonify({"error": "Result not available"}), 404
+    return send_from_directory(os.path.join(JOB_FOLDER, job_id), job_output_name(job["method"]), as_attachment=True)
+
+
+# Timing spans of the hide/unhide code, enabled with STEGO_PROFILE=1
+@app.route('/metrics')
+def metrics():
+    queue = jobs.stats()
+    if request.args.get('format') == 'json':
+        return jsonify({"enabled": instrument.enabled(), "queue": queue, **instrument.snapshot()})
+    lines = ['# HELP stego_jobs Steganography jobs by state.', '# TYPE stego_jobs gauge']
+    for state in ('queued', 'running', 'finished'):
+        lines.append(f'stego_jobs{{state="{state}"}} {queue[state]}')
+    text = '\n'.join(lines) + '\n' + instrument.to_prometheus()
+    return text, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
 # Serve uploaded files
 @app.route('/uploads/<filename>')
 def serve_file(filename):
     try:
         # Security check - ensure filename doesn't contain path traversal
         filename = secure_filename(filename)
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        # Stored names never change content, so caches may keep them; Range,
+        # ETag and If-None-Match/If-Modified-Since are answered by send_file
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename,
+                                   conditional=True, max_age=UPLOAD_CACHE_SECONDS)
     except Exception as e:
         return jsonify({
             "error": "File not found",
@@ -129,22 +513,40 @@ def serve_file(filename):
 # List all uploaded files (optional - remove if you don't want this)
 @app.route('/list')
 def list_files():
+    # Pages of LIST_PAGE_SIZE files, newest first; pass next_cursor back as cursor
+    try:
+        args = request.args
+        since = args.get('since')
+        rows, next_cursor = catalog.page(
+            limit=args.get('limit', LIST_PAGE_SIZE, type=int),
+            cursor=args.get('cursor'),
+            media=args.get('type'),
+            codec=args.get('codec'),
+            min_size=args.get('min_size', type=int),
+            max_size=args.get('max_size', type=int),
+            since=datetime.fromisoformat(since).timestamp() if since else None,
+            sha256=args.get('sha256'),
+        )
+    except ValueError as e:
+        return jsonify({"error": "Invalid list parameters", "details": str(e)}), 400
     try:
         files = []
-        for filename in os.listdir(app.config['UPLOAD_FOLDER']):
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            if os.path.isfile(filepath):
-                files.append({
-                    "filename": filename,
-                    "url": f"https://ammarsaad123.pythonanywhere.com/uploads/{filename}",
-                    "size": os.path.getsize(filepath),
-                    "modified": datetime.fromtimestamp(os.path.getmtime(filepath)).isoformat()
-                })
+        for row in rows:
+            files.append({
+                "filename": row["filename"],
+                "url": f"https://ammarsaad123.pythonanywhere.com/uploads/{row['filename']}",
+                "size": row["size"],
+                "modified": datetime.fromtimestamp(row["mtime"]).isoformat(),
+                "sha256": row["sha256"],
+                "media_type": row["media_type"],
+                "codec": row["codec"]
+            })
         
         return jsonify({
             "status": "success",
             "count": len(files),
-            "files": files
+            "files": files,
+            "next_cursor": next_cursor
         })
     except Exception as e:
         return jsonify({
@@ -164,7 +566,9 @@ def request_entity_too_large(e):
 def not_found(e):
     return jsonify({
         "error": "Endpoint not found",
-        "available_endpoints": ["/", "/upload", "/uploads/<filename>", "/list", "/test"]
+        "available_endpoints": ["/", "/upload", "/uploads/<filename>", "/list", "/test",
+                                "/upload/chunked", "/upload/chunked/<id>",
+                                "/jobs/hide", "/jobs/reveal", "/jobs", "/jobs/<id>", "/metrics"]
     }), 404
 
 @app.errorhandler(500)
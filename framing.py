@@ -0,0 +1,166 @@
+"""
+Binary framing used by every codec.
+
+Frame layout:
+    magic      3 bytes   b'STG'
+    version    1 byte
+    codec id   1 byte    see CODEC_IDS
+    flags      1 byte    compression: 0 none, 1 zlib, 2 lzma
+    length     varint    size of the stored (possibly compressed) payload
+    payload    length bytes
+    crc32      4 bytes   big-endian, over everything above
+
+Extraction reads the fixed header first, then exactly the announced number of
+bytes, so no terminator is needed and payloads may contain any byte value.
+"""
+import lzma
+import zlib
+import numpy as np
+
+MAGIC = b'STG'
+VERSION = 1
+HEADER_SIZE = len(MAGIC) + 3
+CRC_SIZE = 4
+MAX_VARINT_BYTES = 10
+
+CODEC_IDS = {
+    'lsb-image': 1,
+    'pvd-image': 2,
+    'lsb-audio': 3,
+    'sample-lsb-audio': 4,
+}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+NO_COMPRESSION = 0
+ZLIB = 1
+LZMA = 2
+COMPRESSIONS = {None: NO_COMPRESSION, 'none': NO_COMPRESSION, 'zlib': ZLIB, 'lzma': LZMA}
+
+
+class FrameError(ValueError):
+    pass
+
+
+def encode_varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def frame_overhead(stored_length):
+    """Bytes a frame adds around a stored payload of the given size."""
+    return HEADER_SIZE + len(encode_varint(stored_length)) + CRC_SIZE
+
+
+def max_payload(total_bits):
+    """Largest uncompressed payload, in bytes, whose frame fits in total_bits."""
+    available = total_bits // 8
+    n = available - HEADER_SIZE - CRC_SIZE - 1
+    while n > 0 and n + frame_overhead(n) > available:
+        n -= 1
+    return max(0, n)
+
+
+def compress(payload, compression='auto'):
+    """Returns (flag, stored bytes); 'auto' keeps zlib output only when it is smaller."""
+    if compression == 'auto':
+        packed = zlib.compress(payload, 9)
+        if len(packed) < len(payload):
+            return ZLIB, packed
+        return NO_COMPRESSION, payload
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    flag = COMPRESSIONS[compression]
+    if flag == ZLIB:
+        return flag, zlib.compress(payload, 9)
+    if flag == LZMA:
+        return flag, lzma.compress(payload)
+    return flag, payload
+
+
+def decompress(flag, stored):
+    try:
+        if flag == ZLIB:
+            return zlib.decompress(stored)
+        if flag == LZMA:
+            return lzma.decompress(stored)
+    except (zlib.error, lzma.LZMAError) as e:
+        raise FrameError(f"Hidden data could not be decompressed: {e}")
+    if flag == NO_COMPRESSION:
+        return stored
+    raise FrameError(f"Unknown compression flag {flag}.")
+
+
+def pack_frame(payload, codec, compression='auto'):
+    """Wraps payload bytes in a frame for the named codec."""
+    flag, stored = compress(bytes(payload), compression)
+    head = MAGIC + bytes([VERSION, CODEC_IDS[codec], flag]) + encode_varint(len(stored)) + stored
+    return head + zlib.crc32(head).to_bytes(CRC_SIZE, 'big')
+
+
+def frame_bits(payload, codec, compression='auto'):
+    """pack_frame as a 0/1 uint8 bit array, most significant bit first."""
+    return np.unpackbits(np.frombuffer(pack_frame(payload, codec, compression), dtype=np.uint8))
+
+
+def read_frame(read_bits, total_bits, codec=None):
+    """Reads a frame from a bit source and returns its payload.
+
+    read_bits(start, stop) must return the cover's bits in that range as a 0/1
+    array. total_bits may be None when the capacity is not known up front; the
+    source then returns fewer bits than asked at the end of the cover. Returns
+    None when the cover does not start with a frame, so callers can fall back
+    to the unframed layouts.
+    """
+    position = 0
+
+    def read_bytes(n):
+        nonlocal position
+        stop = position + 8 * n
+        if total_bits is not None and stop > total_bits:
+            raise FrameError("Hidden data is truncated.")
+        bits = read_bits(position, stop)
+        if len(bits) < 8 * n:
+            raise FrameError("Hidden data is truncated.")
+        position = stop
+        return np.packbits(bits).tobytes()
+
+    if total_bits is not None and total_bits < 8 * (HEADER_SIZE + 1 + CRC_SIZE):
+        return None
+    try:
+        header = read_bytes(HEADER_SIZE)
+    except FrameError:
+        return None
+    if header[:len(MAGIC)] != MAGIC:
+        return None
+    version, codec_id, flag = header[len(MAGIC):]
+    if version != VERSION:
+        raise FrameError(f"Unsupported frame version {version}.")
+
+    varint = b''
+    length = 0
+    for shift in range(0, 7 * MAX_VARINT_BYTES, 7):
+        byte = read_bytes(1)
+        varint += byte
+        length |= (byte[0] & 0x7F) << shift
+        if not byte[0] & 0x80:
+            break
+    else:
+        raise FrameError("Invalid frame length.")
+    if total_bits is not None and position + 8 * (length + CRC_SIZE) > total_bits:
+        raise FrameError("Hidden data length exceeds the capacity of the file.")
+
+    body = read_bytes(length + CRC_SIZE)
+    stored, crc = body[:length], body[length:]
+    if zlib.crc32(header + varint + stored) != int.from_bytes(crc, 'big'):
+        raise FrameError("Hidden data is corrupted (CRC mismatch).")
+    if codec is not None and codec_id != CODEC_IDS[codec]:
+        name = CODEC_NAMES.get(codec_id, f"unknown codec {codec_id}")
+        raise FrameError(f"Hidden data was written with {name}, not {codec}.")
+    return decompress(flag, stored)
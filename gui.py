@@ -1,15 +1,10 @@
 import streamlit as st
-from hide import HideImage, HideAudio
 from unhide import UnhideImage, UnhideAudio
-from operations import *
-import os
-import cv2
-import wave
-import numpy as np
-import matplotlib.pyplot as plt
 
+import hashlib
 import requests
 from urllib.parse import quote
+from codec_registry import get_codec, load_image, image_to_png, load_wav, wav_to_bytes
 
 # Initialize session state
 if 'image_encoded' not in st.session_state:
@@ -22,6 +17,50 @@ if 'audio_encoded' not in st.session_state:
 # -------------------------------
 st.set_page_config(page_title="Steganography Assistant", layout="wide")
 
+IMAGE_CODEC = 'pvd-image'
+AUDIO_CODEC = 'lsb-audio'
+
+# -------------------------------
+# In-memory pipeline
+# -------------------------------
+# Uploads are decoded once and results are cached by content hash. Arguments
+# starting with an underscore are not hashed by Streamlit, the digest is the key.
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def find_shared_file(data, ext):
+    # The server answers 200 with the existing link when this content was shared before
+    return requests.get(
+        f"https://ammarsaad123.pythonanywhere.com/uploads/sha256/{content_hash(data)}",
+        params={"ext": ext}
+    )
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def decode_image(digest, _data):
+    return load_image(_data)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def image_capacity(digest, _pixels):
+    return get_codec(IMAGE_CODEC).capacity(_pixels)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def encode_image(digest, message, _pixels):
+    stego = get_codec(IMAGE_CODEC).embed(_pixels, message.encode('utf-8'))
+    return image_to_png(stego)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def decode_audio(digest, _data):
+    return load_wav(_data)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def audio_capacity(digest, _samples):
+    return get_codec(AUDIO_CODEC).capacity(_samples)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def encode_audio(digest, message, _samples, _params):
+    stego = get_codec(AUDIO_CODEC).embed(_samples, message.encode('utf-8'))
+    return wav_to_bytes(stego, _params)
+
 # -------------------------------
 # Title and Branding
 # -------------------------------
@@ -55,19 +94,19 @@ if process:
                 uploaded_img = st.file_uploader("Supported formats: PNG (recommended), JPG", type=["png", "jpg", "jpeg"], key="img_uploader_hide")
 
             if uploaded_img:
-                # Save the uploaded image temporarily to disk for processing
-                if st.session_state.get('current_uploaded_image') != uploaded_img.name:
+                # Decode the upload once, capacity, embedding and previews share the array
+                image_data = uploaded_img.getvalue()
+                image_digest = content_hash(image_data)
+                if st.session_state.get('current_uploaded_image') != image_digest:
                     st.session_state.image_encoded = False
-                    st.session_state.encoded_image_path = ""
-                    st.session_state.current_uploaded_image = uploaded_img.name
-                original_path = "temp_uploaded_image.png"
-                with open(original_path, "wb") as f:
-                    f.write(uploaded_img.getbuffer())
+                    st.session_state.encoded_image = None
+                    st.session_state.current_uploaded_image = image_digest
+                pixels = decode_image(image_digest, image_data)
 
                 with col1:
-                    st.image(original_path, caption="Original Image", use_container_width=True)
-                    capacity = max_capacity_image(original_path)
-                    st.info(f"Estimated capacity: ~{capacity} characters.")
+                    st.image(pixels, caption="Original Image", use_container_width=True)
+                    capacity = image_capacity(image_digest, pixels)
+                    st.info(f"Capacity: {capacity} bytes (UTF-8).")
 
                 with col2:
                     st.subheader("✉️ Enter Your Secret Message")
@@ -75,15 +114,11 @@ if process:
 
                     if st.button("Hide Message in Image"):
                         if message: # Check if message is not empty
-                            output_path = "encoded_image.png"
                             try:
-                                stego_img = HideImage(original_path, output_path)
-                                stego_img.embed_text_pvd(message) # Assumes PVD method from your lib
-                                st.success("✅ Message embedded successfully!")
-
-                                # Store the encoded image path in session state
-                                st.session_state.encoded_image_path = output_path
+                                # Store the encoded PNG bytes in session state
+                                st.session_state.encoded_image = encode_image(image_digest, message, pixels)
                                 st.session_state.image_encoded = True
+                                st.success("✅ Message embedded successfully!")
                                 
                             except Exception as e:
                                 st.error(f"❌ An error occurred during encoding: {e}")
@@ -93,21 +128,19 @@ if process:
                     # *** ADD THIS SECTION - DOWNLOAD AND SHARE BUTTONS FOR IMAGE ***
                     # Show encoded image and buttons when image is encoded
                     if st.session_state.get('image_encoded', False):
-                        output_path = st.session_state.encoded_image_path
+                        encoded_image = st.session_state.encoded_image
                         
                         # Show the encoded image
-                        st.image(output_path, caption="Stego Image (with hidden message)", use_container_width=True)
+                        st.image(encoded_image, caption="Stego Image (with hidden message)", use_container_width=True)
                         
                         # Download and Share buttons
                         btn_col1, btn_col2 = st.columns(2)
                         
                         with btn_col1:
                             # Download button
-                            with open(output_path, "rb") as file:
-                                file_data = file.read()
                             st.download_button(
                                 label="📥 Download Image",
-                                data=file_data,
+                                data=encoded_image,
                                 file_name="encoded_image.png",
                                 mime="image/png"
                             )
@@ -117,8 +150,10 @@ if process:
                             if st.button("📱 Share via social media", key="share_img_whatsapp"):
                                 with st.spinner("Uploading..."):
                                     try:
-                                        with open(output_path, "rb") as f:
-                                            files = {"image": ("encoded_image.png", f, "image/png")}
+                                        # Reuse the link of an identical earlier share
+                                        response = find_shared_file(encoded_image, ".png")
+                                        if response.status_code != 200:
+                                            files = {"image": ("encoded_image.png", encoded_image, "image/png")}
                                             response = requests.post(
                                                 "https://ammarsaad123.pythonanywhere.com/upload",
                                                 files=files
@@ -150,20 +185,19 @@ if process:
                 st.session_state.char_count_audio = 0
 
             if uploaded_audio:
-                # Save the uploaded audio temporarily to disk for processing
-                if st.session_state.get('current_uploaded_audio') != uploaded_audio.name:
+                # Decode the upload once, capacity and embedding share the samples
+                audio_data = uploaded_audio.getvalue()
+                audio_digest = content_hash(audio_data)
+                if st.session_state.get('current_uploaded_audio') != audio_digest:
                     st.session_state.audio_encoded = False
-                    st.session_state.encoded_audio_path = ""
-                    st.session_state.current_uploaded_audio = uploaded_audio.name
-                    
-                original_audio_path = "temp_uploaded_audio.wav"
-                with open(original_audio_path, "wb") as f:
-                    f.write(uploaded_audio.getbuffer())
+                    st.session_state.encoded_audio = None
+                    st.session_state.current_uploaded_audio = audio_digest
+                samples, audio_params = decode_audio(audio_digest, audio_data)
 
                 with col1:
-                    st.audio(original_audio_path, format="audio/wav")
-                    capacity = max_capacity_audio(original_audio_path)
-                    st.info(f"File capacity: ~{capacity} characters.")
+                    st.audio(audio_data, format="audio/wav")
+                    capacity = audio_capacity(audio_digest, samples)
+                    st.info(f"File capacity: {capacity} bytes (UTF-8).")
 
                 with col2:
                     st.subheader("✉️ Enter Your Secret Message")
@@ -171,7 +205,8 @@ if process:
                     counter_placeholder = st.empty()
                     
                     def update_audio_count():
-                        st.session_state.char_count_audio = len(st.session_state.msg_hide_audio)
+                        # Capacity is in bytes, so count the message's UTF-8 bytes, not its characters
+                        st.session_state.char_count_audio = len(st.session_state.msg_hide_audio.encode('utf-8'))
                     
                     message = st.text_area("Type the secret message:", 
                                         height=150, 
@@ -183,35 +218,45 @@ if process:
                         count = st.session_state.char_count_audio
                         if capacity > 0:
                             if count <= capacity:
-                                st.caption(f"**{count}/{capacity}** characters")
+                                st.caption(f"**{count}/{capacity}** bytes")
                             else:
-                                st.caption(f":red[**{count}/{capacity}** characters - Too long!]")
+                                st.caption(f":red[**{count}/{capacity}** bytes - Too long!]")
                     
                     if st.button("Hide Message in Audio"):
                         if message: # Check if message is not empty
-                            output_path = "encoded_audio.wav"
                             try:
-                                stego_audio = HideAudio(original_audio_path, output_path)
-                                stego_audio.embed_text_lsb(message) 
-                                st.success("✅ Message successfully embedded into the audio.")
-                                st.session_state.encoded_audio_path = output_path
+                                st.session_state.encoded_audio = encode_audio(audio_digest, message, samples, audio_params)
                                 st.session_state.audio_encoded = True
+                                st.success("✅ Message successfully embedded into the audio.")
                             except Exception as e:
                                 st.error(f"❌ An error occurred during encoding: {e}")
                                 st.warning("The message might be too long for this audio file. Try a shorter message or a longer audio file.")
                         else:
                             st.warning("⚠️ Please enter a message to hide.")
                     if st.session_state.get('audio_encoded', False):
-                        output_path = st.session_state.encoded_audio_path
+                        encoded_audio = st.session_state.encoded_audio
                         
                         # Show the encoded audio
-                        st.audio(output_path, format="audio/wav")
+                        st.audio(encoded_audio, format="audio/wav")
+                        
+                        # Envelopes of both files and of their difference, drawn only on request
+                        if st.checkbox("Show waveform comparison", key="audio_waveform"):
+                            import matplotlib.pyplot as plt
+                            from operations import plot_waveform
+                            fig, (ax_original, ax_encoded) = plt.subplots(2, 1, figsize=(8, 5), sharex=True)
+                            plot_waveform(audio_data, "Original", ax_original)
+                            plot_waveform(encoded_audio, "Encoded (red: difference)", ax_encoded, compare_to=audio_data)
+                            fig.tight_layout()
+                            st.pyplot(fig)
+                            plt.close(fig)
                         
                         if st.button("📱 Share via social media", key="share_audio_social"):
                             with st.spinner("Uploading..."):
                                 try:
-                                    with open(output_path, "rb") as f:
-                                        files = {"file": ("encoded_audio.wav", f, "audio/wav")}  # Use 'file' not 'image'
+                                    # Reuse the link of an identical earlier share
+                                    response = find_shared_file(encoded_audio, ".wav")
+                                    if response.status_code != 200:
+                                        files = {"file": ("encoded_audio.wav", encoded_audio, "audio/wav")}  # Use 'file' not 'image'
                                         response = requests.post(
                                             "https://ammarsaad123.pythonanywhere.com/upload",
                                             files=files
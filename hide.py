@@ -1,137 +1,109 @@
-import wave
-import cv2
-from PIL import Image
+# OpenCV and PIL are imported inside the image methods on first use, so audio
+# callers and process start-up never load them
 import numpy as np
-from operations import *
-
+from operations import capacity_bytes, max_capacity_audio
+from lsb import embed_lsb, embed_lsb_parallel
+from audio_lsb import embed_lsb_wav, embed_lsb_wav_scattered, embed_sample_lsb_wav
+from pvd import embed_pvd_range, embed_pvd_range_parallel, embed_pvd_range_tiled
+from codec_registry import load_image_memmap
+from framing import frame_bits
+from scatter import embed_lsb_scattered
+from instrument import span
+
+# workers > 1 (or None for one thread per core) selects the multi-threaded
+# engines; their output is identical to the serial ones. A password scatters the
+# LSB payload over keyed positions instead of the first values, and the same
+# password is needed to extract it
 class HideImage:
     def __init__(self, image_path, output_path):
         self.image_path = image_path
         self.output_path = output_path
 
-    def embed_text_lsb(self, message):
+    def embed_text_lsb(self, message, compression='auto', workers=1, password=None):
+        self.embed_bytes_lsb(message.encode('utf-8'), compression, workers, password)
+
+    # Hide any bytes (text, files) in a framed payload, one bit per BGR value
+    def embed_bytes_lsb(self, data, compression='auto', workers=1, password=None):
+        import cv2
         try:
-            image = cv2.imread(self.image_path)
+            with span('HideImage.embed_bytes_lsb.load'):
+                image = cv2.imread(self.image_path)
             if image is None:
                 raise ValueError("Image not found. Check the path.")
-            binary_message = ''.join(format(ord(char), '08b') for char in message) + '00000000'
-            message_len = len(binary_message)
-            flat_image = image.flatten().astype(np.int16)
-            if message_len > len(flat_image):
-                raise ValueError("Message is too long to fit in the image.")
-            for i in range(message_len):
-                original_pixel = flat_image[i]
-                original_pixel &= ~1
-                original_pixel = np.clip(original_pixel, -32768, 32767)
-                message_bit = int(binary_message[i])
-                modified_pixel = original_pixel | message_bit
-                modified_pixel = np.clip(modified_pixel, -32768, 32767)
-                flat_image[i] = modified_pixel
-            flat_image = np.clip(flat_image, 0, 255).astype(np.uint8)
-            stego_image = flat_image.reshape(image.shape)
-            cv2.imwrite(self.output_path, stego_image)
+            with span('HideImage.embed_bytes_lsb.frame'):
+                binary_message = frame_bits(data, 'lsb-image', compression)
+            # Modify a flat view of the image in place instead of bit by bit
+            with span('HideImage.embed_bytes_lsb.embed'):
+                stego_image = np.ascontiguousarray(image)
+                if password:
+                    embed_lsb_scattered(stego_image.reshape(-1), binary_message, password)
+                elif workers == 1:
+                    embed_lsb(stego_image.reshape(-1), binary_message)
+                else:
+                    embed_lsb_parallel(stego_image.reshape(-1), binary_message, workers)
+            with span('HideImage.embed_bytes_lsb.write'):
+                cv2.imwrite(self.output_path, stego_image)
         except Exception as e:
             raise ValueError(f"Error embedding text: {e}") 
 
     def get_stego_image(self):
         # Return the stego image as a PIL Image object
+        from PIL import Image
         return Image.open(self.output_path)
 
     # Function to encode a message into an image using PVD
-    def embed_text_pvd(self, secret_message):
-        # Load the image
-        image = Image.open(self.image_path)
-        pixels = np.array(image, dtype=np.int32)
-    
-        binary_msg = str_to_bin(secret_message)
-        length_prefix = format(len(binary_msg), '032b')
-        binary_message = length_prefix + binary_msg
+    def embed_text_pvd(self, secret_message, compression='auto', tiled=False, workers=1):
+        self.embed_bytes_pvd(secret_message.encode('utf-8'), compression, tiled, workers)
+
+    def embed_bytes_pvd(self, data, compression='auto', tiled=False, workers=1):
+        from PIL import Image
+        with span('HideImage.embed_bytes_pvd.frame'):
+            binary_message = frame_bits(data, 'pvd-image', compression)
+        if tiled:
+            # Very large images: uint8 memmap processed in row bands, stops after the payload
+            with span('HideImage.embed_bytes_pvd.load'):
+                pixels = load_image_memmap(self.image_path)
+            with span('HideImage.embed_bytes_pvd.embed'):
+                if workers == 1:
+                    embed_pvd_range_tiled(pixels, binary_message)
+                else:
+                    embed_pvd_range_parallel(pixels, binary_message, workers)
+            with span('HideImage.embed_bytes_pvd.write'):
+                Image.fromarray(np.asarray(pixels)).save(self.output_path)
+            return
 
-        binary_index = 0
-    
-        # Determine image dimensions
-        if len(pixels.shape) == 2:  # Grayscale image
-            rows, cols = pixels.shape
-            channels = 1
-        else:  # Color image
-            rows, cols, channels = pixels.shape
-    
-        for channel in range(channels):
-            channel_data = pixels if channels == 1 else pixels[:, :, channel]
-    
-            for row in range(rows):
-                for col in range(0, cols - 1, 2):
-                    if binary_index >= len(binary_message):
-                        break
-    
-                    # Get the pixel pair
-                    p1 = channel_data[row, col]
-                    p2 = channel_data[row, col + 1]
-    
-                    # Calculate the difference between pixel values
-                    diff = abs(p1 - p2)
-    
-                    # Determine embedding capacity
-                    bit_capacity = get_capacity(diff)
-    
-                    # Extract bits to embed
-                    bits_to_embed = binary_message[binary_index:binary_index + bit_capacity]
-                    if not bits_to_embed:
-                        break
-                    binary_index += bit_capacity
-    
-                    # Embed the bits into the pixel pair
-                    value_to_embed = int(bits_to_embed, 2)
-    
-                    if p1 > p2:
-                        p2 = max(0, p1 - value_to_embed)
-                    else:
-                        p1 = max(0, p2 - value_to_embed)
-    
-                    # Clip pixel values to the valid range [0, 255]
-                    p1 = min(255, max(0, p1))
-                    p2 = min(255, max(0, p2))
-    
-                    # Update pixel pair
-                    channel_data[row, col], channel_data[row, col + 1] = p1, p2
-    
-            # Save the updated channel back
-            if channels > 1:
-                pixels[:, :, channel] = channel_data
+        # Load the image
+        with span('HideImage.embed_bytes_pvd.load'):
+            image = Image.open(self.image_path)
+            pixels = np.clip(np.array(image, dtype=np.int32), 0, 255)
+
+        # All pair differences and capacities are computed at once
+        with span('HideImage.embed_bytes_pvd.embed'):
+            if workers == 1:
+                embed_pvd_range(pixels, binary_message)
+            else:
+                # Row bands on a thread pool, offsets from the band capacities
+                embed_pvd_range_parallel(pixels, binary_message, workers)
     
         # Convert pixel values back to uint8 for image creation
-        pixels = np.uint8(np.clip(pixels, 0, 255))
+        with span('HideImage.embed_bytes_pvd.write'):
+            pixels = np.uint8(pixels)
     
-        # Save the stego image
-        stego_image = Image.fromarray(pixels)
-        stego_image.save(self.output_path)
+            # Save the stego image
+            stego_image = Image.fromarray(pixels)
+            stego_image.save(self.output_path)
 
     # New method to calculate max letters that can be hidden using PVD
     def calculate_max_letters_pvd(self):
-        image = Image.open(self.image_path)
-        pixels = np.array(image, dtype=np.int32)
-
-        if len(pixels.shape) == 2:  # Grayscale image
-            rows, cols = pixels.shape
-            channels = 1
-        else:
-            rows, cols, channels = pixels.shape
-
-        total_bits = 0
-
-        for channel in range(channels):
-            channel_data = pixels if channels == 1 else pixels[:, :, channel]
-
-            for row in range(rows):
-                for col in range(0, cols - 1, 2):
-                    p1 = channel_data[row, col]
-                    p2 = channel_data[row, col + 1]
-                    diff = abs(p1 - p2)
-                    total_bits += get_capacity(diff)
-
-        max_letters = total_bits // 8  # 8 bits per letter
+        # Bytes left after the frame header, one per ASCII letter; cached by content hash
+        with span('HideImage.calculate_max_letters_pvd.capacity'):
+            max_letters = capacity_bytes(self.image_path, 'pvd-image')
         return max_letters
 
+    def calculate_max_letters_lsb(self):
+        with span('HideImage.calculate_max_letters_lsb.capacity'):
+            return capacity_bytes(self.image_path, 'lsb-image')
+
 
 class HideAudio:
     def __init__(self, audio_path, output_path):
@@ -141,23 +113,39 @@ class HideAudio:
     def text_to_bits(self, text):
         return ''.join(format(ord(char), '08b') for char in text) + '00000000'
 
-    def embed_text_lsb(self, message):
-        try:
-            with wave.open(self.audio_path, 'rb') as audio:
-                params = audio.getparams()
-                frame_bytes = bytearray(list(audio.readframes(audio.getnframes())))
-
-                message_bits = self.text_to_bits(message)
+    def embed_text_lsb(self, message, compression='auto', workers=1, password=None):
+        self.embed_bytes_lsb(message.encode('utf-8'), compression, workers, password)
 
-                if len(message_bits) > len(frame_bytes):
-                    raise ValueError("Message too long to encode in this audio file.")
+    def embed_bytes_lsb(self, data, compression='auto', workers=1, password=None):
+        try:
+            with span('HideAudio.embed_bytes_lsb.frame'):
+                message_bits = frame_bits(data, 'lsb-audio', compression)
+            # Streams the file block by block, only the payload bytes are modified
+            if password:
+                embed_lsb_wav_scattered(self.audio_path, self.output_path, message_bits, password)
+            else:
+                embed_lsb_wav(self.audio_path, self.output_path, message_bits, workers)
+            print(f"Message encoded and saved as {self.output_path}")
+        except Exception as e:
+            raise ValueError(f"Error embedding text: {e}")
 
-                for i in range(len(message_bits)):
-                    frame_bytes[i] = (frame_bytes[i] & 254) | int(message_bits[i])
+    # Embed into the least significant byte of each sample only, depth bits per sample
+    def embed_text_sample_lsb(self, message, depth=1, compression='auto', workers=1):
+        self.embed_bytes_sample_lsb(message.encode('utf-8'), depth, compression, workers)
 
-                with wave.open(self.output_path, 'wb') as encoded_audio:
-                    encoded_audio.setparams(params)
-                    encoded_audio.writeframes(bytes(frame_bytes))
+    def embed_bytes_sample_lsb(self, data, depth=1, compression='auto', workers=1):
+        try:
+            with span('HideAudio.embed_bytes_sample_lsb.frame'):
+                message_bits = frame_bits(data, 'sample-lsb-audio', compression)
+            embed_sample_lsb_wav(self.audio_path, self.output_path, message_bits, depth, workers)
             print(f"Message encoded and saved as {self.output_path}")
         except Exception as e:
             raise ValueError(f"Error embedding text: {e}")
+
+    def calculate_max_letters_lsb(self):
+        with span('HideAudio.calculate_max_letters_lsb.capacity'):
+            return max_capacity_audio(self.audio_path)
+
+    def calculate_max_letters_sample_lsb(self, depth=1):
+        with span('HideAudio.calculate_max_letters_sample_lsb.capacity'):
+            return max_capacity_audio(self.audio_path, sample_mode=True, depth=depth)
@@ -0,0 +1,311 @@
+"""
+Tiled CPU inference for the image autoencoder of
+Autoencoder_Results/image/autoencoder_image_div2k_high_resolution.ipynb.
+
+The notebook's encoder hides 800 bits in a 128x128 RGB patch and its decoder
+reads them back. Here covers of any size are cut into a grid of overlapping
+patches, row by row. Each patch carries its own 800 bits, and patches run
+through the models in batches. The encoder's changes are blended across
+seams with a weighted average that ramps down over the overlap.
+
+The image is held as a uint8 memmap (codec_registry.load_image_memmap), each
+patch array is built from its own slice of it, and the stego PNG is written
+from it band by band (codec_registry.save_png_bands). The blending buffer
+spans one row of patches across the image width, and only one batch of
+patches is in memory, so inference and writing follow the batch size and the
+image width, not the image area. Decoding a PNG or JPEG cover still goes
+through one full-size PIL buffer, freed before inference starts; a .npy cover
+is mapped without decoding.
+
+A payload is a 32-bit byte count followed by the data bits, patches in
+row-major grid order; only the patches under the payload are changed.
+Extraction applies the same grid and is lossy, so there is no frame or CRC.
+TensorFlow is imported on first use:
+
+    python image_autoencoder.py hide encoder.h5 decoder.h5 cover.png stego.png --message "hi"
+    python image_autoencoder.py reveal encoder.h5 decoder.h5 stego.png --batch-size 32 --threads 4
+"""
+import argparse
+import sys
+import time
+import numpy as np
+from codec_registry import load_image_memmap, save_png_bands
+from audio_autoencoder import LENGTH_PREFIX_BITS, import_tensorflow, payload_bits
+from instrument import span
+
+PATCH_SIZE = 128
+MESSAGE_BITS = 800
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_OVERLAP = 16
+
+# (encoder path, decoder path, patch size, message bits) -> (encoder, decoder)
+_models = {}
+
+
+def build_encoder(tf, patch_size=PATCH_SIZE, message_length=MESSAGE_BITS):
+    """The notebook's encoder."""
+    layers = tf.keras.layers
+    image_input = layers.Input(shape=(patch_size, patch_size, 3), name='image_input')
+    text_input = layers.Input(shape=(message_length,), name='text_input')
+
+    x_text = layers.Dense(patch_size * patch_size, activation='relu')(text_input)
+    x_text = layers.Reshape((patch_size, patch_size, 1))(x_text)
+    x_text = layers.Conv2D(32, (3, 3), padding='same')(x_text)
+    x_text = layers.BatchNormalization()(x_text)
+    x_text = layers.Activation('relu')(x_text)
+
+    x_img = layers.Conv2D(32, (3, 3), padding='same')(image_input)
+    x_img = layers.BatchNormalization()(x_img)
+    x_img = layers.Activation('relu')(x_img)
+
+    x = layers.Concatenate(axis=-1)([x_img, x_text])
+    x = layers.Conv2D(64, (3, 3), padding='same')(x)
+    x = layers.BatchNormalization()(x)
+    x = layers.Activation('relu')(x)
+
+    output = layers.Conv2D(3, (3, 3), padding='same', activation='sigmoid')(x)
+    output = layers.Add()([output, image_input])
+    return tf.keras.Model(inputs=[image_input, text_input], outputs=output, name='encoder')
+
+
+def build_decoder(tf, patch_size=PATCH_SIZE, message_length=MESSAGE_BITS):
+    """The notebook's decoder."""
+    layers = tf.keras.layers
+    stego_input = layers.Input(shape=(patch_size, patch_size, 3), name='stego_input')
+
+    x = layers.Conv2D(64, (3, 3), padding='same')(stego_input)
+    x = layers.BatchNormalization()(x)
+    x = layers.Activation('relu')(x)
+    for _ in range(3):
+        x = layers.Conv2D(128, (3, 3), strides=2, padding='same')(x)
+        x = layers.BatchNormalization()(x)
+        x = layers.Activation('relu')(x)
+
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dense(1024, activation='relu')(x)
+    output = layers.Dense(message_length, activation='sigmoid', name='decoder_output')(x)
+    return tf.keras.Model(inputs=stego_input, outputs=output, name='decoder')
+
+
+def load_models(encoder_path, decoder_path, patch_size=PATCH_SIZE, message_length=MESSAGE_BITS, threads=None):
+    """(encoder, decoder) with the exported weights, built once per process."""
+    key = (encoder_path, decoder_path, patch_size, message_length)
+    if key not in _models:
+        tf = import_tensorflow(threads)
+        try:
+            encoder = build_encoder(tf, patch_size, message_length)
+            encoder.load_weights(encoder_path)
+            decoder = build_decoder(tf, patch_size, message_length)
+            decoder.load_weights(decoder_path)
+        except Exception as e:
+            raise ValueError(f"Error loading autoencoder weights: {e}")
+        _models[key] = (encoder, decoder)
+    return _models[key]
+
+
+def patch_starts(length, patch_size, stride):
+    """Patch offsets along one axis at a fixed stride; the last patch may run past the edge.
+
+    Moving the last patch back inside would overlap its neighbour by more
+    than the seam width and dilute its changes, so it is edge-padded instead.
+    """
+    overlap = patch_size - stride
+    return list(range(0, max(1, -(-(length - overlap) // stride)) * stride, stride))
+
+
+class _SeamBlender:
+    """Accumulates weighted patch changes for one row of patches and writes finished rows back.
+
+    Rows above the next patch row get no more contributions, so they are
+    applied and the buffer slides down; it never holds more than
+    patch_size rows.
+    """
+    def __init__(self, pixels, patch_size):
+        self.pixels = pixels
+        self.patch_size = patch_size
+        self.top = 0
+        width = pixels.shape[1]
+        self.changes = np.zeros((patch_size, width, 3), dtype=np.float32)
+        self.weights = np.zeros((patch_size, width), dtype=np.float32)
+
+    def add(self, y, x, change, weight):
+        if y > self.top:
+            self._flush(y - self.top)
+        h = min(self.patch_size, self.pixels.shape[0] - y)
+        w = min(self.patch_size, self.pixels.shape[1] - x)
+        self.changes[:h, x:x + w] += change[:h, :w] * weight[:h, :w, np.newaxis]
+        self.weights[:h, x:x + w] += weight[:h, :w]
+
+    def _flush(self, n_rows):
+        n_rows = min(n_rows, self.patch_size, self.pixels.shape[0] - self.top)
+        weights = self.weights[:n_rows, :, np.newaxis]
+        change = np.divide(self.changes[:n_rows], weights, out=np.zeros_like(self.changes[:n_rows]),
+                           where=weights > 0)
+        rows = self.pixels[self.top:self.top + n_rows]
+        if rows.ndim == 2:
+            # Grey covers went through the model as three equal channels
+            change = change.mean(axis=2)
+            values = rows / np.float32(255) + change
+        else:
+            values = rows[..., :3] / np.float32(255) + change
+        values = np.round(np.clip(values, 0, 1) * 255).astype(np.uint8)
+        if rows.ndim == 2:
+            rows[...] = values
+        else:
+            rows[..., :3] = values
+        # Slide the buffer down to the next patch row
+        self.changes[:-n_rows] = self.changes[n_rows:]
+        self.changes[-n_rows:] = 0
+        self.weights[:-n_rows] = self.weights[n_rows:]
+        self.weights[-n_rows:] = 0
+        self.top += n_rows
+
+    def finish(self):
+        while self.top < self.pixels.shape[0] and self.weights.any():
+            self._flush(self.patch_size)
+
+
+class ImageAutoencoder:
+    """Batched encoder/decoder inference over overlapping patches of an image file.
+
+    Each call to embed or extract leaves its patch count and throughput in
+    self.stats.
+    """
+    def __init__(self, encoder_path, decoder_path, batch_size=DEFAULT_BATCH_SIZE, threads=None,
+                 overlap=DEFAULT_OVERLAP, patch_size=PATCH_SIZE, message_length=MESSAGE_BITS):
+        if not 0 <= overlap < patch_size // 2:
+            raise ValueError("Patch overlap must be less than half a patch.")
+        self.encoder, self.decoder = load_models(encoder_path, decoder_path, patch_size, message_length, threads)
+        self.batch_size = batch_size
+        self.overlap = overlap
+        self.patch_size = patch_size
+        self.message_length = message_length
+        self.stride = patch_size - overlap
+        # Seam weights ramp from the patch border to 1 over the overlap
+        ramp = np.minimum(np.arange(patch_size) + 1, patch_size - np.arange(patch_size)) / np.float32(overlap + 1)
+        ramp = np.minimum(ramp, 1).astype(np.float32)
+        self.seam_weight = np.outer(ramp, ramp)
+        self.stats = {}
+
+    def grid(self, shape):
+        """Top-left corners of every patch of an image of this shape, in row-major order."""
+        ys = patch_starts(shape[0], self.patch_size, self.stride)
+        xs = patch_starts(shape[1], self.patch_size, self.stride)
+        return [(y, x) for y in ys for x in xs]
+
+    def capacity_bytes(self, shape):
+        return max(0, (len(self.grid(shape)) * self.message_length - LENGTH_PREFIX_BITS) // 8)
+
+    def _patch(self, pixels, y, x):
+        """RGB float patch in [0, 1]; patches running past the image edge are edge-padded.
+
+        Changes the encoder makes in the padding are dropped, so a cover much
+        smaller than one patch decodes less reliably.
+        """
+        patch = np.asarray(pixels[y:y + self.patch_size, x:x + self.patch_size])
+        if patch.ndim == 2:
+            patch = np.repeat(patch[:, :, np.newaxis], 3, axis=2)
+        patch = patch[:, :, :3].astype(np.float32) / 255
+        if patch.shape[:2] != (self.patch_size, self.patch_size):
+            missing = ((0, self.patch_size - patch.shape[0]), (0, self.patch_size - patch.shape[1]), (0, 0))
+            patch = np.pad(patch, missing, mode='edge')
+        return patch
+
+    def _batches(self, corners):
+        for start in range(0, len(corners), self.batch_size):
+            yield start, corners[start:start + self.batch_size]
+
+    def _record(self, patches, seconds):
+        self.stats = {
+            "patches": patches,
+            "seconds": seconds,
+            "patches_per_second": patches / seconds if seconds else None,
+        }
+
+    def embed_pixels(self, pixels, bits):
+        """Embeds a 0/1 bit array into a uint8 image array or memmap, in place."""
+        corners = self.grid(pixels.shape)
+        n_patches = -(-len(bits) // self.message_length)
+        if n_patches > len(corners):
+            raise ValueError("Message is too long to fit in the image.")
+        corners = corners[:n_patches]
+        messages = np.zeros((n_patches, self.message_length), dtype=np.float32)
+        messages.reshape(-1)[:len(bits)] = bits
+
+        blender = _SeamBlender(pixels, self.patch_size)
+        started = time.perf_counter()
+        for start, batch in self._batches(corners):
+            patches = np.stack([self._patch(pixels, y, x) for y, x in batch])
+            with span('ImageAutoencoder.encode'):
+                encoded = np.asarray(self.encoder([patches, messages[start:start + len(batch)]], training=False))
+            for (y, x), change in zip(batch, encoded - patches):
+                blender.add(y, x, change, self.seam_weight)
+        blender.finish()
+        self._record(n_patches, time.perf_counter() - started)
+        return pixels
+
+    def extract_probabilities(self, pixels, n_patches):
+        """Decoder bit probabilities of the first n_patches patches, a (patches, message bits) array."""
+        corners = self.grid(pixels.shape)[:n_patches]
+        probabilities = np.zeros((len(corners), self.message_length), dtype=np.float32)
+        started = time.perf_counter()
+        for start, batch in self._batches(corners):
+            patches = np.stack([self._patch(pixels, y, x) for y, x in batch])
+            with span('ImageAutoencoder.decode'):
+                probabilities[start:start + len(batch)] = np.asarray(self.decoder(patches, training=False))
+        self._record(len(corners), time.perf_counter() - started)
+        return probabilities
+
+    def embed_bytes(self, image_path, output_path, data):
+        pixels = load_image_memmap(image_path)
+        self.embed_pixels(pixels, payload_bits(data))
+        save_png_bands(pixels, output_path)
+
+    def embed_text(self, image_path, output_path, message):
+        self.embed_bytes(image_path, output_path, message.encode('utf-8'))
+
+    def extract_bytes(self, image_path):
+        """Best-effort payload; bit errors of the decoder show up as wrong bytes."""
+        pixels = load_image_memmap(image_path)
+        first = (self.extract_probabilities(pixels, 1).reshape(-1) > 0.5).astype(np.uint8)
+        length = int.from_bytes(np.packbits(first[:LENGTH_PREFIX_BITS]).tobytes(), 'big')
+        if length > self.capacity_bytes(pixels.shape):
+            raise ValueError("No hidden data found in this image.")
+        n_bits = LENGTH_PREFIX_BITS + 8 * length
+        probabilities = self.extract_probabilities(pixels, -(-n_bits // self.message_length))
+        bits = (probabilities.reshape(-1)[LENGTH_PREFIX_BITS:n_bits] > 0.5).astype(np.uint8)
+        return np.packbits(bits).tobytes()
+
+    def extract_text(self, image_path):
+        return self.extract_bytes(image_path).decode('utf-8', errors='replace')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hide or reveal a message with the image autoencoder on CPU.")
+    parser.add_argument('command', choices=['hide', 'reveal'])
+    parser.add_argument('encoder', help="exported encoder weights (.h5 or .weights.h5)")
+    parser.add_argument('decoder', help="exported decoder weights")
+    parser.add_argument('image', help="cover image for hide, stego PNG for reveal")
+    parser.add_argument('output', nargs='?', help="stego PNG to write (hide)")
+    parser.add_argument('--message', help="text to hide")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="patches per inference call")
+    parser.add_argument('--threads', type=int, default=None, help="TensorFlow CPU threads (default: all)")
+    parser.add_argument('--overlap', type=int, default=DEFAULT_OVERLAP, help="pixels shared by neighbouring patches")
+    args = parser.parse_args(argv)
+    if args.command == 'hide' and (args.output is None or args.message is None):
+        parser.error("hide needs an output path and --message")
+
+    model = ImageAutoencoder(args.encoder, args.decoder, args.batch_size, args.threads, args.overlap)
+    if args.command == 'hide':
+        model.embed_text(args.image, args.output, args.message)
+        print(f"Message encoded and saved as {args.output}")
+    else:
+        print(model.extract_text(args.image))
+    stats = model.stats
+    print(f'{stats["patches"]} patches in {stats["seconds"]:.2f}s, {stats["patches_per_second"] or 0:.1f} patches/s',
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Opt-in timing spans for the hide/unhide paths.
+
+Spans are off unless the STEGO_PROFILE environment variable is set (to
+anything but 0) or enable() is called. When off, span() returns a shared
+no-op context manager, so instrumented code pays one flag check per span.
+
+    with span('HideImage.embed_bytes_pvd.load'):
+        image = Image.open(path)
+
+Each span name aggregates a count, total and maximum duration and a latency
+histogram in-process. snapshot() returns them as JSON-ready data,
+to_prometheus() in the Prometheus text format. Worker processes send their
+snapshot back with their results, and the parent merge()s it.
+"""
+import os
+import threading
+import time
+
+# Histogram upper bounds in seconds, +Inf is implied
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = os.environ.get('STEGO_PROFILE', '0') not in ('', '0')
+_lock = threading.Lock()
+_spans = {}
+
+
+def enabled():
+    return _enabled
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name):
+    """Context manager timing its block under name, or a no-op while disabled."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def _new_stats():
+    return {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)}
+
+
+def _bucket(seconds):
+    for i, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            return i
+    return len(BUCKETS)
+
+
+def record(name, seconds):
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None:
+            stats = _spans[name] = _new_stats()
+        stats["count"] += 1
+        stats["sum"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+        stats["buckets"][_bucket(seconds)] += 1
+
+
+def snapshot():
+    """Copy of every span's stats; buckets are per-bucket counts aligned with le."""
+    with _lock:
+        spans = {name: dict(stats, buckets=list(stats["buckets"])) for name, stats in _spans.items()}
+    return {"le": list(BUCKETS) + ['+Inf'], "spans": spans}
+
+
+def merge(spans):
+    """Adds the "spans" of another process's snapshot to this one."""
+    with _lock:
+        for name, other in spans.items():
+            stats = _spans.get(name)
+            if stats is None:
+                stats = _spans[name] = _new_stats()
+            stats["count"] += other["count"]
+            stats["sum"] += other["sum"]
+            stats["max"] = max(stats["max"], other["max"])
+            stats["buckets"] = [a + b for a, b in zip(stats["buckets"], other["buckets"])]
+
+
+def to_prometheus(prefix='stego_span_seconds'):
+    lines = [f'# HELP {prefix} Time spent in instrumented hide/unhide spans.',
+             f'# TYPE {prefix} histogram']
+    data = snapshot()
+    for name, stats in sorted(data["spans"].items()):
+        cumulative = 0
+        for bound, count in zip(data["le"], stats["buckets"]):
+            cumulative += count
+            lines.append(f'{prefix}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_sum{{span="{name}"}} {stats["sum"]}')
+        lines.append(f'{prefix}_count{{span="{name}"}} {stats["count"]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,247 @@
+"""
+Background steganography jobs for the Flask API.
+
+Each job runs batch.process_row in a bounded process pool, so PVD and audio
+work never blocks a request thread. A job has its own folder holding the
+uploaded cover and, for hide jobs, the stego output. Finished jobs are kept
+for status queries until more than `history` of them exist; the oldest are
+then dropped together with their folders.
+
+Job records live only in memory, so only one server process may run jobs: a
+JobManager holds an exclusive lock on its job folder for its lifetime, and a
+second one (another server worker process) fails with JobFolderInUseError
+instead of starting. Run the app with a single process and use threads and
+`workers` for concurrency. Once the lock is held, the folders left behind by a
+previous run can never be queried again, so they are swept.
+
+Workers are started with the spawn method: forking the multi-threaded server
+process could copy a lock held by another thread into the child and hang it.
+A worker that dies (killed, out of memory) breaks the whole pool: the pool is
+then replaced, and every job it held is run once more on the new one, so only
+a job that breaks the pool twice fails.
+"""
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the single-process rule is not enforced
+    fcntl = None
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from batch import process_row
+import instrument
+
+
+# Folder names of jobs (uuid4().hex) and of streamed uploads in progress
+JOB_DIR = re.compile(r'^[0-9a-f]{32}$')
+PARTIAL_SUFFIX = '.part'
+LOCK_NAME = '.lock'
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobFolderInUseError(Exception):
+    pass
+
+
+def lock_job_folder(job_folder):
+    """Takes the exclusive lock of a job folder; returns the open lock file to keep it."""
+    lock_file = open(os.path.join(job_folder, LOCK_NAME), 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise JobFolderInUseError(f"Job folder {job_folder} is used by another process; "
+                                      "jobs only support a single server process.")
+    return lock_file
+
+
+def sweep_job_folder(job_folder):
+    """Removes the job folders and partial uploads a previous run left behind."""
+    removed = 0
+    for name in os.listdir(job_folder):
+        path = os.path.join(job_folder, name)
+        if JOB_DIR.match(name) and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith(PARTIAL_SUFFIX) and os.path.isfile(path):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+        else:
+            continue
+        removed += 1
+    return removed
+
+
+class JobManager:
+    def __init__(self, job_folder, workers=None, max_pending=64, history=1000):
+        self.job_folder = job_folder
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.history = history
+        self.jobs = OrderedDict()
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.executor = None
+        os.makedirs(job_folder, exist_ok=True)
+        self.swept = 0
+        self.lock_file = None
+        # Spawned workers import the server's main module again; they neither
+        # lock nor sweep, or the server's own jobs would be removed
+        if multiprocessing.parent_process() is None:
+            self.lock_file = lock_job_folder(job_folder)
+            self.swept = sweep_job_folder(job_folder)
+
+    def _pool(self):
+        # Created on first use so importing the app never starts processes
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    def _discard_pool(self, executor):
+        """Drops a broken pool so the next submit starts a new one; caller holds the lock."""
+        if self.executor is executor:
+            self.executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _start(self, job_id):
+        """Submits a job's row to the pool, replacing a broken pool; caller holds the lock."""
+        row = self.jobs[job_id]["_row"]
+        executor = self._pool()
+        try:
+            future = executor.submit(process_row, (job_id, row))
+        except BrokenProcessPool:
+            self._discard_pool(executor)
+            executor = self._pool()
+            future = executor.submit(process_row, (job_id, row))
+        self.futures[job_id] = future
+        return executor, future
+
+    def _watch(self, job_id, executor, future):
+        # Outside the lock: the callback runs at once if the future is already done
+        future.add_done_callback(lambda f: self._finish(job_id, executor, f))
+
+    def new_job_dir(self):
+        """Creates the folder of a new job; returns (job_id, path)."""
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.job_folder, job_id)
+        os.makedirs(path)
+        return job_id, path
+
+    def pending(self):
+        with self.lock:
+            return len(self.futures)
+
+    def submit(self, job_id, row):
+        """Queues a manifest-style row (see batch.py) and returns the job record."""
+        with self.lock:
+            if len(self.futures) >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending jobs).")
+            job = {
+                "id": job_id,
+                "operation": row['operation'],
+                "method": row['method'],
+                "status": "queued",
+                "submitted": datetime.now().isoformat(),
+            }
+            job["_submitted"] = time.perf_counter()
+            # Kept until the job finishes, to run it again if its pool breaks
+            job["_row"] = row
+            job["_attempts"] = 1
+            self.jobs[job_id] = job
+            try:
+                executor, future = self._start(job_id)
+            except Exception:
+                del self.jobs[job_id]
+                raise
+        self._watch(job_id, executor, future)
+        return self.get(job_id)
+
+    def _retry(self, job_id, executor):
+        """Runs a job from a broken pool again on a new pool; False once it has had its retry."""
+        with self.lock:
+            self._discard_pool(executor)
+            job = self.jobs[job_id]
+            if job["_attempts"] > 1:
+                return False
+            job["_attempts"] += 1
+            try:
+                executor, future = self._start(job_id)
+            except Exception:
+                return False
+        self._watch(job_id, executor, future)
+        return True
+
+    def _finish(self, job_id, executor, future):
+        elapsed = time.perf_counter()
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            if self._retry(job_id, executor):
+                return
+            result = {"status": "error", "error": f"Worker process failed: {e}", "seconds": 0.0}
+        except Exception as e:
+            # The worker process itself failed, process_row never raises
+            result = {"status": "error", "error": str(e), "seconds": 0.0}
+        if "spans" in result:
+            instrument.merge(result.pop("spans"))
+        with self.lock:
+            self.futures.pop(job_id, None)
+            job = self.jobs[job_id]
+            del job["_row"], job["_attempts"]
+            job["status"] = result["status"]
+            job["run_seconds"] = result.get("seconds", 0.0)
+            job["total_seconds"] = round(elapsed - job.pop("_submitted"), 6)
+            job["queue_seconds"] = round(max(0.0, job["total_seconds"] - job["run_seconds"]), 6)
+            job["finished"] = datetime.now().isoformat()
+            for key in ("message", "error"):
+                if key in result:
+                    job[key] = result[key]
+            self._evict()
+
+    def _evict(self):
+        finished = [job_id for job_id in self.jobs if job_id not in self.futures]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+            shutil.rmtree(os.path.join(self.job_folder, job_id), ignore_errors=True)
+
+    def get(self, job_id):
+        """Public copy of a job record, or None for an unknown id."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            record = {key: value for key, value in job.items() if not key.startswith('_')}
+            future = self.futures.get(job_id)
+            if future is not None and future.running():
+                record["status"] = "running"
+            if "_submitted" in job:
+                record["elapsed_seconds"] = round(time.perf_counter() - job["_submitted"], 6)
+            return record
+
+    def stats(self):
+        """Queue depth and pool size."""
+        with self.lock:
+            running = sum(1 for future in self.futures.values() if future.running())
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queued": len(self.futures) - running,
+                "running": running,
+                "finished": len(self.jobs) - len(self.futures),
+            }
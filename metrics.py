@@ -0,0 +1,308 @@
+"""
+Quality and robustness metrics for cover/stego pairs.
+
+Array functions work on one pair, or on a batch of pairs stacked along the
+first axis with batch=True, in which case they return one value per pair:
+
+    mse, psnr, snr    any shape
+    ssim              images (H, W) or (H, W, C), same definition as
+                      skimage.metrics.structural_similarity with its defaults
+                      (7x7 uniform window, sample covariance)
+    bit_error_rate    bits, bytes or text; float decoder outputs are
+                      thresholded at 0.5
+
+image_metrics and audio_metrics stream two files in row bands or frame blocks,
+so memory does not grow with the file size. The command line evaluates every
+stego file of a folder against the cover with the same name, in parallel
+worker processes, and prints a summary table per method:
+
+    python -m metrics COVER_DIR STEGO_DIR --message "hello" --workers 8 --report metrics.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from codec_registry import default_codec, load_image_memmap, reveal_file
+from operations import decode_frames
+from audio_lsb import BLOCK_FRAMES
+from pvd import BAND_ROWS
+
+SSIM_WINDOW = 7
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+SUMMARY_METRICS = ('mse', 'psnr', 'ssim', 'snr', 'ber')
+
+
+def _axes(x, batch):
+    return tuple(range(1, x.ndim)) if batch else None
+
+
+def _db(signal, noise):
+    """10 log10(signal / noise), inf when noise is 0."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 10 * np.log10(np.divide(signal, noise))
+
+
+def mse(reference, test, batch=False):
+    reference = np.asarray(reference, dtype=np.float64)
+    error = reference - np.asarray(test, dtype=np.float64)
+    return np.mean(error * error, axis=_axes(reference, batch))
+
+
+def psnr(reference, test, data_range=None, batch=False):
+    """Peak signal-to-noise ratio in dB; inf for identical inputs.
+
+    data_range defaults to the peak absolute value of each reference, as in
+    the audio notebook; use 255 for 8-bit images.
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    if data_range is None:
+        data_range = np.max(np.abs(reference), axis=_axes(reference, batch))
+    return _db(np.square(data_range), mse(reference, test, batch))
+
+
+def snr(reference, test, batch=False):
+    """Signal-to-noise ratio in dB, signal power over error power; inf for identical inputs."""
+    reference = np.asarray(reference, dtype=np.float64)
+    error = reference - np.asarray(test, dtype=np.float64)
+    axes = _axes(reference, batch)
+    return _db(np.sum(reference * reference, axis=axes), np.sum(error * error, axis=axes))
+
+
+def _window_sums(x, axis, size):
+    """Sums of every run of size consecutive values along axis, from a cumulative sum."""
+    total = np.cumsum(x, axis=axis)
+    pad = [(0, 0)] * x.ndim
+    pad[axis] = (1, 0)
+    total = np.pad(total, pad)
+    upper = [slice(None)] * x.ndim
+    lower = [slice(None)] * x.ndim
+    upper[axis] = slice(size, None)
+    lower[axis] = slice(None, -size)
+    return total[tuple(upper)] - total[tuple(lower)]
+
+
+def ssim_map(reference, test, data_range=255, row_axis=0):
+    """SSIM of every 7x7 window whose rows start on row_axis and columns on the next axis."""
+    x = np.asarray(reference, dtype=np.float64)
+    y = np.asarray(test, dtype=np.float64)
+    n = SSIM_WINDOW * SSIM_WINDOW
+
+    def mean(values):
+        return _window_sums(_window_sums(values, row_axis, SSIM_WINDOW), row_axis + 1, SSIM_WINDOW) / n
+
+    ux, uy = mean(x), mean(y)
+    # Sample covariance, like skimage's use_sample_covariance=True
+    norm = n / (n - 1)
+    vx = norm * (mean(x * x) - ux * ux)
+    vy = norm * (mean(y * y) - uy * uy)
+    vxy = norm * (mean(x * y) - ux * uy)
+    c1 = (SSIM_K1 * data_range) ** 2
+    c2 = (SSIM_K2 * data_range) ** 2
+    return ((2 * ux * uy + c1) * (2 * vxy + c2)) / ((ux * ux + uy * uy + c1) * (vx + vy + c2))
+
+
+def ssim(reference, test, data_range=255, batch=False):
+    """Mean structural similarity of images, averaged over channels."""
+    reference = np.asarray(reference)
+    if reference.shape != np.shape(test):
+        raise ValueError("Images must have the same shape.")
+    row_axis = 1 if batch else 0
+    if min(reference.shape[row_axis:row_axis + 2]) < SSIM_WINDOW:
+        raise ValueError(f"SSIM needs images of at least {SSIM_WINDOW}x{SSIM_WINDOW} pixels.")
+    values = ssim_map(reference, test, data_range, row_axis)
+    return np.mean(values, axis=_axes(values, batch))
+
+
+def _bits(value):
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.unpackbits(np.frombuffer(value, dtype=np.uint8))
+    value = np.asarray(value)
+    if value.dtype.kind == 'f':
+        return (value > 0.5).astype(np.uint8)
+    return value.astype(np.uint8)
+
+
+def bit_error_rate(sent, received, batch=False):
+    """Fraction of sent bits received wrong; bits missing from received count as errors."""
+    sent = _bits(sent)
+    received = _bits(received)
+    if batch:
+        return np.mean(sent != received, axis=tuple(range(1, sent.ndim)))
+    common = min(len(sent), len(received))
+    errors = int(np.count_nonzero(sent[:common] != received[:common])) + len(sent) - common
+    return errors / len(sent) if len(sent) else float(len(received) > 0)
+
+
+# -------------------------------
+# Streaming over files
+# -------------------------------
+def image_metrics(cover, stego, band_rows=BAND_ROWS, data_range=255):
+    """MSE, PSNR, SNR and SSIM of two image files, read as memmaps in row bands."""
+    a = load_image_memmap(cover)
+    b = load_image_memmap(stego)
+    if a.shape != b.shape:
+        raise ValueError("Cover and stego images have different sizes.")
+    squared_error = 0.0
+    signal = 0.0
+    ssim_sum = 0.0
+    ssim_count = 0
+    for row in range(0, a.shape[0], band_rows):
+        x = a[row:row + band_rows].astype(np.float64)
+        error = x - b[row:row + band_rows]
+        squared_error += float(np.sum(error * error))
+        signal += float(np.sum(x * x))
+        # Windows starting in this band need the next SSIM_WINDOW - 1 rows too
+        stop = row + band_rows + SSIM_WINDOW - 1
+        if min(a[row:stop].shape[:2]) >= SSIM_WINDOW:
+            values = ssim_map(a[row:stop], b[row:stop], data_range)
+            ssim_sum += float(values.sum())
+            ssim_count += values.size
+    error = squared_error / a.size
+    return {
+        "mse": error,
+        "psnr": float(_db(data_range ** 2, error)),
+        "snr": float(_db(signal, squared_error)),
+        "ssim": ssim_sum / ssim_count if ssim_count else None,
+    }
+
+
+def audio_metrics(cover, stego):
+    """MSE, PSNR and SNR of two WAV files with samples scaled to [-1, 1], read in frame blocks.
+
+    PSNR uses the cover's peak amplitude, like the audio notebook.
+    """
+    squared_error = 0.0
+    signal = 0.0
+    peak = 0.0
+    count = 0
+    with wave.open(cover, 'rb') as first, wave.open(stego, 'rb') as second:
+        p = first.getparams()
+        q = second.getparams()
+        if (p.nchannels, p.sampwidth, p.nframes) != (q.nchannels, q.sampwidth, q.nframes):
+            raise ValueError("Cover and stego audio have different formats or lengths.")
+        scale = float(1 << (8 * p.sampwidth - 1))
+        while True:
+            x = first.readframes(BLOCK_FRAMES)
+            if not x:
+                break
+            x = decode_frames(x, p.sampwidth, p.nchannels) / scale
+            y = decode_frames(second.readframes(BLOCK_FRAMES), q.sampwidth, q.nchannels) / scale
+            error = x - y
+            squared_error += float(np.sum(error * error))
+            signal += float(np.sum(x * x))
+            peak = max(peak, float(np.max(np.abs(x))))
+            count += x.size
+    error = squared_error / count if count else 0.0
+    return {
+        "mse": error,
+        "psnr": float(_db(peak * peak, error)),
+        "snr": float(_db(signal, squared_error)),
+    }
+
+
+# -------------------------------
+# Folder evaluation
+# -------------------------------
+def pair_files(cover_dir, stego_dir):
+    """(cover, stego) paths for every stego file with a cover of the same name, any extension."""
+    covers = {}
+    for name in sorted(os.listdir(cover_dir)):
+        covers.setdefault(os.path.splitext(name)[0], os.path.join(cover_dir, name))
+    pairs = []
+    for name in sorted(os.listdir(stego_dir)):
+        cover = covers.get(os.path.splitext(name)[0])
+        if cover is not None:
+            pairs.append((cover, os.path.join(stego_dir, name)))
+    return pairs
+
+
+def evaluate_pair(task):
+    """Metrics of one (cover, stego, method, message) task; runs in a worker process."""
+    cover, stego, method, message = task
+    method = method or default_codec(cover)
+    result = {"cover": cover, "stego": stego, "method": method}
+    start = time.perf_counter()
+    try:
+        if stego.lower().endswith('.wav'):
+            result.update(audio_metrics(cover, stego))
+        else:
+            result.update(image_metrics(cover, stego))
+        if message is not None:
+            result["ber"] = bit_error_rate(message, reveal_file(method, stego))
+        result["status"] = "success"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def evaluate(pairs, method=None, message=None, workers=None):
+    """Results of evaluate_pair for every pair, in order, from a process pool."""
+    tasks = [(cover, stego, method, message) for cover, stego in pairs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(evaluate_pair, tasks))
+
+
+def summarize(results):
+    """Per-method count and mean of each metric over successful results; inf PSNR/SNR are left out of means."""
+    groups = {}
+    for result in results:
+        if result["status"] == "success":
+            groups.setdefault(result["method"], []).append(result)
+    summary = {}
+    for method, rows in sorted(groups.items()):
+        entry = {"pairs": len(rows)}
+        for metric in SUMMARY_METRICS:
+            values = np.array([row[metric] for row in rows if row.get(metric) is not None], dtype=np.float64)
+            finite = values[np.isfinite(values)]
+            entry[metric] = float(finite.mean()) if len(finite) else (float(values[0]) if len(values) else None)
+        summary[method] = entry
+    return summary
+
+
+def format_table(summary):
+    header = f'{"method":<18}{"pairs":>7}' + ''.join(f'{metric:>12}' for metric in SUMMARY_METRICS)
+    lines = [header, '-' * len(header)]
+    for method, entry in summary.items():
+        cells = ''.join(f'{"-":>12}' if entry[metric] is None else f'{entry[metric]:>12.6g}'
+                        for metric in SUMMARY_METRICS)
+        lines.append(f'{method:<18}{entry["pairs"]:>7}{cells}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare stego files against their covers.")
+    parser.add_argument('cover_dir', help="folder of cover images and WAVs")
+    parser.add_argument('stego_dir', help="folder of stego files named like their covers")
+    parser.add_argument('--method', help="codec used for the stego files (default: by file type, as in batch)")
+    parser.add_argument('--message', help="message hidden in every stego file, for the bit error rate")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--report', help="JSONL file receiving one result per pair")
+    args = parser.parse_args(argv)
+
+    pairs = pair_files(args.cover_dir, args.stego_dir)
+    if not pairs:
+        print("No stego file has a cover with the same name.")
+        return 1
+    results = evaluate(pairs, args.method, args.message, args.workers)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as out:
+            for result in results:
+                out.write(json.dumps(result) + '\n')
+    errors = [result for result in results if result["status"] != "success"]
+    for result in errors:
+        print(f'{result["stego"]}: error: {result["error"]}')
+    print(format_table(summarize(results)))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
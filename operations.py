@@ -4,10 +4,15 @@ Created on Sun Nov 24 22:52:42 2024
 
 @author: dell
 """
-import cv2
 import wave
 import os
+import io
+import hashlib
+from collections import OrderedDict
 import numpy as np
+from audio_lsb import capacity_bits_lsb_wav, capacity_bits_sample_lsb_wav, BLOCK_FRAMES
+from framing import max_payload
+from codec_registry import get_codec, load_image
 
 
 def str_to_bin(text):
@@ -18,6 +23,15 @@ def bin_to_str(binary_message):
     message = ''.join([chr(int(binary_message[i:i+8], 2)) for i in range(0, len(binary_message), 8)])
     return message
 
+# Same result as bin_to_str for a uint8 array of 0/1 values
+def bit_array_to_str(bits):
+    n_full = len(bits) // 8 * 8
+    message = np.packbits(bits[:n_full]).tobytes().decode('latin-1')
+    if n_full < len(bits):
+        # A trailing partial chunk is read as a short binary number
+        message += chr(int(''.join(str(bit) for bit in bits[n_full:]), 2))
+    return message
+
 # Function to calculate embedding capacity based on pixel difference
 def get_capacity(diff):
     if diff < 16:
@@ -30,55 +44,222 @@ def get_capacity(diff):
         return 4
     else:
         return 5
-def max_capacity_image(image_path):
-    """Calculates the approximate max capacity of an image in bytes."""
+# Capacity results kept by (content hash, codec name), least recently used first
+CAPACITY_CACHE_SIZE = 128
+_capacity_cache = OrderedDict()
+
+def capacity_bytes(source, codec_name='pvd-image'):
+    """Exact number of payload bytes a codec can hide in a cover, after framing overhead.
+
+    source is a path, file object or bytes. Results are cached by content hash,
+    so asking again for the same cover only costs the hash, which streams the
+    file in blocks instead of reading it into memory.
+    """
+    key = (_source_digest(source), codec_name)
+    if key in _capacity_cache:
+        _capacity_cache.move_to_end(key)
+        return _capacity_cache[key]
+
+    codec = get_codec(codec_name)
+    if codec.media == 'audio':
+        # Audio capacity only depends on the sample count, the header is enough
+        with _open_wav(source) as audio:
+            params = audio.getparams()
+        samples = np.broadcast_to(np.uint8(0), (params.nframes * params.nchannels, params.sampwidth))
+    else:
+        samples = load_image(source)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    capacity = codec.capacity(samples)
+
+    _capacity_cache[key] = capacity
+    if len(_capacity_cache) > CAPACITY_CACHE_SIZE:
+        _capacity_cache.popitem(last=False)
+    return capacity
+
+def max_capacity_image(image_path, codec_name='pvd-image'):
+    """Calculates the max number of bytes HideImage can hide in an image."""
     try:
-        image = cv2.imread(image_path)
-        if image is None:
-            return 0
-        height, width, channels = image.shape
-        return (height * width) // 8 
+        return capacity_bytes(image_path, codec_name)
     except Exception:
         return 0
 
-def max_capacity_audio(audio_path):
-    """Calculates the max capacity of a WAV audio file in bytes for LSB."""
+def max_capacity_audio(audio_path, sample_mode=False, depth=1):
+    """Calculates the max number of characters HideAudio can hide in a WAV file."""
     try:
         with wave.open(audio_path, 'rb') as audio:
-            n_frames = audio.getnframes()
-            # 1 bit per frame, so n_frames / 8 bytes.
-            return n_frames // 8
+            params = audio.getparams()
+        if sample_mode:
+            return max_payload(capacity_bits_sample_lsb_wav(params, depth))
+        # One bit per frame byte, minus the frame header
+        return max_payload(capacity_bits_lsb_wav(params))
     except Exception:
         return 0
 
 
 
-def plot_waveform(audio_path, title, ax):
-    """Reads a WAV file and plots its waveform on a given Matplotlib axis."""
+# Waveform envelopes: the file is streamed in blocks and reduced to the min and
+# max of every display bucket per channel, so plotting cost does not grow with
+# the file length. Envelopes are cached by (content hash, buckets).
+WAVEFORM_BUCKETS = 2000
+WAVEFORM_CACHE_SIZE = 32
+_waveform_cache = OrderedDict()
+
+def _source_digest(source):
+    """SHA-256 of a path, file object or bytes, read in 1MB blocks."""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    elif hasattr(source, 'read'):
+        source.seek(0)
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+        source.seek(0)
+    else:
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def _open_wav(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    elif hasattr(source, 'seek'):
+        source.seek(0)
+    return wave.open(source, 'rb')
+
+def decode_frames(block, sampwidth, channels):
+    """Little-endian PCM frames as an int64 (frames, channels) array; 8-bit audio is centred on zero."""
+    raw = np.frombuffer(block, dtype=np.uint8)
+    if sampwidth == 1:
+        samples = raw.astype(np.int64) - 128
+    elif sampwidth == 2:
+        samples = raw.view('<i2').astype(np.int64)
+    elif sampwidth == 3:
+        # Place each 24-bit sample in the top bytes of an int32, the shift sign-extends it
+        padded = np.zeros((len(raw) // 3, 4), dtype=np.uint8)
+        padded[:, 1:] = raw.reshape(-1, 3)
+        samples = (padded.view('<i4').reshape(-1) >> 8).astype(np.int64)
+    else:
+        samples = raw.view('<i4').astype(np.int64)
+    # Samples are interleaved, one row per frame
+    return samples.reshape(-1, channels)
+
+def encode_frames(samples, sampwidth):
+    """Inverse of decode_frames: an integer (frames, channels) array back to raw frame bytes."""
+    samples = np.asarray(samples, dtype=np.int64).reshape(-1)
+    if sampwidth == 1:
+        return (samples + 128).astype(np.uint8).tobytes()
+    if sampwidth == 2:
+        return samples.astype('<i2').tobytes()
+    if sampwidth == 3:
+        return samples.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    return samples.astype('<i4').tobytes()
+
+def _envelope(blocks, n_frames, channels, buckets):
+    """Min and max per bucket and channel of a stream of (frames, channels) blocks."""
+    buckets = max(1, min(buckets, n_frames))
+    mins = np.full((buckets, channels), np.iinfo(np.int64).max)
+    maxs = np.full((buckets, channels), np.iinfo(np.int64).min)
+    position = 0
+    for frames in blocks:
+        if len(frames) == 0:
+            continue
+        index = np.arange(position, position + len(frames), dtype=np.int64) * buckets // max(n_frames, 1)
+        np.minimum(index, buckets - 1, out=index)
+        # Runs of frames in the same bucket are reduced in one call
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(index)) + 1))
+        ids = index[starts]
+        mins[ids] = np.minimum(mins[ids], np.minimum.reduceat(frames, starts, axis=0))
+        maxs[ids] = np.maximum(maxs[ids], np.maximum.reduceat(frames, starts, axis=0))
+        position += len(frames)
+    # Buckets no frame reached (a header announcing more frames than the file has)
+    empty = mins > maxs
+    mins[empty] = 0
+    maxs[empty] = 0
+    return mins, maxs
+
+def _cached_waveform(key, compute):
+    if key in _waveform_cache:
+        _waveform_cache.move_to_end(key)
+        return _waveform_cache[key]
+    result = compute()
+    for array in result:
+        array.setflags(write=False)
+    _waveform_cache[key] = result
+    if len(_waveform_cache) > WAVEFORM_CACHE_SIZE:
+        _waveform_cache.popitem(last=False)
+    return result
+
+def _bucket_times(n_buckets, n_frames, framerate):
+    return (np.arange(n_buckets) + 0.5) * (n_frames / n_buckets / framerate)
+
+def waveform_envelope(source, buckets=WAVEFORM_BUCKETS):
+    """(times, mins, maxs) of a WAV path, file object or bytes.
+
+    mins and maxs are (buckets, channels) arrays of sample values, times the
+    centre of each bucket in seconds. Files shorter than buckets frames get
+    one bucket per frame.
+    """
+    def compute():
+        with _open_wav(source) as audio:
+            params = audio.getparams()
+            blocks = (decode_frames(audio.readframes(BLOCK_FRAMES), params.sampwidth, params.nchannels)
+                      for _ in range(0, params.nframes, BLOCK_FRAMES))
+            mins, maxs = _envelope(blocks, params.nframes, params.nchannels, buckets)
+        return _bucket_times(len(mins), max(params.nframes, 1), params.framerate), mins, maxs
+    return _cached_waveform((_source_digest(source), buckets), compute)
+
+def waveform_difference(original, stego, buckets=WAVEFORM_BUCKETS):
+    """(times, mins, maxs) envelope of stego - original, sample by sample.
+
+    Both files are streamed side by side and must have the same channel count
+    and sample width; only their common length is compared.
+    """
+    def compute():
+        with _open_wav(original) as first, _open_wav(stego) as second:
+            a = first.getparams()
+            b = second.getparams()
+            if (a.nchannels, a.sampwidth) != (b.nchannels, b.sampwidth):
+                raise ValueError("Audio files have different channel counts or sample widths.")
+            n_frames = min(a.nframes, b.nframes)
+
+            def blocks():
+                for start in range(0, n_frames, BLOCK_FRAMES):
+                    count = min(BLOCK_FRAMES, n_frames - start)
+                    x = decode_frames(first.readframes(count), a.sampwidth, a.nchannels)
+                    y = decode_frames(second.readframes(count), b.sampwidth, b.nchannels)
+                    n = min(len(x), len(y))
+                    yield y[:n] - x[:n]
+
+            mins, maxs = _envelope(blocks(), n_frames, a.nchannels, buckets)
+        return _bucket_times(len(mins), max(n_frames, 1), a.framerate), mins, maxs
+    return _cached_waveform((_source_digest(original), _source_digest(stego), buckets), compute)
+
+def plot_waveform(audio_path, title, ax, buckets=WAVEFORM_BUCKETS, compare_to=None):
+    """Plots the min/max envelope of each channel of a WAV file on a Matplotlib axis.
+
+    With compare_to, the original of a stego file, the envelope of the sample
+    differences is overlaid in red on a second y axis.
+    """
     try:
-        with wave.open(audio_path, 'rb') as wf:
-            n_frames = wf.getnframes()
-            framerate = wf.getframerate()
-            signal_wave = wf.readframes(n_frames)
-            
-            # Determine the data type based on sample width
-            sampwidth = wf.getsampwidth()
-            if sampwidth == 1:
-                dtype = np.uint8 # 8-bit unsigned
-            elif sampwidth == 2:
-                dtype = np.int16 # 16-bit signed (most common)
-            else:
-                dtype = np.int32 # 24/32-bit signed
-            
-            signal_array = np.frombuffer(signal_wave, dtype=dtype)
-            
-            # Create time axis
-            time_axis = np.linspace(0, n_frames / framerate, num=n_frames)
-            
-            ax.plot(time_axis, signal_array)
-            ax.set_title(title, fontsize=10)
-            ax.set_xlabel("Time (s)")
-            ax.set_ylabel("Amplitude")
-            ax.grid(True)
+        times, mins, maxs = waveform_envelope(audio_path, buckets)
+        channels = mins.shape[1]
+        for channel in range(channels):
+            ax.fill_between(times, mins[:, channel], maxs[:, channel], alpha=0.6, linewidth=0.5,
+                            label=f"Channel {channel + 1}")
+        ax.set_title(title, fontsize=10)
+        ax.set_xlabel("Time (s)")
+        ax.set_ylabel("Amplitude")
+        ax.grid(True)
+        if channels > 1:
+            ax.legend(loc='upper right', fontsize=8)
+
+        if compare_to is not None:
+            diff_times, diff_mins, diff_maxs = waveform_difference(compare_to, audio_path, buckets)
+            diff_ax = ax.twinx()
+            diff_ax.fill_between(diff_times, diff_mins.min(axis=1), diff_maxs.max(axis=1),
+                                 color='red', alpha=0.5, linewidth=0.5)
+            diff_ax.set_ylabel("Difference", color='red')
     except Exception as e:
         ax.text(0.5, 0.5, f"Could not plot: {e}", ha='center')
@@ -0,0 +1,38 @@
+"""
+Thread pool shared by the parallel LSB and PVD engines.
+
+The engines split a cover into regions that never overlap and whose first
+payload bit is known up front, then run one call per region on a pool of
+threads sharing the same NumPy arrays. NumPy releases the GIL inside its
+loops, so the threads use separate cores, and because each region only writes
+its own values the output is identical to the serial engine.
+"""
+import os
+import threading
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def resolve_workers(workers):
+    """Thread count for a workers argument; None or 0 means one per CPU core."""
+    if not workers:
+        return os.cpu_count() or 1
+    if workers < 0:
+        raise ValueError("workers must be a positive number of threads.")
+    return workers
+
+
+def map_regions(fn, regions, workers=None):
+    """[fn(region) for region in regions], run on up to workers threads; results keep their order."""
+    workers = resolve_workers(workers)
+    regions = list(regions)
+    if workers == 1 or len(regions) < 2:
+        return [fn(region) for region in regions]
+    # One long-lived pool per size, so repeated calls do not pay for thread start-up
+    from concurrent.futures import ThreadPoolExecutor
+    with _lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ThreadPoolExecutor(workers, thread_name_prefix=f'stego-{workers}')
+    return list(pool.map(fn, regions))
@@ -0,0 +1,370 @@
+"""
+Vectorized PVD engine shared by HideImage and UnhideImage.
+
+Pixel pairs are (col, col + 1) for every even col, visited channel -> row -> col
+exactly like the original nested loops, so files produced by either version
+decode the same way.
+
+extract_pvd still reads the original layout, where a pair's difference was
+replaced by the embedded value. That is not always invertible, because the new
+difference can land in a range with a different capacity, so new payloads are
+framed and written with embed_pvd_range: the new difference is the lower bound
+of the pair's range plus the value, so the range, and with it the capacity,
+survives.
+"""
+from itertools import islice
+import numpy as np
+from parallel import map_regions, resolve_workers
+
+# Pair differences below these bounds carry 1, 2, 3 and 4 bits, anything else 5
+CAPACITY_THRESHOLDS = np.array([16, 32, 64, 128])
+RANGE_LOWER = np.array([0, 16, 32, 64, 128])
+LENGTH_PREFIX_BITS = 32
+
+
+def pair_views(pixels):
+    """Returns (first, second) strided views of every pixel pair as (channel, row, pair) arrays."""
+    planes = pixels[np.newaxis] if pixels.ndim == 2 else np.moveaxis(pixels, -1, 0)
+    usable = (planes.shape[2] // 2) * 2
+    return planes[:, :, 0:usable:2], planes[:, :, 1:usable:2]
+
+
+def pair_capacities(diff):
+    """Vectorized get_capacity: number of bits carried by each pair difference."""
+    return np.digitize(diff, CAPACITY_THRESHOLDS) + 1
+
+
+def capacity_bits_pvd(pixels):
+    """Total number of bits PVD can embed in the image."""
+    first, second = pair_views(pixels)
+    diff = np.abs(first.astype(np.int32) - second)
+    return int(pair_capacities(diff).sum())
+
+
+def pair_diffs(first, second, start, stop):
+    """Absolute differences of pairs start..stop in channel -> row -> col order.
+
+    Only the rows covering the range are read, so looking at the first few
+    pairs of a large image costs a few rows, not a copy of the whole image.
+    """
+    channels, rows, per_row = first.shape
+    per_channel = rows * per_row
+    stop = min(stop, channels * per_channel)
+    chunks = []
+    position = start
+    while position < stop:
+        channel, rest = divmod(position, per_channel)
+        end = min(stop, (channel + 1) * per_channel) - channel * per_channel
+        first_row = rest // per_row
+        last_row = -(-end // per_row)
+        a = first[channel, first_row:last_row].reshape(-1).astype(np.int32)
+        b = second[channel, first_row:last_row].reshape(-1)
+        offset = rest - first_row * per_row
+        chunks.append(np.abs(a - b)[offset:offset + end - rest])
+        position += end - rest
+    if not chunks:
+        return np.zeros(0, dtype=np.int32)
+    return np.concatenate(chunks)
+
+
+def _bit_lengths(diff):
+    """Bits the legacy decoder reads from each pair: max(capacity, bit length of diff)."""
+    return np.maximum(pair_capacities(diff), np.searchsorted(1 << np.arange(32), diff, side='right'))
+
+
+def _pair_bits(diff, lengths):
+    """Concatenated big-endian bits of each difference, lengths[i] bits for pair i."""
+    if len(diff) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    # One row of bits per pair; the mask keeps the low lengths[i] bits of row i
+    shifts = np.arange(int(lengths.max()) - 1, -1, -1, dtype=diff.dtype)
+    matrix = ((diff[:, np.newaxis] >> shifts) & 1).astype(np.uint8)
+    return matrix[shifts < lengths[:, np.newaxis]]
+
+
+def extract_pvd(pixels):
+    """Reads the message bits of a PVD stego image, or None when there is no message.
+
+    Each pair yields format(diff, '0{capacity}b'), so differences wider than
+    their capacity contribute all of their bits, as the original decoder did.
+    Only the prefix pairs and the pairs covering the payload are decoded. A
+    length the remaining pairs cannot hold means there is no message, and is
+    rejected before decoding anything else.
+    """
+    first, second = pair_views(pixels)
+    n_total = first.size
+    diff = pair_diffs(first, second, 0, LENGTH_PREFIX_BITS)
+    caps = pair_capacities(diff)
+
+    # The prefix spans at most 32 pairs, walk them the same way the loop did
+    prefix = ''
+    collected = 0
+    remainder = ''
+    message_length = None
+    pair = 0
+    while message_length is None and pair < len(diff):
+        cap = int(caps[pair])
+        embedded_bits = format(int(diff[pair]), f'0{cap}b')
+        needed = LENGTH_PREFIX_BITS - collected
+        pair += 1
+        if cap <= needed:
+            collected += cap
+            prefix += embedded_bits
+            if collected == LENGTH_PREFIX_BITS:
+                message_length = int(prefix, 2)
+        else:
+            prefix += embedded_bits[:needed]
+            message_length = int(prefix, 2)
+            remainder = embedded_bits[needed:]
+    if message_length is None:
+        return None
+
+    head = np.frombuffer(remainder.encode('ascii'), dtype=np.uint8) - ord('0')
+    missing = message_length - len(head)
+    if missing <= 0:
+        return head[:message_length]
+    # No pair yields more than 8 bits
+    if missing > 8 * (n_total - pair):
+        return None
+
+    # Decode growing windows of pairs until they hold the payload
+    chunks = []
+    available = 0
+    window = -(-missing // 8)
+    while available < missing:
+        if pair >= n_total:
+            return None
+        chunk = pair_diffs(first, second, pair, pair + window)
+        chunks.append(chunk)
+        available += int(_bit_lengths(chunk).sum())
+        pair += len(chunk)
+        window *= 2
+    diff = np.concatenate(chunks)
+    lengths = _bit_lengths(diff)
+    n_pairs = int(np.searchsorted(np.cumsum(lengths), missing)) + 1
+    body = _pair_bits(diff[:n_pairs], lengths[:n_pairs])
+    return np.concatenate((head, body))[:message_length]
+
+
+def _pair_values(bits, ends):
+    """Reads bits as one big-endian value per pair, pair i ending at bit ends[i]."""
+    positions = np.arange(len(bits))
+    owner = np.searchsorted(ends, positions, side='right')
+    weights = np.left_shift(1, ends[owner] - 1 - positions)
+    return np.bincount(owner, weights=bits * weights, minlength=len(ends)).astype(np.int64)
+
+
+def _embed_pairs(p1, p2, bits):
+    """Embeds as many of bits as fit into 1-D int pair arrays p1/p2, in place; returns the bits used.
+
+    The last pair is padded with zero bits. The pair is moved apart or together
+    around its original values and shifted back into [0, 255] when needed,
+    which never changes the difference.
+    """
+    diff = np.abs(p1.astype(np.int32) - p2)
+    ranges = np.digitize(diff, CAPACITY_THRESHOLDS)
+    ends = np.cumsum(ranges + 1)
+    if len(bits) == 0 or len(ends) == 0:
+        return 0
+    used = min(len(bits), int(ends[-1]))
+
+    n_pairs = int(np.searchsorted(ends, used)) + 1
+    ends = ends[:n_pairs]
+    padded = np.zeros(int(ends[-1]), dtype=np.uint8)
+    padded[:used] = bits[:used]
+    new_diff = RANGE_LOWER[ranges[:n_pairs]] + _pair_values(padded, ends)
+
+    a = p1[:n_pairs].astype(np.int32)
+    b = p2[:n_pairs].astype(np.int32)
+    first_larger = a >= b
+    high = np.maximum(a, b)
+    low = np.minimum(a, b)
+    change = new_diff - diff[:n_pairs]
+    high = high + (change + 1) // 2
+    low = low - change // 2
+    shift = np.maximum(0, -low) - np.maximum(0, high - 255)
+    high += shift
+    low += shift
+    p1[:n_pairs] = np.where(first_larger, high, low)
+    p2[:n_pairs] = np.where(first_larger, low, high)
+    return used
+
+
+def embed_pvd_range(pixels, bits):
+    """Embeds bits so every used pair keeps its difference range, in place."""
+    if len(bits) > capacity_bits_pvd(pixels):
+        raise ValueError("Message is too long to fit in the image.")
+    first, second = pair_views(pixels)
+    p1 = first.reshape(-1)
+    p2 = second.reshape(-1)
+    _embed_pairs(p1, p2, bits)
+    first[...] = p1.reshape(first.shape)
+    second[...] = p2.reshape(second.shape)
+    return pixels
+
+
+def _lazy_range_reader(next_diffs):
+    """read_bits over range-PVD pairs, pulling pair differences from next_diffs(n_bits) on demand.
+
+    next_diffs returns the differences of the following pairs, enough for
+    about n_bits when possible, or None once the image is exhausted.
+    """
+    values = np.zeros(0, dtype=np.int32)
+    caps = np.zeros(0, dtype=np.int64)
+    ends = np.zeros(0, dtype=np.int64)
+
+    def read_bits(start, stop):
+        nonlocal values, caps, ends
+        while (ends[-1] if len(ends) else 0) < stop:
+            diff = next_diffs(stop - (int(ends[-1]) if len(ends) else 0))
+            if diff is None:
+                break
+            ranges = np.digitize(diff, CAPACITY_THRESHOLDS)
+            values = np.concatenate((values, diff - RANGE_LOWER[ranges]))
+            caps = np.concatenate((caps, ranges + 1))
+            ends = np.cumsum(caps)
+        # Only the pairs overlapping [start, stop) are expanded to bits
+        first_pair = int(np.searchsorted(ends, start, side='right'))
+        last_pair = int(np.searchsorted(ends, stop - 1, side='right')) + 1
+        bits = _pair_bits(values[first_pair:last_pair], caps[first_pair:last_pair])
+        offset = start - (int(ends[first_pair - 1]) if first_pair else 0)
+        return bits[offset:offset + stop - start]
+
+    return read_bits
+
+
+def pvd_range_bit_source(pixels):
+    """(read_bits, total_bits) over a stego image written by embed_pvd_range.
+
+    Pairs are decoded only as far as reads go, so a cover without a frame is
+    recognised from its first few pairs. total_bits is the 5 bits per pair
+    upper bound; read_bits returns fewer bits than asked past the exact
+    capacity.
+    """
+    first, second = pair_views(pixels)
+    position = 0
+
+    def next_diffs(n_bits):
+        nonlocal position
+        if position >= first.size:
+            return None
+        # At least one pair per 5 bits is needed
+        diff = pair_diffs(first, second, position, position + max(-(-n_bits // 5), 64))
+        position += len(diff)
+        return diff
+
+    return _lazy_range_reader(next_diffs), 5 * first.size
+
+
+# -------------------------------
+# Tiled mode for very large images
+# -------------------------------
+# Rows per band; each band is copied to int16 on its own, so the working set is
+# a few band_rows x width arrays whatever the image size.
+BAND_ROWS = 256
+
+
+def iter_pair_bands(pixels, band_rows=BAND_ROWS):
+    """Yields (first, second) pair views band by band, in channel -> row -> col order."""
+    channels = 1 if pixels.ndim == 2 else pixels.shape[2]
+    usable = (pixels.shape[1] // 2) * 2
+    for channel in range(channels):
+        plane = pixels if pixels.ndim == 2 else pixels[:, :, channel]
+        for row in range(0, pixels.shape[0], band_rows):
+            band = plane[row:row + band_rows]
+            yield band[:, 0:usable:2], band[:, 1:usable:2]
+
+
+def embed_pvd_range_tiled(pixels, bits, band_rows=BAND_ROWS):
+    """embed_pvd_range over a uint8 array or memmap, one row band at a time.
+
+    Produces the same pixels as embed_pvd_range. Bands after the one holding
+    the last payload bit are never read. If the payload does not fit, the
+    bands already visited are left modified.
+    """
+    position = 0
+    for first, second in iter_pair_bands(pixels, band_rows):
+        if position >= len(bits):
+            break
+        p1 = first.astype(np.int16).reshape(-1)
+        p2 = second.astype(np.int16).reshape(-1)
+        position += _embed_pairs(p1, p2, bits[position:])
+        first[...] = p1.reshape(first.shape)
+        second[...] = p2.reshape(second.shape)
+    if position < len(bits):
+        raise ValueError("Message is too long to fit in the image.")
+    return pixels
+
+
+def pvd_range_bit_source_tiled(pixels, band_rows=BAND_ROWS):
+    """(read_bits, None) over a stego image, decoding row bands only as far as reads go.
+
+    The total is unknown without scanning the whole image, so it is None and
+    read_bits returns fewer bits than asked once the image runs out.
+    """
+    bands = iter_pair_bands(pixels, band_rows)
+
+    def next_diffs(n_bits):
+        band = next(bands, None)
+        if band is None:
+            return None
+        first, second = band
+        return np.abs(first.astype(np.int16).reshape(-1) - second.reshape(-1))
+
+    return _lazy_range_reader(next_diffs), None
+
+
+# -------------------------------
+# Parallel mode for multi-core hosts
+# -------------------------------
+def _band_capacity(band):
+    first, second = band
+    return int(pair_capacities(np.abs(first.astype(np.int32) - second)).sum())
+
+
+def embed_pvd_range_parallel(pixels, bits, workers=None, band_rows=BAND_ROWS):
+    """embed_pvd_range over row bands on up to workers threads, in place.
+
+    A first parallel pass sums the capacity of every band. Their prefix sum is
+    the first payload bit of each band, so the bands are then embedded
+    independently and the pixels match embed_pvd_range exactly. Works on int
+    arrays and uint8 memmaps, and raises before changing any pixel when the
+    payload does not fit.
+    """
+    bands = list(iter_pair_bands(pixels, band_rows))
+    starts = np.concatenate(([0], np.cumsum(map_regions(_band_capacity, bands, workers), dtype=np.int64)))
+    if len(bits) > starts[-1]:
+        raise ValueError("Message is too long to fit in the image.")
+
+    def embed(k):
+        first, second = bands[k]
+        p1 = first.astype(np.int32).reshape(-1)
+        p2 = second.astype(np.int32).reshape(-1)
+        _embed_pairs(p1, p2, bits[starts[k]:starts[k + 1]])
+        first[...] = p1.reshape(first.shape)
+        second[...] = p2.reshape(second.shape)
+
+    # Only the bands whose first bit falls inside the payload
+    map_regions(embed, range(int(np.searchsorted(starts[:-1], len(bits)))), workers)
+    return pixels
+
+
+def pvd_range_bit_source_parallel(pixels, workers=None, band_rows=BAND_ROWS):
+    """(read_bits, None) like pvd_range_bit_source_tiled, decoding batches of bands on up to workers threads."""
+    workers = resolve_workers(workers)
+    bands = iter_pair_bands(pixels, band_rows)
+    pairs_per_band = max(1, min(band_rows, pixels.shape[0]) * (pixels.shape[1] // 2))
+
+    def diffs(band):
+        first, second = band
+        return np.abs(first.astype(np.int32).reshape(-1) - second.reshape(-1))
+
+    def next_diffs(n_bits):
+        # Pairs carry at most 5 bits, so fewer bands never hold n_bits; round up to a batch per thread
+        count = -(-n_bits // (5 * pairs_per_band))
+        batch = list(islice(bands, max(1, -(-count // workers)) * workers))
+        if not batch:
+            return None
+        return np.concatenate(map_regions(diffs, batch, workers))
+
+    return _lazy_range_reader(next_diffs), None
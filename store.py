@@ -0,0 +1,289 @@
+"""
+Content-addressed blob store behind the Flask upload folder.
+
+Every upload is hashed with SHA-256 while it is staged (stage, or
+file_digest for a file already on disk), then committed into the store and
+kept once as store/<first two hex digits>/<digest>. Published files in the
+upload folder are hard links to their blob, so the link count of a blob is
+its reference count: a blob with no link left besides its own is garbage.
+
+Every published link shares its blob's inode, and with it the mtime that the
+upload routes turn into ETag and Last-Modified, so the store never touches a
+blob after writing it. Retention is tracked in a separate marker file instead,
+store/refreshed/<digest>, whose mtime is refreshed when the blob is committed
+and when one of its links is removed: gc counts retention from the later of
+the blob's own mtime and its marker's, i.e. from the moment it lost its last
+link.
+Committing and linking a blob, unlinking and gc all hold the store lock (a
+lock file in the store, shared with the gc command line), so gc never sees a
+blob between its commit and its first link.
+
+    python -m store gc STORE_FOLDER --retention-days 7
+    python -m store gc STORE_FOLDER --expire-days 90 --uploads UPLOAD_FOLDER --catalog CATALOG_PATH
+    python -m store gc STORE_FOLDER --partial PARTIAL_FOLDER --partial-days 1
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the lock only serialises threads of one process
+    fcntl = None
+
+BLOCK_SIZE = 1024 * 1024
+LOCK_NAME = '.lock'
+REFRESHED_FOLDER = 'refreshed'
+
+
+def file_digest(path):
+    """SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    def __init__(self, folder):
+        self.folder = folder
+        self.tmp_folder = os.path.join(folder, 'tmp')
+        self.lock_path = os.path.join(folder, LOCK_NAME)
+        self.refreshed_folder = os.path.join(folder, REFRESHED_FOLDER)
+        self._thread_lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+        os.makedirs(self.tmp_folder, exist_ok=True)
+        os.makedirs(self.refreshed_folder, exist_ok=True)
+
+    @contextmanager
+    def lock(self):
+        """Exclusive store lock, reentrant within a thread."""
+        with self._thread_lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                self._lock_file = open(self.lock_path, 'a')
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_file is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def blob_path(self, digest):
+        return os.path.join(self.folder, digest[:2], digest)
+
+    def has(self, digest):
+        return os.path.exists(self.blob_path(digest))
+
+    def _marker_path(self, digest):
+        return os.path.join(self.refreshed_folder, digest)
+
+    def refresh(self, digest):
+        """Restarts a blob's gc retention now, without touching the blob itself."""
+        marker = self._marker_path(digest)
+        with self.lock():
+            with open(marker, 'a'):
+                pass
+            os.utime(marker)
+
+    def refreshed(self, digest):
+        """Time gc counts a blob's retention from: its mtime or its last refresh, if later."""
+        times = []
+        for path in (self.blob_path(digest), self._marker_path(digest)):
+            try:
+                times.append(os.stat(path).st_mtime)
+            except FileNotFoundError:
+                continue
+        return max(times) if times else None
+
+    def stage(self, stream):
+        """Copies a binary stream into a temporary file, hashing as it writes.
+
+        Returns (temporary path, digest) for commit; takes no lock, so large
+        uploads never hold up the store.
+        """
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for block in iter(lambda: stream.read(BLOCK_SIZE), b''):
+                    digest.update(block)
+                    f.write(block)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest()
+
+    def commit(self, tmp_path, digest):
+        """Moves a staged file into the store as blob digest and returns the digest.
+
+        Content already in the store is not kept twice; the staged file is
+        consumed either way. The blob's retention is refreshed, so gc keeps it
+        for the full retention even if it is not linked yet. Callers that link
+        the blob should hold lock() across commit and link.
+        """
+        blob = self.blob_path(digest)
+        with self.lock():
+            try:
+                if not os.path.exists(blob):
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    os.replace(tmp_path, blob)
+                self.refresh(digest)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return digest
+
+    def link(self, digest, path):
+        """Publishes a blob under path as a hard link, or a copy where links are not supported."""
+        with self.lock():
+            try:
+                os.link(self.blob_path(digest), path)
+            except OSError:
+                shutil.copyfile(self.blob_path(digest), path)
+
+    def unlink(self, path, digest):
+        """Removes a published link to blob digest; the blob's retention starts now."""
+        with self.lock():
+            self.refresh(digest)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def refcount(self, digest):
+        """Number of published links to a blob."""
+        return os.stat(self.blob_path(digest)).st_nlink - 1
+
+    def gc(self, retention_seconds, dry_run=False):
+        """Removes unreferenced blobs and abandoned temporary files older than retention_seconds.
+
+        Returns (files removed, bytes freed).
+        """
+        cutoff = time.time() - retention_seconds
+        removed = 0
+        freed = 0
+        with self.lock():
+            for root, _, files in os.walk(self.folder):
+                if root == self.refreshed_folder:
+                    continue
+                for name in files:
+                    path = os.path.join(root, name)
+                    if path == self.lock_path:
+                        continue
+                    try:
+                        stat = os.stat(path)
+                        if root == self.tmp_folder:
+                            last_used = stat.st_mtime
+                        elif stat.st_nlink > 1:
+                            continue
+                        else:
+                            last_used = self.refreshed(name)
+                        if last_used is None or last_used >= cutoff:
+                            continue
+                        if not dry_run:
+                            os.remove(path)
+                    except FileNotFoundError:
+                        # Removed by someone else since the walk listed it
+                        continue
+                    removed += 1
+                    freed += stat.st_size
+
+            # Markers outlive their blob only until the blob is collected
+            for name in os.listdir(self.refreshed_folder):
+                if not dry_run and not self.has(name):
+                    try:
+                        os.remove(self._marker_path(name))
+                    except FileNotFoundError:
+                        continue
+        return removed, freed
+
+
+def expire_uploads(upload_folder, catalog, store, max_age_seconds, dry_run=False):
+    """Unpublishes uploads catalogued more than max_age_seconds ago; returns the number removed."""
+    expired = catalog.older_than(time.time() - max_age_seconds)
+    if not dry_run:
+        for filename in expired:
+            entry = catalog.get(filename)
+            if entry is not None:
+                store.unlink(os.path.join(upload_folder, filename), entry["sha256"])
+            catalog.remove(filename)
+    return len(expired)
+
+
+def expire_partial_uploads(partial_folder, max_age_seconds, dry_run=False):
+    """Removes chunked uploads (.part data and .json metadata) idle for more than max_age_seconds.
+
+    An upload's age is that of its newest file, so one still receiving chunks
+    is kept. Returns the number of uploads removed.
+    """
+    cutoff = time.time() - max_age_seconds
+    last_used = {}
+    for entry in os.scandir(partial_folder):
+        upload_id, ext = os.path.splitext(entry.name)
+        if ext not in ('.part', '.json'):
+            continue
+        try:
+            mtime = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        last_used[upload_id] = max(mtime, last_used.get(upload_id, mtime))
+    expired = [upload_id for upload_id, mtime in last_used.items() if mtime < cutoff]
+    if not dry_run:
+        for upload_id in expired:
+            for ext in ('.json', '.part'):
+                try:
+                    os.remove(os.path.join(partial_folder, upload_id + ext))
+                except FileNotFoundError:
+                    continue
+    return len(expired)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the content-addressed upload store.")
+    parser.add_argument('command', choices=['gc'])
+    parser.add_argument('store', help="store folder")
+    parser.add_argument('--retention-days', type=float, default=7,
+                        help="keep unreferenced blobs this long before deleting them (default: 7)")
+    parser.add_argument('--expire-days', type=float, default=None,
+                        help="also unpublish uploads older than this")
+    parser.add_argument('--uploads', help="upload folder, required with --expire-days")
+    parser.add_argument('--catalog', help="catalog database, required with --expire-days")
+    parser.add_argument('--partial', help="chunked upload folder whose idle uploads expire")
+    parser.add_argument('--partial-days', type=float, default=1,
+                        help="remove chunked uploads idle this long (default: 1)")
+    parser.add_argument('--dry-run', action='store_true', help="only report what would be removed")
+    args = parser.parse_args(argv)
+
+    store = BlobStore(args.store)
+    if args.expire_days is not None:
+        if not args.uploads or not args.catalog:
+            parser.error("--expire-days needs --uploads and --catalog")
+        from catalog import Catalog
+        expired = expire_uploads(args.uploads, Catalog(args.catalog), store, args.expire_days * 86400,
+                                 args.dry_run)
+        print(f"Expired {expired} uploads")
+    if args.partial:
+        expired = expire_partial_uploads(args.partial, args.partial_days * 86400, args.dry_run)
+        print(f"Expired {expired} partial uploads")
+    removed, freed = store.gc(args.retention_days * 86400, args.dry_run)
+    print(f"Removed {removed} files, {freed / 1e6:.2f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
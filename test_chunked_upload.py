@@ -0,0 +1,199 @@
+"""
+Resumable chunked uploads and ranged downloads in flask_app.py, and the
+catalog pages /list is served from.
+
+    python -m pytest test_chunked_upload.py
+"""
+import hashlib
+import os
+import threading
+import time
+import pytest
+from catalog import Catalog, decode_cursor, encode_cursor
+from store import BlobStore
+
+flask_app = pytest.importorskip('flask_app')
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    uploads = tmp_path / 'uploads'
+    partial = tmp_path / 'partial'
+    uploads.mkdir()
+    partial.mkdir()
+    monkeypatch.setitem(flask_app.app.config, 'UPLOAD_FOLDER', str(uploads))
+    monkeypatch.setattr(flask_app, 'PARTIAL_FOLDER', str(partial))
+    monkeypatch.setattr(flask_app, 'store', BlobStore(str(tmp_path / 'store')))
+    monkeypatch.setattr(flask_app, 'catalog', Catalog(str(tmp_path / 'catalog.sqlite3')))
+    return flask_app.app.test_client()
+
+
+def start(client, filename='long.wav', size=None):
+    fields = {'filename': filename}
+    if size is not None:
+        fields['size'] = size
+    response = client.post('/upload/chunked', json=fields)
+    assert response.status_code == 201
+    return response.get_json()["upload_url"]
+
+
+def send(client, url, data, offset):
+    return client.patch(url, data=data, headers={'Upload-Offset': str(offset)})
+
+
+def test_chunked_upload_round_trip(client):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    url = start(client, size=len(data))
+    offset = 0
+    for step in (1024 * 1024, 1024 * 1024 + 1, len(data)):
+        response = send(client, url, data[offset:offset + step], offset)
+        assert response.status_code == 200
+        offset = response.get_json()["offset"]
+        assert client.get(url).get_json()["offset"] == offset
+    assert offset == len(data)
+
+    response = client.post(url + '/complete')
+    assert response.status_code == 200
+    entry = response.get_json()
+    assert entry["sha256"] == hashlib.sha256(data).hexdigest()
+    assert entry["size"] == len(data)
+    with open(os.path.join(flask_app.app.config['UPLOAD_FOLDER'], entry["filename"]), 'rb') as f:
+        assert f.read() == data
+    assert os.listdir(flask_app.PARTIAL_FOLDER) == []
+    assert client.get(url).status_code == 404
+
+
+def test_offset_mismatch_is_409(client):
+    data = os.urandom(5000)
+    url = start(client, size=len(data))
+    assert send(client, url, data[:2000], 0).status_code == 200
+
+    # A repeated chunk and a skipped one are both refused with the offset to resume from
+    for offset in (0, 1000, 3000):
+        response = send(client, url, data[offset:offset + 1000], offset)
+        assert response.status_code == 409
+        assert response.get_json()["error"] == "Offset mismatch"
+        assert response.get_json()["offset"] == 2000
+    assert client.get(url).get_json()["offset"] == 2000
+
+    assert send(client, url, data[2000:], 2000).status_code == 200
+    entry = client.post(url + '/complete').get_json()
+    assert entry["sha256"] == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize('offset', ['-1', 'abc', '1.5'])
+def test_invalid_offset_is_400(client, offset):
+    url = start(client)
+    response = client.patch(url, data=b'x', headers={'Upload-Offset': offset})
+    assert response.status_code == 400
+    assert client.patch(url, data=b'x').status_code == 400
+    assert client.get(url).get_json()["offset"] == 0
+
+
+def test_start_rejects_bad_requests(client):
+    assert client.post('/upload/chunked', json={}).status_code == 400
+    assert client.post('/upload/chunked', json={'filename': 'x.exe'}).status_code == 400
+    assert client.post('/upload/chunked', json={'filename': 'x.wav', 'size': -1}).status_code == 400
+    response = client.post('/upload/chunked', json={'filename': 'x.wav', 'size': flask_app.MAX_CHUNKED_UPLOAD_SIZE + 1})
+    assert response.status_code == 413
+    assert client.post('/upload/chunked', json={'filename': 'x.wav', 'codec': 'nope'}).status_code == 400
+
+
+def test_size_limit_and_incomplete_upload(client):
+    url = start(client, size=5)
+    response = send(client, url, b'123456', 0)
+    assert response.status_code == 413
+    assert client.get(url).get_json()["offset"] == 0
+
+    assert send(client, url, b'123', 0).status_code == 200
+    response = client.post(url + '/complete')
+    assert response.status_code == 409
+    assert response.get_json()["offset"] == 3
+
+
+def test_abort_and_unknown_upload(client):
+    url = start(client)
+    assert send(client, url, b'abc', 0).status_code == 200
+    assert client.delete(url).status_code == 200
+    assert client.get(url).status_code == 404
+    assert send(client, url, b'abc', 3).status_code == 404
+    assert client.post(url + '/complete').status_code == 404
+    assert os.listdir(flask_app.PARTIAL_FOLDER) == []
+
+
+def test_uploads_lock_independently(client):
+    first, second = start(client), start(client)
+    first_id = first.rsplit('/', 1)[1]
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with flask_app.upload_lock(first_id):
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(5)
+    try:
+        # Another upload goes through while the first one's lock is held
+        assert send(client, second, b'abc', 0).status_code == 200
+    finally:
+        release.set()
+        thread.join()
+    assert send(client, first, b'abc', 0).status_code == 200
+    assert flask_app.upload_locks == {}
+
+
+def test_ranged_and_conditional_download(client):
+    data = os.urandom(4096)
+    url = start(client, size=len(data))
+    send(client, url, data, 0)
+    filename = client.post(url + '/complete').get_json()["filename"]
+
+    response = client.get('/uploads/' + filename)
+    etag = response.headers['ETag']
+    assert response.data == data
+    assert 'max-age' in response.headers['Cache-Control']
+    response = client.get('/uploads/' + filename, headers={'Range': 'bytes=100-199', 'If-Range': etag})
+    assert response.status_code == 206
+    assert response.data == data[100:200]
+    assert client.get('/uploads/' + filename, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_catalog_pages(tmp_path):
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    catalog = Catalog(str(tmp_path / 'catalog.sqlite3'))
+    now = time.time()
+    for i in range(25):
+        name = f'file{i:02d}.' + ('wav' if i % 3 == 0 else 'png')
+        (folder / name).write_bytes(b'x' * i)
+        catalog.add(str(folder), name, codec='lsb-image' if i % 2 else None, mtime=now + i // 2)
+
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = catalog.page(limit=4, cursor=cursor)
+        seen += rows
+        if cursor is None:
+            break
+    assert [row["filename"] for row in seen] == [f'file{i:02d}.' + ('wav' if i % 3 == 0 else 'png')
+                                                 for i in reversed(range(25))]
+    assert decode_cursor(encode_cursor(seen[0])) == (seen[0]["mtime"], seen[0]["filename"])
+    with pytest.raises(ValueError):
+        decode_cursor('not a cursor')
+
+    rows, _ = catalog.page(limit=100, media='audio')
+    assert len(rows) == 9 and all(row["media_type"] == 'audio/x-wav' for row in rows)
+    rows, _ = catalog.page(limit=100, codec='lsb-image', min_size=10, max_size=20)
+    assert sorted(row["size"] for row in rows) == [11, 13, 15, 17, 19]
+    rows, _ = catalog.page(limit=100, since=now + 10)
+    assert len(rows) == 5
+
+    (folder / 'file00.wav').unlink()
+    (folder / 'extra.png').write_bytes(b'new')
+    assert catalog.rebuild(str(folder)) == 25
+    assert catalog.get('file00.wav') is None
+    assert catalog.get('extra.png')["sha256"] == hashlib.sha256(b'new').hexdigest()
+    assert catalog.touch('extra.png', now + 100)["mtime"] == now + 100
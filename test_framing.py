@@ -0,0 +1,160 @@
+"""
+Round trips and malformed frames for framing.pack_frame / framing.read_frame.
+
+    python -m pytest test_framing.py
+"""
+import lzma
+import zlib
+import numpy as np
+import pytest
+import framing
+from framing import FrameError, pack_frame, read_frame
+
+
+def bit_source(data, total_bits='exact'):
+    """(read_bits, total_bits) over the bits of a byte string."""
+    bits = np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8))
+
+    def read_bits(start, stop):
+        return bits[start:stop]
+
+    return read_bits, len(bits) if total_bits == 'exact' else total_bits
+
+
+def read(data, codec=None, total_bits='exact'):
+    read_bits, total = bit_source(data, total_bits)
+    return read_frame(read_bits, total, codec)
+
+
+def build(stored, codec_id=1, flag=framing.NO_COMPRESSION, version=framing.VERSION, magic=framing.MAGIC):
+    """A frame assembled by hand, with a valid CRC."""
+    head = magic + bytes([version, codec_id, flag]) + framing.encode_varint(len(stored)) + stored
+    return head + zlib.crc32(head).to_bytes(framing.CRC_SIZE, 'big')
+
+
+PAYLOADS = [b'', b'x', b'\x00' * 300, bytes(range(256)) * 3, 'héllo wörld'.encode('utf-8')]
+
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+@pytest.mark.parametrize('compression', ['auto', 'none', 'zlib', 'lzma'])
+@pytest.mark.parametrize('total_bits', ['exact', None])
+def test_round_trip(payload, compression, total_bits):
+    frame = pack_frame(payload, 'lsb-image', compression)
+    assert read(frame + b'\xff' * 5, 'lsb-image', total_bits) == payload
+
+
+@pytest.mark.parametrize('codec', sorted(framing.CODEC_IDS))
+def test_frame_bits_round_trip(codec):
+    bits = framing.frame_bits(b'payload', codec)
+    assert read_frame(lambda start, stop: bits[start:stop], len(bits), codec) == b'payload'
+
+
+@pytest.mark.parametrize('n', [0, 1, 127, 128, 16383, 16384, 2 ** 35])
+def test_varint_lengths(n):
+    encoded = framing.encode_varint(n)
+    assert len(encoded) == max(1, (n.bit_length() + 6) // 7)
+    assert encoded[-1] < 0x80 and all(b & 0x80 for b in encoded[:-1])
+
+
+def test_compression_flags():
+    payload = b'abc' * 200
+    for compression, flag, unpack in [('none', framing.NO_COMPRESSION, bytes),
+                                      ('zlib', framing.ZLIB, zlib.decompress),
+                                      ('lzma', framing.LZMA, lzma.decompress)]:
+        frame = pack_frame(payload, 'pvd-image', compression)
+        stored = framing.compress(payload, compression)[1]
+        assert frame == build(stored, framing.CODEC_IDS['pvd-image'], flag)
+        assert unpack(stored) == payload
+        assert read(frame, 'pvd-image') == payload
+
+
+def test_auto_keeps_incompressible_payload():
+    payload = bytes(np.random.default_rng(0).integers(0, 256, 64, dtype=np.uint8))
+    frame = pack_frame(payload, 'lsb-audio', 'auto')
+    assert frame[framing.HEADER_SIZE - 1] == framing.NO_COMPRESSION
+    assert read(frame) == payload
+
+
+def test_unknown_compression_name():
+    with pytest.raises(ValueError):
+        pack_frame(b'x', 'lsb-image', 'bz2')
+
+
+def test_crc_mismatch():
+    frame = bytearray(pack_frame(b'secret message', 'lsb-image', 'none'))
+    frame[framing.HEADER_SIZE + 3] ^= 0x01
+    with pytest.raises(FrameError, match='CRC'):
+        read(frame)
+    frame = bytearray(pack_frame(b'secret message', 'lsb-image', 'none'))
+    frame[-1] ^= 0x80
+    with pytest.raises(FrameError, match='CRC'):
+        read(frame)
+
+
+@pytest.mark.parametrize('magic', [b'STH', b'stg', b'\x00\x00\x00'])
+def test_bad_magic_is_not_a_frame(magic):
+    assert read(build(b'data', magic=magic)) is None
+
+
+def test_bad_version():
+    with pytest.raises(FrameError, match='version'):
+        read(build(b'data', version=framing.VERSION + 1))
+
+
+def test_cover_too_small_for_a_frame():
+    assert read(b'') is None
+    assert read(pack_frame(b'', 'lsb-image')[:framing.HEADER_SIZE]) is None
+
+
+def test_truncated_varint():
+    # Continuation bit set on the last byte the cover has
+    data = framing.MAGIC + bytes([framing.VERSION, 1, 0]) + b'\x80' * 5
+    with pytest.raises(FrameError, match='truncated'):
+        read(data, total_bits=None)
+    with pytest.raises(FrameError, match='truncated'):
+        read(data)
+
+
+def test_overlong_varint():
+    data = framing.MAGIC + bytes([framing.VERSION, 1, 0]) + b'\x80' * (framing.MAX_VARINT_BYTES + 1)
+    with pytest.raises(FrameError, match='Invalid frame length'):
+        read(data + b'\x00' * 8)
+
+
+def test_length_past_capacity():
+    frame = build(b'data')
+    with pytest.raises(FrameError, match='capacity'):
+        read(frame[:-1])
+    with pytest.raises(FrameError, match='truncated'):
+        read(frame[:-1], total_bits=None)
+
+
+def test_unknown_codec_id():
+    frame = build(b'data', codec_id=99)
+    with pytest.raises(FrameError, match='unknown codec 99'):
+        read(frame, 'lsb-image')
+    assert read(frame) == b'data'
+
+
+def test_codec_mismatch():
+    frame = pack_frame(b'data', 'pvd-image')
+    with pytest.raises(FrameError, match='pvd-image, not lsb-image'):
+        read(frame, 'lsb-image')
+
+
+def test_unknown_compression_flag():
+    with pytest.raises(FrameError, match='compression flag 7'):
+        read(build(b'data', flag=7))
+
+
+@pytest.mark.parametrize('flag', [framing.ZLIB, framing.LZMA])
+def test_corrupt_compressed_payload(flag):
+    with pytest.raises(FrameError, match='decompressed'):
+        read(build(b'not compressed at all', flag=flag))
+
+
+@pytest.mark.parametrize('total_bits', [8 * 40, 8 * 100, 8 * 1000])
+def test_max_payload_fits(total_bits):
+    n = framing.max_payload(total_bits)
+    assert len(pack_frame(b'\xff' * n, 'lsb-image', 'none')) <= total_bits // 8
+    assert len(pack_frame(b'\xff' * (n + 1), 'lsb-image', 'none')) > total_bits // 8
@@ -0,0 +1,125 @@
+"""
+Parity of the vectorized LSB engine (lsb.embed_lsb / lsb.extract_lsb) with the
+original per-pixel loops of HideImage.embed_text_lsb and
+UnhideImage.extract_text_lsb, kept below as the reference.
+
+    python -m pytest test_lsb_parity.py
+"""
+import numpy as np
+import pytest
+from lsb import embed_lsb, extract_lsb
+
+
+def baseline_embed(image, message):
+    """The original embed loop, on an image array instead of a file."""
+    binary_message = ''.join(format(ord(char), '08b') for char in message) + '00000000'
+    message_len = len(binary_message)
+    flat_image = image.flatten().astype(np.int16)
+    if message_len > len(flat_image):
+        raise ValueError("Message is too long to fit in the image.")
+    for i in range(message_len):
+        original_pixel = flat_image[i]
+        original_pixel &= ~1
+        original_pixel = np.clip(original_pixel, -32768, 32767)
+        message_bit = int(binary_message[i])
+        modified_pixel = original_pixel | message_bit
+        modified_pixel = np.clip(modified_pixel, -32768, 32767)
+        flat_image[i] = modified_pixel
+    flat_image = np.clip(flat_image, 0, 255).astype(np.uint8)
+    return flat_image.reshape(image.shape)
+
+
+def baseline_extract(image):
+    """The original extract loop, on an image array instead of a file."""
+    flat_image = image.flatten()
+    binary_message = ''.join(str(flat_image[i] & 1) for i in range(len(flat_image)))
+    chars = [binary_message[i:i+8] for i in range(0, len(binary_message), 8)]
+    message = ''
+    for char in chars:
+        if char == '00000000':
+            break
+        message += chr(int(char, 2))
+    return message
+
+
+def engine_embed(image, message):
+    """The same bit stream as the original loop, written by embed_lsb."""
+    binary_message = ''.join(format(ord(char), '08b') for char in message) + '00000000'
+    bits = np.frombuffer(binary_message.encode('ascii'), dtype=np.uint8) - ord('0')
+    stego_image = np.ascontiguousarray(image).copy()
+    embed_lsb(stego_image.reshape(-1), bits)
+    return stego_image
+
+
+def engine_extract(image):
+    return extract_lsb(np.ascontiguousarray(image).reshape(-1)).decode('latin-1')
+
+
+def random_cover(rng, shape):
+    return rng.integers(0, 256, size=shape, dtype=np.uint8)
+
+
+def random_message(rng, length, max_code=0x7F):
+    # Code points start at 1: a null character is the terminator in both layouts
+    return ''.join(chr(code) for code in rng.integers(1, max_code + 1, size=length))
+
+
+def assert_parity(cover, message):
+    expected = baseline_embed(cover, message)
+    stego = engine_embed(cover, message)
+    assert stego.dtype == expected.dtype and stego.shape == expected.shape
+    assert stego.tobytes() == expected.tobytes()
+    assert engine_extract(stego) == baseline_extract(expected)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_covers_and_messages(seed):
+    rng = np.random.default_rng(seed)
+    cover = random_cover(rng, (int(rng.integers(8, 40)), int(rng.integers(8, 40)), 3))
+    length = int(rng.integers(1, cover.size // 8 - 1))
+    message = random_message(rng, length)
+    assert_parity(cover, message)
+    assert engine_extract(engine_embed(cover, message)) == message
+
+
+def test_empty_message():
+    rng = np.random.default_rng(10)
+    cover = random_cover(rng, (16, 16, 3))
+    assert_parity(cover, '')
+    assert engine_extract(engine_embed(cover, '')) == ''
+
+
+@pytest.mark.parametrize('max_code', [0xFF, 0x2FFF, 0x10FFFF])
+def test_non_latin1_messages(max_code):
+    # Characters above 255 take more than eight bits, so the bytes read back
+    # are shifted; the engine has to reproduce that output exactly
+    rng = np.random.default_rng(max_code)
+    cover = random_cover(rng, (24, 24, 3))
+    message = random_message(rng, 30, max_code) + 'é€😀'
+    assert_parity(cover, message)
+
+
+def test_message_exactly_fills_capacity():
+    rng = np.random.default_rng(20)
+    cover = random_cover(rng, (8, 8, 3))
+    # 8 bits per character plus the 8-bit terminator use every value
+    message = random_message(rng, cover.size // 8 - 1)
+    assert_parity(cover, message)
+    assert engine_extract(engine_embed(cover, message)) == message
+
+
+def test_message_over_capacity():
+    rng = np.random.default_rng(21)
+    cover = random_cover(rng, (8, 8, 3))
+    message = random_message(rng, cover.size // 8)
+    with pytest.raises(ValueError):
+        baseline_embed(cover, message)
+    with pytest.raises(ValueError):
+        engine_embed(cover, message)
+
+
+def test_cover_without_terminator():
+    rng = np.random.default_rng(30)
+    # 7 x 5 x 3 values: no null byte and a trailing partial byte
+    cover = random_cover(rng, (7, 5, 3)) | 1
+    assert engine_extract(cover) == baseline_extract(cover)
@@ -0,0 +1,147 @@
+"""
+The multi-threaded and tiled engines must write exactly what the serial ones
+write: byte-equal stego arrays and WAV files, and the same bits read back.
+Regions and bands are kept small so a few threads share every cover.
+
+    python -m pytest test_parallel_parity.py
+"""
+import wave
+import numpy as np
+import pytest
+from PIL import Image
+from lsb import embed_lsb, embed_lsb_parallel, lsb_bit_source, lsb_bit_source_parallel
+from pvd import (capacity_bits_pvd, embed_pvd_range, embed_pvd_range_parallel, embed_pvd_range_tiled,
+                 pvd_range_bit_source, pvd_range_bit_source_parallel, pvd_range_bit_source_tiled)
+from audio_lsb import BLOCK_FRAMES, embed_lsb_wav, embed_sample_lsb_wav
+from framing import frame_bits, read_frame
+from hide import HideImage
+from unhide import UnhideImage
+
+WORKERS = [2, 3, 4]
+
+
+def random_bits(rng, n):
+    return rng.integers(0, 2, size=n, dtype=np.uint8)
+
+
+def random_wav(rng, path, frames, channels, sampwidth, framerate=8000):
+    """Writes a WAV of random frame bytes."""
+    with wave.open(path, 'wb') as audio:
+        audio.setnchannels(channels)
+        audio.setsampwidth(sampwidth)
+        audio.setframerate(framerate)
+        audio.writeframes(rng.integers(0, 256, size=frames * channels * sampwidth, dtype=np.uint8).tobytes())
+
+
+@pytest.mark.parametrize('workers', WORKERS)
+@pytest.mark.parametrize('n_bits', [0, 1, 999, 1000, 1001, 6000])
+def test_lsb_embed_and_read(workers, n_bits):
+    rng = np.random.default_rng([workers, n_bits])
+    cover = rng.integers(0, 256, size=(40, 50, 3), dtype=np.uint8).reshape(-1)
+    bits = random_bits(rng, n_bits)
+    serial = embed_lsb(cover.copy(), bits)
+    parallel = embed_lsb_parallel(cover.copy(), bits, workers, region=1000)
+    assert parallel.tobytes() == serial.tobytes()
+
+    read_serial, total_serial = lsb_bit_source(serial)
+    read_parallel, total_parallel = lsb_bit_source_parallel(serial, workers, region=1000)
+    assert total_parallel == total_serial
+    for start, stop in [(0, n_bits), (3, 2500), (5990, 6000), (5990, 7000)]:
+        assert np.array_equal(read_parallel(start, stop), read_serial(start, stop))
+
+
+# (shape) of RGB, grayscale, RGBA and odd-width covers
+SHAPES = [(70, 40, 3), (53, 41), (33, 29, 4)]
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+@pytest.mark.parametrize('workers', WORKERS)
+@pytest.mark.parametrize('fill', [0.0, 0.3, 1.0])
+def test_pvd_embed(shape, workers, fill):
+    rng = np.random.default_rng([len(shape), shape[0], workers, int(fill * 10)])
+    cover = rng.integers(0, 256, size=shape, dtype=np.uint8)
+    bits = random_bits(rng, int(capacity_bits_pvd(cover) * fill))
+
+    serial = embed_pvd_range(cover.astype(np.int32), bits).astype(np.uint8)
+    tiled = embed_pvd_range_tiled(cover.copy(), bits, band_rows=7)
+    parallel = embed_pvd_range_parallel(cover.copy(), bits, workers, band_rows=7)
+    parallel_int = embed_pvd_range_parallel(cover.astype(np.int32), bits, workers, band_rows=7)
+    assert tiled.tobytes() == serial.tobytes()
+    assert parallel.tobytes() == serial.tobytes()
+    assert parallel_int.astype(np.uint8).tobytes() == serial.tobytes()
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+@pytest.mark.parametrize('workers', WORKERS)
+def test_pvd_read_frame(shape, workers):
+    rng = np.random.default_rng([shape[0], workers])
+    cover = rng.integers(0, 256, size=shape, dtype=np.uint8)
+    payload = rng.integers(0, 256, size=60, dtype=np.uint8).tobytes()
+    stego = embed_pvd_range(cover.astype(np.int32), frame_bits(payload, 'pvd-image', 'none'))
+    sources = [pvd_range_bit_source(stego), pvd_range_bit_source_tiled(stego, band_rows=5),
+               pvd_range_bit_source_parallel(stego, workers, band_rows=5)]
+    for source in sources:
+        assert read_frame(*source, codec='pvd-image') == payload
+
+
+@pytest.mark.parametrize('workers', WORKERS)
+@pytest.mark.parametrize('tiled', [False, True])
+def test_hide_image_files(tmp_path, workers, tiled):
+    rng = np.random.default_rng([workers, tiled])
+    cover_path = str(tmp_path / 'cover.png')
+    Image.fromarray(rng.integers(0, 256, size=(300, 260, 3), dtype=np.uint8)).save(cover_path)
+    data = rng.integers(0, 256, size=3000, dtype=np.uint8).tobytes()
+
+    outputs = {}
+    for name, count in (('serial', 1), ('parallel', workers)):
+        outputs[name] = str(tmp_path / f'pvd_{name}.png')
+        HideImage(cover_path, outputs[name]).embed_bytes_pvd(data, 'none', tiled, count)
+    serial = np.array(Image.open(outputs['serial']))
+    assert np.array(Image.open(outputs['parallel'])).tobytes() == serial.tobytes()
+    assert UnhideImage(outputs['parallel']).extract_bytes_pvd(tiled, workers) == data
+
+    if not tiled:
+        for name, count in (('serial', 1), ('parallel', workers)):
+            outputs[name] = str(tmp_path / f'lsb_{name}.png')
+            HideImage(cover_path, outputs[name]).embed_bytes_lsb(data, 'none', count)
+        serial = np.array(Image.open(outputs['serial']))
+        assert np.array(Image.open(outputs['parallel'])).tobytes() == serial.tobytes()
+        assert UnhideImage(outputs['parallel']).extract_bytes_lsb(workers) == data
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('workers', WORKERS)
+@pytest.mark.parametrize('sampwidth', [1, 2, 3])
+def test_wav_byte_mode(tmp_path, workers, sampwidth):
+    rng = np.random.default_rng([workers, sampwidth])
+    # Long enough for several reads of BLOCK_FRAMES * workers frames
+    frames = BLOCK_FRAMES * (workers + 1) + 123
+    cover = str(tmp_path / 'cover.wav')
+    random_wav(rng, cover, frames, 2, sampwidth)
+    bits = random_bits(rng, frames * 2 * sampwidth - 5)
+
+    serial = str(tmp_path / 'serial.wav')
+    parallel = str(tmp_path / 'parallel.wav')
+    embed_lsb_wav(cover, serial, bits, 1)
+    embed_lsb_wav(cover, parallel, bits, workers)
+    assert read_file(parallel) == read_file(serial)
+
+
+@pytest.mark.parametrize('workers', WORKERS)
+@pytest.mark.parametrize('sampwidth, depth', [(1, 1), (2, 1), (2, 3), (3, 2), (4, 4)])
+def test_wav_sample_mode(tmp_path, workers, sampwidth, depth):
+    rng = np.random.default_rng([workers, sampwidth, depth])
+    frames = BLOCK_FRAMES * (workers + 1) + 77
+    cover = str(tmp_path / 'cover.wav')
+    random_wav(rng, cover, frames, 2, sampwidth)
+    bits = random_bits(rng, frames * 2 * depth - 7)
+
+    serial = str(tmp_path / 'serial.wav')
+    parallel = str(tmp_path / 'parallel.wav')
+    embed_sample_lsb_wav(cover, serial, bits, depth, 1)
+    embed_sample_lsb_wav(cover, parallel, bits, depth, workers)
+    assert read_file(parallel) == read_file(serial)
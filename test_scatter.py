@@ -0,0 +1,94 @@
+"""
+Keyed permutation and password-scattered LSB embedding (scatter.py), on
+arrays and through HideImage/UnhideImage and HideAudio/UnhideAudio.
+
+    python -m pytest test_scatter.py
+"""
+import wave
+import numpy as np
+import pytest
+from scatter import KeyedPermutation, derive_round_keys, embed_lsb_scattered, lsb_scattered_bit_source
+
+
+@pytest.mark.parametrize('n', [1, 2, 3, 7, 100, 1000, 4097, 65536, 65537])
+def test_permutation_is_a_bijection(n):
+    positions = KeyedPermutation('password', n).positions(0, n)
+    assert sorted(positions.tolist()) == list(range(n))
+
+
+def test_permutation_is_keyed_and_evaluated_piecewise():
+    permutation = KeyedPermutation('password', 10 ** 6)
+    whole = permutation.positions(0, 1000)
+    assert (permutation.positions(500, 900) == whole[500:900]).all()
+    assert (KeyedPermutation('password', 10 ** 6).positions(0, 1000) == whole).all()
+    assert (KeyedPermutation(b'password', 10 ** 6).positions(0, 1000) == whole).all()
+    assert (KeyedPermutation('other', 10 ** 6).positions(0, 1000) != whole).mean() > 0.99
+    # Not the identity, nor the first positions in another order
+    assert (whole != np.arange(1000)).mean() > 0.99
+    assert whole.max() > 10 ** 5
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        derive_round_keys('')
+    with pytest.raises(ValueError):
+        KeyedPermutation('password', 0)
+    with pytest.raises(ValueError):
+        KeyedPermutation('password', 10).positions(0, 11)
+    with pytest.raises(ValueError):
+        embed_lsb_scattered(np.zeros(10, dtype=np.uint8), np.ones(11, dtype=np.uint8), 'password')
+
+
+@pytest.mark.parametrize('size', [1, 8, 999, 100000])
+def test_array_round_trip(size):
+    rng = np.random.default_rng(size)
+    flat = rng.integers(0, 256, size, dtype=np.uint8)
+    cover = flat.copy()
+    bits = rng.integers(0, 2, min(size, 5000), dtype=np.uint8)
+    embed_lsb_scattered(flat, bits, 'key')
+    assert ((flat ^ cover) <= 1).all()
+    assert np.count_nonzero(flat != cover) <= len(bits)
+
+    read_bits, total_bits = lsb_scattered_bit_source(flat, 'key')
+    assert total_bits == size
+    assert (read_bits(0, len(bits)) == bits).all()
+    assert (read_bits(3, len(bits)) == bits[3:]).all()
+    # Reads past the cover return what is left
+    assert len(read_bits(size - 1, size + 10)) == 1
+
+
+def test_image_round_trip(tmp_path):
+    cv2 = pytest.importorskip('cv2')
+    from hide import HideImage
+    from unhide import UnhideImage
+    rng = np.random.default_rng(0)
+    cover, stego = str(tmp_path / 'cover.png'), str(tmp_path / 'stego.png')
+    cv2.imwrite(cover, rng.integers(0, 256, (120, 161, 3), dtype=np.uint8))
+    HideImage(cover, stego).embed_text_lsb('scattered héllo', password='k1')
+
+    assert UnhideImage(stego).extract_text_lsb(password='k1') == 'scattered héllo'
+    assert UnhideImage(stego).extract_bytes_lsb(password='k1') == 'scattered héllo'.encode('utf-8')
+    with pytest.raises(ValueError):
+        UnhideImage(stego).extract_text_lsb(password='k2')
+    assert UnhideImage(stego).extract_text_lsb() != 'scattered héllo'
+
+
+def test_audio_round_trip(tmp_path):
+    from hide import HideAudio
+    from unhide import UnhideAudio
+    rng = np.random.default_rng(1)
+    cover, stego = str(tmp_path / 'cover.wav'), str(tmp_path / 'stego.wav')
+    with wave.open(cover, 'wb') as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(8000)
+        w.writeframes(rng.integers(-3000, 3000, (20000, 2), dtype=np.int16).tobytes())
+    message = 'audio secret ' * 5
+    HideAudio(cover, stego).embed_text_lsb(message, password='k1')
+
+    assert UnhideAudio(stego).extract_text_lsb(password='k1') == message
+    assert UnhideAudio(stego).extract_bytes_lsb(password='k1') == message.encode('utf-8')
+    with pytest.raises(ValueError):
+        UnhideAudio(stego).extract_bytes_lsb(password='nope')
+    with wave.open(cover, 'rb') as a, wave.open(stego, 'rb') as b:
+        assert a.getparams() == b.getparams()
@@ -0,0 +1,182 @@
+"""
+Content-addressed store: deduplication, retention markers and gc, and
+deduplicated uploads through flask_app.py.
+
+    python -m pytest test_store.py
+"""
+import hashlib
+import io
+import os
+import time
+import pytest
+from catalog import Catalog
+from store import BlobStore, expire_partial_uploads, expire_uploads, file_digest
+
+
+def put(store, data):
+    tmp_path, digest = store.stage(io.BytesIO(data))
+    return store.commit(tmp_path, digest)
+
+
+def age(path, seconds):
+    """Moves a file's mtime seconds into the past."""
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / 'store'))
+
+
+def test_stage_hashes_and_commit_deduplicates(store, tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 5)
+    digest = put(store, data)
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert put(store, data) == digest
+    blobs = [name for root, _, names in os.walk(store.folder) for name in names if name == digest]
+    assert blobs == [digest, digest]  # the blob and its retention marker
+    with open(store.blob_path(digest), 'rb') as f:
+        assert f.read() == data
+    assert os.listdir(store.tmp_folder) == []
+
+    path = tmp_path / 'file.bin'
+    path.write_bytes(data)
+    assert file_digest(str(path)) == digest
+
+
+def test_links_share_the_blob(store, tmp_path):
+    digest = put(store, b'shared content')
+    first, second = str(tmp_path / 'a.png'), str(tmp_path / 'b.png')
+    store.link(digest, first)
+    store.link(digest, second)
+    assert store.refcount(digest) == 2
+    assert os.path.samefile(first, store.blob_path(digest))
+    store.unlink(first, digest)
+    store.unlink(first, digest)
+    assert store.refcount(digest) == 1
+
+
+def test_commit_and_unlink_never_touch_the_blob(store, tmp_path):
+    digest = put(store, b'etag stays put')
+    path = str(tmp_path / 'a.png')
+    store.link(digest, path)
+    age(store.blob_path(digest), 3600)
+    mtime = os.stat(path).st_mtime
+
+    put(store, b'etag stays put')
+    store.link(digest, str(tmp_path / 'b.png'))
+    store.unlink(str(tmp_path / 'b.png'), digest)
+    assert os.stat(path).st_mtime == mtime
+    assert store.refreshed(digest) > mtime + 3000
+
+
+def test_gc_keeps_linked_and_recent_blobs(store, tmp_path):
+    linked = put(store, b'linked')
+    store.link(linked, str(tmp_path / 'linked.png'))
+    recent = put(store, b'recent')
+    old = put(store, b'old')
+    for digest in (linked, recent, old):
+        age(store.blob_path(digest), 10 * 86400)
+    for digest in (linked, old):
+        age(store._marker_path(digest), 10 * 86400)
+    abandoned = os.path.join(store.tmp_folder, 'abandoned')
+    open(abandoned, 'wb').close()
+    age(abandoned, 10 * 86400)
+
+    assert store.gc(7 * 86400, dry_run=True) == (2, len(b'old'))
+    assert store.has(old) and os.path.exists(abandoned)
+    assert store.gc(7 * 86400) == (2, len(b'old'))
+    assert store.has(linked) and store.has(recent) and not store.has(old)
+    assert not os.path.exists(store._marker_path(old))
+    assert not os.path.exists(abandoned)
+    assert os.path.exists(store.lock_path)
+
+
+def test_gc_counts_retention_from_the_last_unlink(store, tmp_path):
+    digest = put(store, b'unlinked later')
+    path = str(tmp_path / 'a.png')
+    store.link(digest, path)
+    age(store.blob_path(digest), 10 * 86400)
+    age(store._marker_path(digest), 10 * 86400)
+    store.unlink(path, digest)
+    assert store.gc(7 * 86400) == (0, 0)
+    age(store._marker_path(digest), 8 * 86400)
+    assert store.gc(7 * 86400) == (1, len(b'unlinked later'))
+
+
+def test_expire_uploads(store, tmp_path):
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    catalog = Catalog(str(tmp_path / 'catalog.sqlite3'))
+    digest = put(store, b'expiring')
+    for name, mtime in (('old.png', time.time() - 100 * 86400), ('new.png', time.time())):
+        store.link(digest, str(uploads / name))
+        catalog.add(str(uploads), name, sha256=digest, mtime=mtime)
+
+    assert expire_uploads(str(uploads), catalog, store, 90 * 86400, dry_run=True) == 1
+    assert (uploads / 'old.png').exists()
+    assert expire_uploads(str(uploads), catalog, store, 90 * 86400) == 1
+    assert sorted(os.listdir(uploads)) == ['new.png']
+    assert catalog.get('old.png') is None
+    assert store.refcount(digest) == 1
+
+
+def test_expire_partial_uploads(tmp_path):
+    for upload_id, ages in (('idle', (2 * 86400, 2 * 86400)), ('active', (2 * 86400, 0)), ('new', (0, 0))):
+        for ext, seconds in zip(('.json', '.part'), ages):
+            path = tmp_path / (upload_id + ext)
+            path.write_bytes(b'')
+            age(str(path), seconds)
+    (tmp_path / 'other.txt').write_bytes(b'')
+    age(str(tmp_path / 'other.txt'), 2 * 86400)
+
+    assert expire_partial_uploads(str(tmp_path), 86400, dry_run=True) == 1
+    assert expire_partial_uploads(str(tmp_path), 86400) == 1
+    assert sorted(os.listdir(tmp_path)) == ['active.json', 'active.part', 'new.json', 'new.part', 'other.txt']
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    flask_app = pytest.importorskip('flask_app')
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    monkeypatch.setitem(flask_app.app.config, 'UPLOAD_FOLDER', str(uploads))
+    monkeypatch.setattr(flask_app, 'store', BlobStore(str(tmp_path / 'store')))
+    monkeypatch.setattr(flask_app, 'catalog', Catalog(str(tmp_path / 'catalog.sqlite3')))
+    return flask_app.app.test_client()
+
+
+def upload(client, data, filename):
+    response = client.post('/upload', data={'file': (io.BytesIO(data), filename)},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_upload_deduplicates(client):
+    import flask_app
+    data = os.urandom(1000)
+    first = upload(client, data, 'cover.png')
+    assert not first["deduplicated"]
+    etag = client.get('/uploads/' + first["filename"]).headers['ETag']
+    mtime = flask_app.catalog.get(first["filename"])["mtime"]
+
+    time.sleep(0.01)
+    second = upload(client, data, 'renamed.png')
+    assert second["deduplicated"]
+    assert second["filename"] == first["filename"]
+    assert second["sha256"] == hashlib.sha256(data).hexdigest()
+    assert flask_app.catalog.get(first["filename"])["mtime"] > mtime
+    assert flask_app.store.refcount(second["sha256"]) == 1
+    assert client.get('/uploads/' + first["filename"]).headers['ETag'] == etag
+    assert client.get('/uploads/' + first["filename"], headers={'If-None-Match': etag}).status_code == 304
+
+    # Same content under another extension is a separate file of the same blob
+    third = upload(client, data, 'cover.jpg')
+    assert not third["deduplicated"]
+    assert flask_app.store.refcount(third["sha256"]) == 2
+
+    found = client.get('/uploads/sha256/' + first["sha256"] + '?ext=.png').get_json()
+    assert found["filename"] == first["filename"]
+    assert client.get('/uploads/sha256/' + '0' * 64).status_code == 404
@@ -0,0 +1,245 @@
+"""
+Memory-mapped training data for the autoencoder notebooks.
+
+Decoding and resampling the dataset is done once, into a folder of .npy shards
+that later runs (or Colab restarts) open with np.load(mmap_mode='r'):
+
+    store/manifest.json
+    store/shard_000.items.npy      float32 (n, *item shape), e.g. audio windows
+    store/shard_000.messages.npy   uint8 (n, message bits), 0/1
+
+    python -m training_data build-audio ESC-50-master/audio store --num-samples 800
+    python -m training_data info store
+
+ShardStore.batches() streams shuffled batches from the shards and applies
+gain/noise augmentation to whole batches at once. It yields NumPy arrays, so it
+plugs into model.fit through tf.data.Dataset.from_generator without this
+module importing TensorFlow.
+
+Audio is decoded with the wave module: channels are averaged to mono and the
+first window is resampled to the target rate by linear interpolation, which
+stands in for the notebook's librosa.load(sr=22050, duration=1.0).
+"""
+import argparse
+import json
+import os
+import sys
+import wave
+import numpy as np
+from operations import decode_frames
+
+AUDIO_LENGTH = 22050
+SAMPLE_RATE = 22050
+MESSAGE_BITS = 128
+SHARD_SIZE = 1024
+SEED = 42
+MANIFEST = 'manifest.json'
+
+
+def _shard_paths(store_dir, index):
+    prefix = os.path.join(store_dir, f'shard_{index:03d}')
+    return prefix + '.items.npy', prefix + '.messages.npy'
+
+
+def load_audio_window(path, audio_length=AUDIO_LENGTH, sample_rate=SAMPLE_RATE):
+    """First audio_length samples of a WAV at sample_rate, mono float32 in [-1, 1], zero padded."""
+    with wave.open(path, 'rb') as audio:
+        params = audio.getparams()
+        # Only the source frames under the window are read
+        needed = int(np.ceil(audio_length * params.framerate / sample_rate)) + 1
+        samples = decode_frames(audio.readframes(needed), params.sampwidth, params.nchannels)
+    signal = samples.mean(axis=1) / float(1 << (8 * params.sampwidth - 1))
+    if params.framerate != sample_rate and len(signal):
+        times = np.arange(audio_length) * (params.framerate / sample_rate)
+        times = times[times <= len(signal) - 1]
+        signal = np.interp(times, np.arange(len(signal)), signal)
+    window = np.zeros(audio_length, dtype=np.float32)
+    window[:min(len(signal), audio_length)] = signal[:audio_length]
+    return window
+
+
+def _source_list(files):
+    """File names, sizes and mtimes; a store built from the same list is reused."""
+    return [[os.path.basename(path), os.path.getsize(path), int(os.path.getmtime(path))] for path in files]
+
+
+def build_audio_shards(audio_dir, store_dir, num_samples=None, audio_length=AUDIO_LENGTH,
+                       sample_rate=SAMPLE_RATE, message_bits=MESSAGE_BITS, shard_size=SHARD_SIZE,
+                       seed=SEED, rebuild=False):
+    """Decodes the WAVs of audio_dir into a shard store once; returns the ShardStore.
+
+    Every window gets a random message of message_bits bits, drawn from seed.
+    Files that fail to decode are skipped and listed in the manifest. If
+    store_dir already holds a store built from the same files and settings it
+    is opened as is, unless rebuild is set.
+    """
+    files = sorted(os.path.join(audio_dir, name) for name in os.listdir(audio_dir) if name.endswith('.wav'))
+    if num_samples is not None:
+        files = files[:num_samples]
+    settings = {"audio_length": audio_length, "sample_rate": sample_rate, "message_bits": message_bits,
+                "shard_size": shard_size, "seed": seed}
+    sources = _source_list(files)
+
+    manifest_path = os.path.join(store_dir, MANIFEST)
+    if not rebuild and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("settings") == settings and manifest.get("sources") == sources:
+            return ShardStore(store_dir)
+
+    os.makedirs(store_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    shards = []
+    skipped = []
+    max_abs = 0.0
+    for start in range(0, len(files), shard_size):
+        chunk = files[start:start + shard_size]
+        items_path, messages_path = _shard_paths(store_dir, len(shards))
+        items = np.lib.format.open_memmap(items_path, mode='w+', dtype=np.float32, shape=(len(chunk), audio_length))
+        count = 0
+        for path in chunk:
+            try:
+                items[count] = load_audio_window(path, audio_length, sample_rate)
+            except Exception as e:
+                skipped.append([os.path.basename(path), str(e) or type(e).__name__])
+                continue
+            count += 1
+        max_abs = max(max_abs, float(np.abs(items[:count]).max(initial=0)))
+        items.flush()
+        del items
+        if count < len(chunk):
+            # Drop the rows of skipped files
+            kept = np.load(items_path)[:count]
+            np.save(items_path, kept)
+        np.save(messages_path, rng.integers(0, 2, size=(count, message_bits), dtype=np.uint8))
+        shards.append({"items": os.path.basename(items_path), "messages": os.path.basename(messages_path),
+                       "count": count})
+
+    manifest = {
+        "settings": settings,
+        "item_shape": [audio_length],
+        "shards": shards,
+        "count": sum(shard["count"] for shard in shards),
+        # The notebook scales the whole dataset by its peak; batches apply it on the fly
+        "scale": 1.0 / max_abs if max_abs > 0 else 1.0,
+        "sources": sources,
+        "skipped": skipped,
+    }
+    # Written last, so an interrupted build is rebuilt on the next run
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    return ShardStore(store_dir)
+
+
+def augment_batch(items, rng, noise_level=0.01, gain_range=(0.9, 1.1)):
+    """Random gain per item and Gaussian noise, clipped to [-1, 1], over a whole batch at once.
+
+    Same distribution as the notebook's per-sample augment_audio_batch loop.
+    Returns a new float32 array.
+    """
+    gain_shape = (len(items),) + (1,) * (items.ndim - 1)
+    gains = rng.uniform(gain_range[0], gain_range[1], size=gain_shape).astype(np.float32)
+    augmented = items * gains
+    augmented += rng.normal(0, noise_level, size=items.shape).astype(np.float32)
+    np.clip(augmented, -1, 1, out=augmented)
+    return augmented
+
+
+class ShardStore:
+    """Read-only view over a shard folder written by build_audio_shards."""
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        try:
+            with open(os.path.join(store_dir, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Error opening shard store: {e}")
+        shards = self.manifest["shards"]
+        self.items = [np.load(os.path.join(store_dir, shard["items"]), mmap_mode='r') for shard in shards]
+        self.messages = [np.load(os.path.join(store_dir, shard["messages"]), mmap_mode='r') for shard in shards]
+        self.offsets = np.cumsum([0] + [shard["count"] for shard in shards])
+        self.scale = np.float32(self.manifest["scale"])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def split(self, test_size=0.2, seed=SEED):
+        """(train indices, validation indices), a seeded shuffle like train_test_split."""
+        order = np.random.default_rng(seed).permutation(len(self))
+        n_test = int(np.ceil(len(self) * test_size))
+        return np.sort(order[n_test:]), np.sort(order[:n_test])
+
+    def take(self, indices):
+        """(items, messages) for sorted global indices, read shard by shard from the memmaps.
+
+        Items are scaled like the notebook and get a trailing channel axis;
+        messages are float32 as the model expects.
+        """
+        indices = np.asarray(indices)
+        shard_of = np.searchsorted(self.offsets, indices, side='right') - 1
+        items = np.empty((len(indices),) + tuple(self.manifest["item_shape"]) + (1,), dtype=np.float32)
+        messages = np.empty((len(indices), self.manifest["settings"]["message_bits"]), dtype=np.float32)
+        for shard in np.unique(shard_of):
+            rows = np.flatnonzero(shard_of == shard)
+            local = indices[rows] - self.offsets[shard]
+            items[rows, ..., 0] = self.items[shard][local]
+            messages[rows] = self.messages[shard][local]
+        items *= self.scale
+        return items, messages
+
+    def batches(self, batch_size=16, indices=None, shuffle=True, seed=None, augment=False, drop_last=False,
+                noise_level=0.01):
+        """Yields (items, messages) batches over indices (default: everything).
+
+        Batches are drawn in shuffled order, but the rows of each batch are
+        read in file order, so memmap reads stay sequential within a shard.
+        """
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices)
+        rng = np.random.default_rng(seed)
+        if shuffle:
+            indices = rng.permutation(indices)
+        stop = len(indices) - len(indices) % batch_size if drop_last else len(indices)
+        for start in range(0, stop, batch_size):
+            items, messages = self.take(np.sort(indices[start:start + batch_size]))
+            if augment:
+                items = augment_batch(items, rng, noise_level)
+            yield items, messages
+
+    def arrays(self, indices=None):
+        """Everything (or indices) as in-memory arrays, for model.fit(x, y) on small datasets."""
+        indices = np.arange(len(self)) if indices is None else np.sort(np.asarray(indices))
+        return self.take(indices)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect a memory-mapped training shard store.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build-audio', help="decode a folder of WAVs into shards")
+    build.add_argument('audio_dir')
+    build.add_argument('store')
+    build.add_argument('--num-samples', type=int, default=None)
+    build.add_argument('--audio-length', type=int, default=AUDIO_LENGTH)
+    build.add_argument('--sample-rate', type=int, default=SAMPLE_RATE)
+    build.add_argument('--message-bits', type=int, default=MESSAGE_BITS)
+    build.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    build.add_argument('--seed', type=int, default=SEED)
+    build.add_argument('--rebuild', action='store_true', help="rebuild even if the store is up to date")
+    info = sub.add_parser('info', help="print a store's manifest summary")
+    info.add_argument('store')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build-audio':
+        store = build_audio_shards(args.audio_dir, args.store, args.num_samples, args.audio_length,
+                                   args.sample_rate, args.message_bits, args.shard_size, args.seed, args.rebuild)
+    else:
+        store = ShardStore(args.store)
+    manifest = store.manifest
+    print(f'{len(store)} items of shape {manifest["item_shape"]} in {len(manifest["shards"])} shards, '
+          f'{len(manifest["skipped"])} skipped')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
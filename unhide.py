@@ -1,95 +1,104 @@
 import wave
-import cv2
-from PIL import Image
+# OpenCV and PIL are imported by the image loaders on first use
 import numpy as np
-from operations import  bin_to_str, get_capacity
+from operations import bit_array_to_str
+from lsb import extract_lsb, lsb_bit_source, lsb_bit_source_parallel
+from audio_lsb import (bits_to_text_lsb, iter_frame_blocks, lsb_until_zero_run,
+                       wav_lsb_bit_source, wav_lsb_scattered_bit_source, wav_sample_bit_source)
+from pvd import extract_pvd, pvd_range_bit_source, pvd_range_bit_source_parallel, pvd_range_bit_source_tiled
+from codec_registry import load_image_memmap
+from framing import read_frame
+from scatter import lsb_scattered_bit_source
+from instrument import span
+
+def payload_to_text(payload):
+    return payload.decode('utf-8', errors='replace')
 
 class UnhideImage:
     def __init__(self, image_path):
         self.image_path = image_path
+
+    def _load_flat(self):
+        import cv2
+        image = cv2.imread(self.image_path)
+        if image is None:
+            raise ValueError("Image not found. Check the path.")
+        return image.reshape(-1)
+
+    def _load_pixels(self):
+        from PIL import Image
+        stego_image = Image.open(self.image_path)
+        return np.array(stego_image, dtype=np.int32)
+
+    def _lsb_frame(self, flat_image, workers, password=None):
+        if password:
+            return read_frame(*lsb_scattered_bit_source(flat_image, password), codec='lsb-image')
+        if workers == 1:
+            return read_frame(*lsb_bit_source(flat_image), codec='lsb-image')
+        return read_frame(*lsb_bit_source_parallel(flat_image, workers), codec='lsb-image')
+
+    def _pvd_frame(self, pixels, tiled, workers):
+        if workers != 1:
+            # Batches of row bands are decoded on a thread pool
+            return read_frame(*pvd_range_bit_source_parallel(pixels, workers), codec='pvd-image')
+        if tiled:
+            # Row bands are decoded only until the frame is complete
+            return read_frame(*pvd_range_bit_source_tiled(pixels), codec='pvd-image')
+        return read_frame(*pvd_range_bit_source(pixels), codec='pvd-image')
     
-    def extract_text_lsb(self):
+    def extract_text_lsb(self, workers=1, password=None):
         try:
-            image = cv2.imread(self.image_path)
-            if image is None:
-                raise ValueError("Image not found. Check the path.")
-            flat_image = image.flatten()
-            binary_message = ''.join(str(flat_image[i] & 1) for i in range(len(flat_image)))
-            chars = [binary_message[i:i+8] for i in range(0, len(binary_message), 8)]
-            message = ''
-            for char in chars:
-                if char == '00000000':
-                    break
-                message += chr(int(char, 2))
+            with span('UnhideImage.extract_text_lsb.load'):
+                flat_image = self._load_flat()
+            with span('UnhideImage.extract_text_lsb.extract'):
+                payload = self._lsb_frame(flat_image, workers, password)
+                if payload is not None:
+                    return payload_to_text(payload)
+                if password:
+                    # Scattered payloads are always framed
+                    raise ValueError("No hidden data found for this password.")
+                # Unframed files: only the bytes in front of the null terminator are unpacked
+                message = extract_lsb(flat_image).decode('latin-1')
             return message
         except Exception as e:
             raise ValueError(f"Error extracting text: {e}")
+
+    def extract_bytes_lsb(self, workers=1, password=None):
+        try:
+            with span('UnhideImage.extract_bytes_lsb.load'):
+                flat_image = self._load_flat()
+            with span('UnhideImage.extract_bytes_lsb.extract'):
+                payload = self._lsb_frame(flat_image, workers, password)
+        except Exception as e:
+            raise ValueError(f"Error extracting data: {e}")
+        if payload is None:
+            raise ValueError("No hidden data found in this image.")
+        return payload
     
-    def extract_text_pvd(self):
+    def extract_text_pvd(self, tiled=False, workers=1):
         # Load the stego image
-        stego_image = Image.open(self.image_path)
-        pixels = np.array(stego_image, dtype=np.int32)
-    
-        # Determine image dimensions
-        if len(pixels.shape) == 2:  # Grayscale image
-            rows, cols = pixels.shape
-            channels = 1
-        else:  # Color image
-            rows, cols, channels = pixels.shape
-    
-        binary_message = ''
-    
-        # First extract 32 bits for length prefix
-        length_bits_collected = 0
-        message_length = None  # in bits
-    
-        for channel in range(channels):
-            channel_data = pixels if channels == 1 else pixels[:, :, channel]
-    
-            for row in range(rows):
-                for col in range(0, cols - 1, 2):
-                    p1 = channel_data[row, col]
-                    p2 = channel_data[row, col + 1]
-                    diff = abs(p1 - p2)
-                    bit_capacity = get_capacity(diff)
-                    embedded_bits = format(diff, f'0{bit_capacity}b')
-    
-                    if message_length is None:
-                        # Collect length prefix first
-                        needed = 32 - length_bits_collected
-                        if bit_capacity <= needed:
-                            length_bits_collected += bit_capacity
-                            length_prefix_part = embedded_bits
-                            binary_message += length_prefix_part
-                        else:
-                            # Split bits between length prefix and message
-                            length_prefix_part = embedded_bits[:needed]
-                            binary_message += length_prefix_part
-                            message_length = int(binary_message, 2)
-                            # Start collecting message bits from remainder
-                            message_bits_part = embedded_bits[needed:]
-                            binary_message = ''  # Reset for message bits
-                            binary_message += message_bits_part
-                            length_bits_collected = 32
-                            continue  # continue embedding message bits
-                        if length_bits_collected == 32:
-                            message_length = int(binary_message, 2)
-                            binary_message = ''
-                    else:
-                        binary_message += embedded_bits
-    
-                    # Stop if message bits collected equal length
-                    if message_length is not None and len(binary_message) >= message_length:
-                        binary_message = binary_message[:message_length]
-                        extracted_message = bin_to_str(binary_message)
-                        return extracted_message
-    
-        # If the loop finishes without return, decode whatever collected
-        if message_length is not None:
-            binary_message = binary_message[:message_length]
-            return bin_to_str(binary_message)
-        else:
-            return ''  # No message found
+        with span('UnhideImage.extract_text_pvd.load'):
+            pixels = load_image_memmap(self.image_path) if tiled else self._load_pixels()
+
+        with span('UnhideImage.extract_text_pvd.extract'):
+            payload = self._pvd_frame(pixels, tiled, workers)
+            if payload is not None:
+                return payload_to_text(payload)
+
+            # Unframed files written with the 32-bit length prefix
+            binary_message = extract_pvd(pixels)
+            if binary_message is None:
+                return ''  # No message found
+            return bit_array_to_str(binary_message)
+
+    def extract_bytes_pvd(self, tiled=False, workers=1):
+        with span('UnhideImage.extract_bytes_pvd.load'):
+            pixels = load_image_memmap(self.image_path) if tiled else self._load_pixels()
+        with span('UnhideImage.extract_bytes_pvd.extract'):
+            payload = self._pvd_frame(pixels, tiled, workers)
+        if payload is None:
+            raise ValueError("No hidden data found in this image.")
+        return payload
 
 class UnhideAudio:
     def __init__(self, audio_path):
@@ -100,20 +109,54 @@ class UnhideAudio:
         text = ''.join(chr(int(char, 2)) for char in chars if char != '00000000')
         return text
 
-    def extract_text_lsb(self):
+    def _lsb_frame(self, audio, password=None):
+        if password:
+            return read_frame(*wav_lsb_scattered_bit_source(audio, password), codec='lsb-audio')
+        return read_frame(*wav_lsb_bit_source(audio), codec='lsb-audio')
+
+    def extract_text_lsb(self, password=None):
         try:
-            with wave.open(self.audio_path, 'rb') as audio:
-                frame_bytes = bytearray(list(audio.readframes(audio.getnframes())))
-
-                extracted_bits = []
-                for byte in frame_bytes:
-                    extracted_bits.append(str(byte & 1))
-                    # Check for delimiter in chunks of 8 bits
-                    if ''.join(extracted_bits[-8:]) == '00000000':
-                        break
-
-                # Convert the extracted bits back to text
-                message = self.bits_to_text(''.join(extracted_bits))
+            # Audio is read block by block while extracting, so load and extract are one span
+            with span('UnhideAudio.extract_text_lsb.extract'), wave.open(self.audio_path, 'rb') as audio:
+                payload = self._lsb_frame(audio, password)
+                if payload is not None:
+                    return payload_to_text(payload)
+                if password:
+                    raise ValueError("No hidden data found for this password.")
+                # Unframed files: blocks are read until the first run of eight zero bits
+                audio.rewind()
+                message = bits_to_text_lsb(lsb_until_zero_run(iter_frame_blocks(audio)))
             return message
         except Exception as e:
-            raise ValueError(f"Error extracting text: {e}")
\ No newline at end of file
+            raise ValueError(f"Error extracting text: {e}")
+
+    def extract_bytes_lsb(self, password=None):
+        try:
+            with span('UnhideAudio.extract_bytes_lsb.extract'), wave.open(self.audio_path, 'rb') as audio:
+                payload = self._lsb_frame(audio, password)
+        except Exception as e:
+            raise ValueError(f"Error extracting data: {e}")
+        if payload is None:
+            raise ValueError("No hidden data found in this audio file.")
+        return payload
+
+    def extract_text_sample_lsb(self, depth=1):
+        # The sample mode has always been framed, so there is no unframed layout to fall back to
+        try:
+            with span('UnhideAudio.extract_text_sample_lsb.extract'), wave.open(self.audio_path, 'rb') as audio:
+                payload = read_frame(*wav_sample_bit_source(audio, depth), codec='sample-lsb-audio')
+        except Exception as e:
+            raise ValueError(f"Error extracting text: {e}")
+        if payload is None:
+            raise ValueError("No hidden data found in this audio file.")
+        return payload_to_text(payload)
+
+    def extract_bytes_sample_lsb(self, depth=1):
+        try:
+            with span('UnhideAudio.extract_bytes_sample_lsb.extract'), wave.open(self.audio_path, 'rb') as audio:
+                payload = read_frame(*wav_sample_bit_source(audio, depth), codec='sample-lsb-audio')
+        except Exception as e:
+            raise ValueError(f"Error extracting data: {e}")
+        if payload is None:
+            raise ValueError("No hidden data found in this audio file.")
+        return payload